@@ -0,0 +1,81 @@
+"""Compare the camera-to-display paths: the legacy make_surface conversion
+against the preallocated BGRA FrameSurface used by util.actor.Actor.
+
+    python -m benchmarks.display --res 1280x720 --frames 300
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+from util.display import FrameSurface
+
+class SyntheticImage(object):
+    def __init__(self, width, height, frame, raw_data):
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.timestamp = frame * 0.05
+        self.raw_data = raw_data
+
+def make_frames(width, height, count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, width * height * 4, dtype=np.uint8).tobytes() for _ in range(count)]
+
+def legacy_path(display, image):
+    array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
+    array = np.reshape(array, (image.height, image.width, 4))
+    array = array[:, :, :3]
+    array = array[:, :, ::-1]
+    surface = pygame.surfarray.make_surface(array.swapaxes(0, 1))
+    display.blit(surface, (0, 0))
+
+def frame_surface_path(frame_surface):
+    def run(display, image):
+        frame_surface.write(image.raw_data, image.frame, image.timestamp)
+        frame_surface.blit(display)
+    return run
+
+def measure(name, run, display, width, height, buffers, frames):
+    images = [SyntheticImage(width, height, i, buffers[i % len(buffers)]) for i in range(frames)]
+    run(display, images[0])
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    for image in images:
+        run(display, image)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # peak growth over a single frame approximates the transient allocations
+    # made per frame; SDL pixel memory is not traced, so make_surface's own
+    # surface (width * height * 4 bytes) is added for the legacy path.
+    per_frame = peak - start_bytes
+    if name == 'legacy':
+        per_frame += width * height * 4
+    print('%-14s %8.1f frames/s %12d bytes/frame' % (name, frames / elapsed, per_frame))
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--res', metavar='WIDTHxHEIGHT', default='1280x720', help='frame size (default: 1280x720)')
+    argparser.add_argument('--frames', metavar='N', default=300, type=int, help='frames per run (default: 300)')
+    args = argparser.parse_args()
+    width, height = [int(x) for x in args.res.split('x')]
+
+    pygame.init()
+    display = pygame.display.set_mode((width, height))
+    buffers = make_frames(width, height, 4)
+    measure('legacy', legacy_path, display, width, height, buffers, args.frames)
+    measure('frame_surface', frame_surface_path(FrameSurface(width, height)), display, width, height, buffers, args.frames)
+    pygame.quit()
+
+if __name__ == '__main__':
+    main()
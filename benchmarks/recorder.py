@@ -0,0 +1,59 @@
+"""Push synthetic RGB and depth frames through util.recorder.SensorRecorder
+as fast as the callback side allows and report sustained rate and drops.
+
+    python -m benchmarks.recorder --res 1280x720 --frames 600
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from util.recorder import SensorRecorder
+
+class SyntheticMeasurement(object):
+    def __init__(self, width, height, frame, raw_data):
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.timestamp = frame * 0.05
+        self.raw_data = raw_data
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--res', metavar='WIDTHxHEIGHT', default='1280x720', help='frame size (default: 1280x720)')
+    argparser.add_argument('--frames', metavar='N', default=600, type=int, help='frames per stream (default: 600)')
+    argparser.add_argument('--workers', metavar='N', default=1, type=int, help='writer threads (default: 1)')
+    argparser.add_argument('--policy', default='block', choices=['drop', 'block'], help='backpressure policy (default: block)')
+    argparser.add_argument('--dir', metavar='DIR', help='output directory (default: a temporary directory)')
+    args = argparser.parse_args()
+    width, height = [int(x) for x in args.res.split('x')]
+
+    directory = args.dir or tempfile.mkdtemp(prefix='recorder-bench-')
+    buffer = memoryview(np.random.default_rng(0).integers(0, 256, width * height * 4, dtype=np.uint8).tobytes())
+    recorder = SensorRecorder(directory, workers=args.workers, policy=args.policy, block_timeout=1.0)
+    callback_time = 0.0
+    started = time.perf_counter()
+    for frame in range(args.frames):
+        measurement = SyntheticMeasurement(width, height, frame, buffer)
+        t = time.perf_counter()
+        recorder.record('Camera RGB', measurement)
+        recorder.record('Camera Depth (Raw)', measurement)
+        callback_time += time.perf_counter() - t
+    recorder.close()
+    elapsed = time.perf_counter() - started
+    stats = recorder.stats()
+    print('%d frames x 2 streams in %.2f s: %.1f frames/s per stream, %.1f MB/s' % (
+        args.frames, elapsed, args.frames / elapsed, stats['written_bytes'] / elapsed / 1e6))
+    print('mean callback time %.3f ms, peak pending %.1f MB, dropped %r' % (
+        1000.0 * callback_time / (2 * args.frames), stats['peak_pending_bytes'] / 1e6, stats['dropped']))
+    if args.dir is None:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1224 @@
+"""Pure-Python stand-in for the subset of the carla API used by util/,
+spawn_npc.py and template.py, for measuring client-side hot paths
+without a simulator.
+
+Put this directory first on sys.path (benchmarks.suite does) and
+``import carla`` resolves here. Every call that would be a round trip to
+the server is counted in ``rpc_counts``. Sensors emit synthetic BGRA
+camera, depth, segmentation, DVS and lidar buffers from a streaming
+thread, like the real client library, and every delivery's queue latency
+and callback duration is kept in ``stream_stats``.
+"""
+
+import copy
+import enum
+import fnmatch
+import itertools
+import math
+import queue
+import threading
+import time
+import traceback
+from collections import Counter
+
+import numpy as np
+
+CONFIG = {
+    'spawn_points': 200,
+    'map_size': 600.0,
+    'async_fps': 30.0,
+    'default_delta': 0.05,
+    'collision_radius': 2.0,
+    'rpc_latency': 0.0,
+    'seed': 0,
+}
+
+rpc_counts = Counter()
+stream_stats = {'deliveries': 0, 'queue_latency': [], 'callback_time': []}
+
+def configure(**kwargs):
+    for key in kwargs:
+        if key not in CONFIG:
+            raise KeyError('unknown setting %r' % key)
+    CONFIG.update(kwargs)
+
+def reset_stats():
+    rpc_counts.clear()
+    stream_stats['deliveries'] = 0
+    stream_stats['queue_latency'] = []
+    stream_stats['callback_time'] = []
+
+def reset_servers():
+    for server in list(_servers.values()):
+        server.shutdown()
+    _servers.clear()
+
+def _rpc(name):
+    rpc_counts[name] += 1
+    if CONFIG['rpc_latency']:
+        time.sleep(CONFIG['rpc_latency'])
+
+# ----------------------------------------------------------------------------
+# geometry and controls
+# ----------------------------------------------------------------------------
+
+class Vector3D(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        return type(self)(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return type(self)(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, k):
+        return type(self)(self.x * k, self.y * k, self.z * k)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector3D) and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def __repr__(self):
+        return '%s(x=%.2f, y=%.2f, z=%.2f)' % (type(self).__name__, self.x, self.y, self.z)
+
+class Location(Vector3D):
+    def distance(self, other):
+        return (self - other).length()
+
+class Rotation(object):
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch = float(pitch)
+        self.yaw = float(yaw)
+        self.roll = float(roll)
+
+    def get_forward_vector(self):
+        yaw = math.radians(self.yaw)
+        pitch = math.radians(self.pitch)
+        return Vector3D(math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch))
+
+    def __repr__(self):
+        return 'Rotation(pitch=%.2f, yaw=%.2f, roll=%.2f)' % (self.pitch, self.yaw, self.roll)
+
+class Transform(object):
+    def __init__(self, location=None, rotation=None):
+        self.location = location if location is not None else Location()
+        self.rotation = rotation if rotation is not None else Rotation()
+
+    def get_forward_vector(self):
+        return self.rotation.get_forward_vector()
+
+    def __repr__(self):
+        return 'Transform(%r, %r)' % (self.location, self.rotation)
+
+class VehicleControl(object):
+    def __init__(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False, reverse=False,
+                 manual_gear_shift=False, gear=0):
+        self.throttle = throttle
+        self.steer = steer
+        self.brake = brake
+        self.hand_brake = hand_brake
+        self.reverse = reverse
+        self.manual_gear_shift = manual_gear_shift
+        self.gear = gear
+
+class WalkerControl(object):
+    def __init__(self, direction=None, speed=0.0, jump=False):
+        self.direction = direction if direction is not None else Vector3D(1.0, 0.0, 0.0)
+        self.speed = speed
+        self.jump = jump
+
+class VehicleLightState(enum.IntFlag):
+    NONE = 0
+    Position = 1
+    LowBeam = 2
+    HighBeam = 4
+    Brake = 8
+    RightBlinker = 16
+    LeftBlinker = 32
+    Reverse = 64
+    Fog = 128
+    Interior = 256
+    Special1 = 512
+    Special2 = 1024
+    All = 2047
+
+class ColorConverter(object):
+    Raw = 0
+    Depth = 1
+    LogarithmicDepth = 2
+    CityScapesPalette = 3
+
+class WeatherParameters(object):
+    _FIELDS = ('cloudiness', 'precipitation', 'precipitation_deposits', 'wind_intensity',
+              'sun_azimuth_angle', 'sun_altitude_angle', 'fog_density', 'fog_distance',
+              'fog_falloff', 'wetness', 'scattering_intensity', 'mie_scattering_scale',
+              'rayleigh_scattering_scale')
+
+    def __init__(self, cloudiness=0.0, precipitation=0.0, precipitation_deposits=0.0, wind_intensity=0.0,
+                 sun_azimuth_angle=0.0, sun_altitude_angle=0.0, fog_density=0.0, fog_distance=0.0,
+                 fog_falloff=0.0, wetness=0.0, scattering_intensity=0.0, mie_scattering_scale=0.0,
+                 rayleigh_scattering_scale=0.0331):
+        self.cloudiness = cloudiness
+        self.precipitation = precipitation
+        self.precipitation_deposits = precipitation_deposits
+        self.wind_intensity = wind_intensity
+        self.sun_azimuth_angle = sun_azimuth_angle
+        self.sun_altitude_angle = sun_altitude_angle
+        self.fog_density = fog_density
+        self.fog_distance = fog_distance
+        self.fog_falloff = fog_falloff
+        self.wetness = wetness
+        self.scattering_intensity = scattering_intensity
+        self.mie_scattering_scale = mie_scattering_scale
+        self.rayleigh_scattering_scale = rayleigh_scattering_scale
+
+    def __eq__(self, other):
+        return isinstance(other, WeatherParameters) and all(
+            getattr(self, f) == getattr(other, f) for f in self._FIELDS)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+def _preset(cloudiness, precipitation, deposits, wind, azimuth, altitude, wetness=0.0, fog=0.0):
+    return WeatherParameters(cloudiness=cloudiness, precipitation=precipitation, precipitation_deposits=deposits,
+                             wind_intensity=wind, sun_azimuth_angle=azimuth, sun_altitude_angle=altitude,
+                             wetness=wetness, fog_density=fog)
+
+WeatherParameters.Default = _preset(30.0, 0.0, 0.0, 10.0, 250.0, 45.0)
+WeatherParameters.ClearNoon = _preset(5.0, 0.0, 0.0, 10.0, 0.0, 75.0)
+WeatherParameters.CloudyNoon = _preset(60.0, 0.0, 0.0, 10.0, 0.0, 75.0)
+WeatherParameters.WetNoon = _preset(5.0, 0.0, 50.0, 10.0, 0.0, 75.0, wetness=50.0)
+WeatherParameters.WetCloudyNoon = _preset(60.0, 0.0, 50.0, 10.0, 0.0, 75.0, wetness=50.0)
+WeatherParameters.MidRainyNoon = _preset(60.0, 60.0, 60.0, 60.0, 0.0, 75.0, wetness=60.0, fog=3.0)
+WeatherParameters.HardRainNoon = _preset(100.0, 100.0, 90.0, 100.0, 0.0, 75.0, wetness=100.0, fog=7.0)
+WeatherParameters.SoftRainNoon = _preset(20.0, 30.0, 50.0, 30.0, 0.0, 75.0, wetness=30.0)
+WeatherParameters.ClearSunset = _preset(5.0, 0.0, 0.0, 10.0, 0.0, 15.0)
+WeatherParameters.CloudySunset = _preset(60.0, 0.0, 0.0, 10.0, 0.0, 15.0)
+WeatherParameters.WetSunset = _preset(5.0, 0.0, 50.0, 10.0, 0.0, 15.0, wetness=50.0)
+WeatherParameters.WetCloudySunset = _preset(60.0, 0.0, 50.0, 10.0, 0.0, 15.0, wetness=50.0)
+WeatherParameters.MidRainSunset = _preset(60.0, 60.0, 60.0, 60.0, 0.0, 15.0, wetness=60.0, fog=3.0)
+WeatherParameters.HardRainSunset = _preset(100.0, 100.0, 90.0, 100.0, 0.0, 15.0, wetness=100.0, fog=7.0)
+WeatherParameters.SoftRainSunset = _preset(20.0, 30.0, 50.0, 30.0, 0.0, 15.0, wetness=30.0)
+
+class OpendriveGenerationParameters(object):
+    def __init__(self, vertex_distance=2.0, max_road_length=50.0, wall_height=1.0, additional_width=0.6,
+                 smooth_junctions=True, enable_mesh_visibility=True):
+        self.vertex_distance = vertex_distance
+        self.max_road_length = max_road_length
+        self.wall_height = wall_height
+        self.additional_width = additional_width
+        self.smooth_junctions = smooth_junctions
+        self.enable_mesh_visibility = enable_mesh_visibility
+
+class Osm2Odr(object):
+    @staticmethod
+    def convert(osm_data):
+        ways = osm_data.count('<way')
+        return '<?xml version="1.0"?>\n<OpenDRIVE><header name="osm"/><!-- %d ways, %d bytes --></OpenDRIVE>\n' % (
+            ways, len(osm_data))
+
+# ----------------------------------------------------------------------------
+# blueprints
+# ----------------------------------------------------------------------------
+
+class ActorAttribute(object):
+    def __init__(self, attr_id, value, recommended_values=(), modifiable=True):
+        self.id = attr_id
+        self.value = str(value)
+        self.recommended_values = list(recommended_values)
+        self.is_modifiable = modifiable
+
+    def as_str(self):
+        return self.value
+
+    def as_int(self):
+        return int(float(self.value))
+
+    def as_float(self):
+        return float(self.value)
+
+    def as_bool(self):
+        return self.value.lower() in ('true', '1')
+
+    def __str__(self):
+        return self.value
+
+class ActorBlueprint(object):
+    def __init__(self, bp_id, tags, attributes):
+        self.id = bp_id
+        self.tags = list(tags)
+        self._attributes = attributes
+
+    def has_attribute(self, name):
+        return name in self._attributes
+
+    def has_tag(self, tag):
+        return tag in self.tags
+
+    def get_attribute(self, name):
+        if name not in self._attributes:
+            raise IndexError('blueprint %r has no attribute %r' % (self.id, name))
+        return self._attributes[name]
+
+    def set_attribute(self, name, value):
+        attribute = self.get_attribute(name)
+        if not attribute.is_modifiable:
+            raise IndexError('attribute %r of %r is not modifiable' % (name, self.id))
+        attribute.value = str(value)
+
+    def match_tags(self, pattern):
+        return fnmatch.fnmatchcase(self.id, pattern) or any(fnmatch.fnmatchcase(t, pattern) for t in self.tags)
+
+    def __iter__(self):
+        return iter(self._attributes.values())
+
+    def __len__(self):
+        return len(self._attributes)
+
+    def __repr__(self):
+        return 'ActorBlueprint(id=%s)' % self.id
+
+class BlueprintLibrary(object):
+    def __init__(self, blueprints):
+        self._blueprints = list(blueprints)
+
+    def filter(self, pattern):
+        return BlueprintLibrary(bp for bp in self._blueprints if bp.match_tags(pattern))
+
+    def find(self, bp_id):
+        for bp in self._blueprints:
+            if bp.id == bp_id:
+                return copy.deepcopy(bp)
+        raise IndexError('blueprint %r not found' % bp_id)
+
+    def __iter__(self):
+        return iter(self._blueprints)
+
+    def __len__(self):
+        return len(self._blueprints)
+
+    def __getitem__(self, index):
+        return self._blueprints[index]
+
+VEHICLES = [
+    'audi.a2', 'audi.etron', 'audi.tt', 'bh.crossbike', 'bmw.grandtourer', 'bmw.isetta', 'carlamotors.carlacola',
+    'chevrolet.impala', 'citroen.c3', 'diamondback.century', 'dodge_charger.police', 'gazelle.omafiets',
+    'harleydavidson.low_rider', 'jeep.wrangler_rubicon', 'kawasaki.ninja', 'lincoln.mkz2017',
+    'mercedes-benz.coupe', 'mini.cooperst', 'mustang.mustang', 'nissan.micra', 'nissan.patrol', 'seat.leon',
+    'tesla.cybertruck', 'tesla.model3', 'toyota.prius', 'volkswagen.t2', 'yamaha.yzf']
+TWO_WHEELS = ('bh.crossbike', 'diamondback.century', 'gazelle.omafiets', 'harleydavidson.low_rider',
+              'kawasaki.ninja', 'yamaha.yzf')
+COLORS = ['255,255,255', '0,0,0', '200,20,20', '20,20,200', '120,120,120']
+
+def _camera_attributes(extra=()):
+    attributes = {
+        'image_size_x': ActorAttribute('image_size_x', 800),
+        'image_size_y': ActorAttribute('image_size_y', 600),
+        'fov': ActorAttribute('fov', 90.0),
+        'sensor_tick': ActorAttribute('sensor_tick', 0.0),
+        'role_name': ActorAttribute('role_name', 'front')}
+    for name, value in extra:
+        attributes[name] = ActorAttribute(name, value)
+    return attributes
+
+def _build_library():
+    blueprints = []
+    for name in VEHICLES:
+        wheels = 2 if name in TWO_WHEELS else 4
+        attributes = {
+            'number_of_wheels': ActorAttribute('number_of_wheels', wheels, modifiable=False),
+            'role_name': ActorAttribute('role_name', 'autopilot', ['autopilot', 'hero']),
+            'sticky_control': ActorAttribute('sticky_control', 'true')}
+        if wheels == 4:
+            attributes['color'] = ActorAttribute('color', COLORS[0], COLORS)
+        else:
+            attributes['driver_id'] = ActorAttribute('driver_id', 0, ['0', '1', '2'])
+        blueprints.append(ActorBlueprint('vehicle.' + name, ['vehicle'] + name.split('.'), attributes))
+    for i in range(1, 15):
+        attributes = {
+            'speed': ActorAttribute('speed', 1.4, ['0.0', '1.4', '2.5']),
+            'is_invincible': ActorAttribute('is_invincible', 'true'),
+            'role_name': ActorAttribute('role_name', 'pedestrian')}
+        blueprints.append(ActorBlueprint('walker.pedestrian.%04d' % i, ['walker', 'pedestrian'], attributes))
+    blueprints.append(ActorBlueprint('controller.ai.walker', ['controller', 'ai', 'walker'], {}))
+    lens = [('lens_circle_multiplier', 0.0), ('lens_circle_falloff', 5.0),
+            ('chromatic_aberration_intensity', 0.0), ('chromatic_aberration_offset', 0.0)]
+    blueprints.append(ActorBlueprint('sensor.camera.rgb', ['sensor', 'camera', 'rgb'], _camera_attributes(lens)))
+    blueprints.append(ActorBlueprint('sensor.camera.depth', ['sensor', 'camera', 'depth'], _camera_attributes()))
+    blueprints.append(ActorBlueprint('sensor.camera.semantic_segmentation',
+                                     ['sensor', 'camera', 'semantic_segmentation'], _camera_attributes()))
+    blueprints.append(ActorBlueprint('sensor.camera.dvs', ['sensor', 'camera', 'dvs'], _camera_attributes(
+        [('positive_threshold', 0.3), ('negative_threshold', 0.3), ('events_per_pixel', 0.02)])))
+    blueprints.append(ActorBlueprint('sensor.lidar.ray_cast', ['sensor', 'lidar', 'ray_cast'], {
+        'range': ActorAttribute('range', 10.0),
+        'channels': ActorAttribute('channels', 32),
+        'points_per_second': ActorAttribute('points_per_second', 56000),
+        'rotation_frequency': ActorAttribute('rotation_frequency', 10.0),
+        'sensor_tick': ActorAttribute('sensor_tick', 0.0),
+        'role_name': ActorAttribute('role_name', 'front')}))
+    return blueprints
+
+# ----------------------------------------------------------------------------
+# sensor data
+# ----------------------------------------------------------------------------
+
+class SensorData(object):
+    def __init__(self, frame, timestamp, transform):
+        self.frame = frame
+        self.frame_number = frame
+        self.timestamp = timestamp
+        self.transform = transform
+        self.emitted = time.perf_counter()
+
+class Image(SensorData):
+    def __init__(self, frame, timestamp, transform, width, height, fov, buffer):
+        super(Image, self).__init__(frame, timestamp, transform)
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self._buffer = buffer
+
+    @property
+    def raw_data(self):
+        return memoryview(self._buffer)
+
+    def convert(self, color_converter):
+        if color_converter == ColorConverter.Raw:
+            return
+        bgra = np.frombuffer(self._buffer, dtype=np.uint8).reshape(self.height, self.width, 4)
+        out = bgra.copy()
+        if color_converter in (ColorConverter.Depth, ColorConverter.LogarithmicDepth):
+            depth = (bgra[:, :, 2] + bgra[:, :, 1] * 256.0 + bgra[:, :, 0] * 65536.0) / 16777215.0
+            if color_converter == ColorConverter.LogarithmicDepth:
+                depth = np.clip(1.0 + np.log(np.maximum(depth, 1e-6)) / 5.70378, 0.0, 1.0)
+            gray = (depth * 255.0).astype(np.uint8)
+            out[:, :, 0] = out[:, :, 1] = out[:, :, 2] = gray
+        elif color_converter == ColorConverter.CityScapesPalette:
+            out[:, :, :3] = _CITYSCAPES[np.minimum(bgra[:, :, 2], len(_CITYSCAPES) - 1)]
+        self._buffer = out.tobytes()
+
+    def save_to_disk(self, path, color_converter=ColorConverter.Raw):
+        self.convert(color_converter)
+        with open(path, 'wb') as f:
+            f.write(self._buffer)
+
+# BGR colors by semantic tag
+_CITYSCAPES = np.array([
+    (0, 0, 0), (70, 70, 70), (40, 40, 100), (80, 90, 55), (60, 20, 220), (153, 153, 153), (50, 234, 157),
+    (128, 64, 128), (232, 35, 244), (35, 142, 107), (142, 0, 0), (156, 102, 102), (0, 220, 220),
+    (180, 130, 70), (81, 0, 81), (100, 100, 150), (140, 150, 230), (180, 165, 180), (30, 170, 250),
+    (160, 190, 110), (50, 120, 170), (150, 60, 45), (100, 170, 145)], dtype=np.uint8)
+
+DVS_EVENT_DTYPE = np.dtype([('x', np.uint16), ('y', np.uint16), ('t', np.int64), ('pol', np.bool_)])
+
+class DVSEventArray(SensorData):
+    def __init__(self, frame, timestamp, transform, width, height, fov, buffer):
+        super(DVSEventArray, self).__init__(frame, timestamp, transform)
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self._buffer = buffer
+
+    @property
+    def raw_data(self):
+        return memoryview(self._buffer)
+
+    def __len__(self):
+        return len(self._buffer) // DVS_EVENT_DTYPE.itemsize
+
+    def convert(self, color_converter):
+        pass
+
+class LidarMeasurement(SensorData):
+    def __init__(self, frame, timestamp, transform, channels, horizontal_angle, buffer):
+        super(LidarMeasurement, self).__init__(frame, timestamp, transform)
+        self.channels = channels
+        self.horizontal_angle = horizontal_angle
+        self._buffer = buffer
+
+    @property
+    def raw_data(self):
+        return memoryview(self._buffer)
+
+    def __len__(self):
+        return len(self._buffer) // 16
+
+    def get_point_count(self, channel):
+        return len(self) // self.channels
+
+class _Synthesizer(object):
+    # a few precomputed buffers per sensor so that generating data costs
+    # next to nothing compared to the client code being measured
+    VARIANTS = 4
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.rng = np.random.default_rng(CONFIG['seed'] + sensor.id)
+        kind = sensor.type_id
+        self._buffers = [self._make(kind, i) for i in range(self.VARIANTS)]
+
+    def _size(self):
+        return (self.sensor.attributes_int('image_size_x'), self.sensor.attributes_int('image_size_y'))
+
+    def _make(self, kind, variant):
+        if kind == 'sensor.lidar.ray_cast':
+            points = int(self.sensor.attributes_float('points_per_second') /
+                         max(self.sensor.attributes_float('rotation_frequency'), 1e-3))
+            max_range = self.sensor.attributes_float('range')
+            azimuth = self.rng.uniform(0.0, 2.0 * np.pi, points)
+            elevation = self.rng.uniform(-0.4, 0.2, points)
+            distance = self.rng.uniform(1.0, max_range, points)
+            xyzi = np.empty((points, 4), dtype=np.float32)
+            xyzi[:, 0] = distance * np.cos(elevation) * np.cos(azimuth)
+            xyzi[:, 1] = distance * np.cos(elevation) * np.sin(azimuth)
+            xyzi[:, 2] = distance * np.sin(elevation)
+            xyzi[:, 3] = self.rng.uniform(0.0, 1.0, points)
+            return xyzi.tobytes()
+        width, height = self._size()
+        if kind == 'sensor.camera.dvs':
+            count = int(width * height * self.sensor.attributes_float('events_per_pixel'))
+            events = np.empty(count, dtype=DVS_EVENT_DTYPE)
+            events['x'] = self.rng.integers(0, width, count)
+            events['y'] = self.rng.integers(0, height, count)
+            events['t'] = np.sort(self.rng.integers(0, 50000, count))
+            events['pol'] = self.rng.integers(0, 2, count).astype(bool)
+            return events.tobytes()
+        bgra = np.empty((height, width, 4), dtype=np.uint8)
+        bgra[:, :, 3] = 255
+        rows = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+        cols = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :]
+        if kind == 'sensor.camera.depth':
+            # normalized depth encoded as R + G * 256 + B * 256 ** 2 over 1000 m
+            depth = np.clip(0.002 + 0.2 * (1.0 - rows) ** 2 + 0.01 * variant + 0 * cols, 0.0, 1.0)
+            encoded = (depth * 16777215.0).astype(np.uint32)
+            bgra[:, :, 2] = encoded & 0xff
+            bgra[:, :, 1] = (encoded >> 8) & 0xff
+            bgra[:, :, 0] = (encoded >> 16) & 0xff
+        elif kind == 'sensor.camera.semantic_segmentation':
+            tags = (rows * 10 + cols * 12 + variant).astype(np.uint8) % 23
+            bgra[:, :, 2] = tags
+            bgra[:, :, 1] = 0
+            bgra[:, :, 0] = 0
+        else:
+            bgra[:, :, :3] = self.rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        return bgra.tobytes()
+
+    def make(self, frame, timestamp):
+        sensor = self.sensor
+        buffer = self._buffers[frame % self.VARIANTS]
+        transform = sensor.get_transform()
+        kind = sensor.type_id
+        if kind == 'sensor.lidar.ray_cast':
+            return LidarMeasurement(frame, timestamp, transform, sensor.attributes_int('channels'), 0.0, buffer)
+        width, height = self._size()
+        fov = sensor.attributes_float('fov')
+        if kind == 'sensor.camera.dvs':
+            return DVSEventArray(frame, timestamp, transform, width, height, fov, buffer)
+        return Image(frame, timestamp, transform, width, height, fov, buffer)
+
+class _Streamer(object):
+    # sensor callbacks run on their own thread, as with the real client
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='fake-carla-stream', daemon=True)
+        self._thread.start()
+
+    def push(self, callback, data):
+        self._queue.put((callback, data))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            callback, data = item
+            started = time.perf_counter()
+            try:
+                callback(data)
+            except Exception:
+                traceback.print_exc()
+            finished = time.perf_counter()
+            stream_stats['deliveries'] += 1
+            stream_stats['queue_latency'].append(started - data.emitted)
+            stream_stats['callback_time'].append(finished - started)
+            self._queue.task_done()
+
+    def drain(self, timeout=5.0):
+        deadline = time.time() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                done.wait(remaining)
+        return True
+
+    def stop(self):
+        self._queue.put(None)
+
+# ----------------------------------------------------------------------------
+# actors
+# ----------------------------------------------------------------------------
+
+class Actor(object):
+    # transforms, velocities and controls come from the per-tick episode
+    # state in the real client, so reading them is not counted as an RPC
+    def __init__(self, server, actor_id, blueprint, transform, parent=None):
+        self._server = server
+        self.id = actor_id
+        self.type_id = blueprint.id
+        self.attributes = dict((a.id, a.value) for a in blueprint)
+        self.semantic_tags = []
+        self.parent = parent
+        self.is_alive = True
+        self._transform = copy.deepcopy(transform)
+        self._velocity = Vector3D()
+        self._angular_velocity = Vector3D()
+        self._simulate_physics = True
+
+    def attributes_int(self, name):
+        return int(float(self.attributes[name]))
+
+    def attributes_float(self, name):
+        return float(self.attributes[name])
+
+    def get_world(self):
+        return self._server.world
+
+    def get_transform(self):
+        if self.parent is not None:
+            base = self.parent._transform
+            location = base.location + self._transform.location
+            return Transform(Location(location.x, location.y, location.z), copy.copy(base.rotation))
+        return copy.deepcopy(self._transform)
+
+    def get_location(self):
+        return self.get_transform().location
+
+    def get_velocity(self):
+        return Vector3D(self._velocity.x, self._velocity.y, self._velocity.z)
+
+    def get_angular_velocity(self):
+        return Vector3D(self._angular_velocity.x, self._angular_velocity.y, self._angular_velocity.z)
+
+    def set_transform(self, transform):
+        _rpc('set_transform')
+        self._transform = copy.deepcopy(transform)
+
+    def set_location(self, location):
+        _rpc('set_location')
+        self._transform.location = Location(location.x, location.y, location.z)
+
+    def set_target_velocity(self, velocity):
+        _rpc('set_target_velocity')
+        self._velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def set_target_angular_velocity(self, velocity):
+        _rpc('set_target_angular_velocity')
+        self._angular_velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def set_simulate_physics(self, enabled=True):
+        _rpc('set_simulate_physics')
+        self._simulate_physics = enabled
+
+    def destroy(self):
+        _rpc('destroy')
+        return self._server.destroy(self.id)
+
+    def _step(self, delta):
+        pass
+
+    def __repr__(self):
+        return 'Actor(id=%d, type=%s)' % (self.id, self.type_id)
+
+class Vehicle(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Vehicle, self).__init__(*args, **kwargs)
+        self._control = VehicleControl()
+        self._autopilot = False
+        self._light_state = VehicleLightState.NONE
+
+    def apply_control(self, control):
+        _rpc('apply_control')
+        self._control = copy.copy(control)
+
+    def get_control(self):
+        return copy.copy(self._control)
+
+    def set_autopilot(self, enabled=True, tm_port=8000):
+        _rpc('set_autopilot')
+        self._autopilot = enabled
+
+    def set_light_state(self, light_state):
+        _rpc('set_light_state')
+        self._light_state = VehicleLightState(light_state)
+
+    def get_light_state(self):
+        _rpc('get_light_state')
+        return self._light_state
+
+    def _step(self, delta):
+        if not self._simulate_physics:
+            return
+        forward = self._transform.rotation.get_forward_vector()
+        if self._autopilot:
+            speed = 8.0
+        else:
+            current = self._velocity.length()
+            speed = max(0.0, current + (6.0 * self._control.throttle - 9.0 * self._control.brake - 0.5) * delta)
+            speed = min(speed, 30.0)
+            self._transform.rotation.yaw += 30.0 * self._control.steer * delta
+        self._velocity = Vector3D(forward.x * speed, forward.y * speed, 0.0)
+        self._transform.location = self._transform.location + Location(forward.x, forward.y, 0.0) * (speed * delta)
+
+class Walker(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Walker, self).__init__(*args, **kwargs)
+        self._control = WalkerControl()
+
+    def apply_control(self, control):
+        _rpc('apply_control')
+        self._control = copy.copy(control)
+
+    def get_control(self):
+        return copy.copy(self._control)
+
+    def _step(self, delta):
+        direction = self._control.direction
+        self._velocity = Vector3D(direction.x, direction.y, direction.z) * self._control.speed
+        self._transform.location = self._transform.location + Location(
+            self._velocity.x, self._velocity.y, self._velocity.z) * delta
+
+class WalkerAIController(Actor):
+    def __init__(self, *args, **kwargs):
+        super(WalkerAIController, self).__init__(*args, **kwargs)
+        self._running = False
+        self._target = None
+        self._max_speed = 1.4
+
+    def start(self):
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def go_to_location(self, location):
+        self._target = Location(location.x, location.y, location.z)
+
+    def set_max_speed(self, speed=1.4):
+        self._max_speed = float(speed)
+
+    def _step(self, delta):
+        walker = self.parent
+        if not self._running or self._target is None or walker is None or not walker.is_alive:
+            return
+        offset = self._target - walker._transform.location
+        distance = offset.length()
+        if distance < 0.5:
+            self._target = self._server.random_navigation_location()
+            return
+        step = min(distance, self._max_speed * delta)
+        walker._transform.location = walker._transform.location + Location(offset.x, offset.y, offset.z) * (step / distance)
+
+class Sensor(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Sensor, self).__init__(*args, **kwargs)
+        self.is_listening = False
+        self._callback = None
+        self._synthesizer = None
+        self._next_emit = 0.0
+
+    def listen(self, callback):
+        _rpc('listen')
+        if self._synthesizer is None:
+            self._synthesizer = _Synthesizer(self)
+        self._callback = callback
+        self.is_listening = True
+
+    def stop(self):
+        _rpc('stop')
+        self.is_listening = False
+        self._callback = None
+
+    def _emit(self, frame, timestamp):
+        if not self.is_listening:
+            return
+        if timestamp.elapsed_seconds + 1e-9 < self._next_emit:
+            return
+        self._next_emit = timestamp.elapsed_seconds + float(self.attributes.get('sensor_tick', 0.0))
+        self._server.streamer.push(self._callback, self._synthesizer.make(frame, timestamp.elapsed_seconds))
+
+ServerSideSensor = Sensor
+
+class ActorList(list):
+    def filter(self, pattern):
+        return ActorList(a for a in self if fnmatch.fnmatchcase(a.type_id, pattern))
+
+    def find(self, actor_id):
+        for actor in self:
+            if actor.id == actor_id:
+                return actor
+        return None
+
+# ----------------------------------------------------------------------------
+# world
+# ----------------------------------------------------------------------------
+
+class Timestamp(object):
+    def __init__(self, frame, elapsed_seconds, delta_seconds, platform_timestamp):
+        self.frame = frame
+        self.frame_count = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = platform_timestamp
+
+class WorldSnapshot(object):
+    def __init__(self, timestamp, actors):
+        self.timestamp = timestamp
+        self.frame = timestamp.frame
+        self.id = timestamp.frame
+        self._actors = actors
+
+    def __len__(self):
+        return self._actors
+
+class WorldSettings(object):
+    def __init__(self, synchronous_mode=False, no_rendering_mode=False, fixed_delta_seconds=None):
+        self.synchronous_mode = synchronous_mode
+        self.no_rendering_mode = no_rendering_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+
+class Waypoint(object):
+    def __init__(self, transform, road_id, section_id, lane_id, is_junction):
+        self.transform = transform
+        self.road_id = road_id
+        self.section_id = section_id
+        self.lane_id = lane_id
+        self.is_junction = is_junction
+        self.id = hash((road_id, section_id, lane_id, round(transform.location.x, 1), round(transform.location.y, 1)))
+
+class Map(object):
+    def __init__(self, name, opendrive=None):
+        self.name = name
+        self._opendrive = opendrive or '<?xml version="1.0"?>\n<OpenDRIVE><header name="%s"/></OpenDRIVE>\n' % name
+        rng = np.random.default_rng(CONFIG['seed'] + sum(map(ord, name)))
+        size = CONFIG['map_size']
+        count = CONFIG['spawn_points']
+        xy = rng.uniform(-size / 2.0, size / 2.0, (count, 2))
+        # a handful of tight clusters, like spawn points around junctions
+        clusters = max(1, count // 20)
+        xy[:clusters * 3] = np.repeat(xy[:clusters], 3, axis=0) + rng.normal(0.0, 1.5, (clusters * 3, 2))
+        yaw = rng.choice([0.0, 90.0, 180.0, 270.0], count)
+        self._spawn_points = [Transform(Location(x, y, 0.3), Rotation(yaw=w)) for (x, y), w in zip(xy, yaw)]
+
+    def get_spawn_points(self):
+        _rpc('get_spawn_points')
+        return [copy.deepcopy(t) for t in self._spawn_points]
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=None):
+        road_id = int((location.x + 1000.0) // 50.0) * 100 + int((location.y + 1000.0) // 50.0)
+        lane_id = -1 if int(location.x) % 2 else 1
+        is_junction = (int(abs(location.x)) % 50) < 6 and (int(abs(location.y)) % 50) < 6
+        return Waypoint(Transform(Location(location.x, location.y, location.z)), road_id, 0, lane_id, is_junction)
+
+    def to_opendrive(self):
+        _rpc('to_opendrive')
+        return self._opendrive
+
+class _Server(object):
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.library = _build_library()
+        self.lock = threading.RLock()
+        self.tick_cond = threading.Condition(self.lock)
+        self.streamer = _Streamer()
+        self.rng = np.random.default_rng(CONFIG['seed'])
+        self.traffic_managers = {}
+        self._running = True
+        self.load('Town03')
+        self._ticker = threading.Thread(target=self._run_async, name='fake-carla-server', daemon=True)
+        self._ticker.start()
+
+    def load(self, map_name, opendrive=None):
+        with self.lock:
+            self.map = Map('Carla/Maps/' + map_name, opendrive)
+            self.actors = {}
+            self.ids = itertools.count(1)
+            self.frame = 0
+            self.elapsed = 0.0
+            self.settings = WorldSettings()
+            self.weather = copy.deepcopy(WeatherParameters.Default)
+            self.on_tick = {}
+            self.on_tick_ids = itertools.count(1)
+            self.world = World(self)
+        return self.world
+
+    def shutdown(self):
+        self._running = False
+        self.streamer.stop()
+
+    def _run_async(self):
+        # in asynchronous mode the "server" ticks on its own
+        while self._running:
+            interval = 1.0 / CONFIG['async_fps']
+            time.sleep(interval)
+            with self.lock:
+                if not self.settings.synchronous_mode:
+                    self.step(interval)
+
+    def step(self, delta=None):
+        with self.lock:
+            if delta is None:
+                delta = self.settings.fixed_delta_seconds or CONFIG['default_delta']
+            self.frame += 1
+            self.elapsed += delta
+            timestamp = Timestamp(self.frame, self.elapsed, delta, time.time())
+            for actor in list(self.actors.values()):
+                actor._step(delta)
+            for actor in list(self.actors.values()):
+                if isinstance(actor, Sensor):
+                    actor._emit(self.frame, timestamp)
+            callbacks = list(self.on_tick.values())
+            self.tick_cond.notify_all()
+        snapshot = WorldSnapshot(timestamp, len(self.actors))
+        for callback in callbacks:
+            callback(snapshot)
+        return self.frame
+
+    def spawn(self, blueprint, transform, parent_id=None):
+        with self.lock:
+            parent = None
+            if parent_id:
+                parent = self.actors.get(parent_id)
+                if parent is None:
+                    raise RuntimeError('parent actor %d not found' % parent_id)
+            kind = blueprint.id
+            if kind.startswith('vehicle.') or kind.startswith('walker.'):
+                radius = CONFIG['collision_radius']
+                for other in self.actors.values():
+                    if isinstance(other, (Vehicle, Walker)) and \
+                            other._transform.location.distance(transform.location) < radius:
+                        raise RuntimeError('Spawn failed because of collision at spawn position')
+                cls = Vehicle if kind.startswith('vehicle.') else Walker
+            elif kind.startswith('sensor.'):
+                cls = Sensor
+            elif kind == 'controller.ai.walker':
+                cls = WalkerAIController
+            else:
+                cls = Actor
+            actor = cls(self, next(self.ids), copy.deepcopy(blueprint), transform, parent)
+            self.actors[actor.id] = actor
+            return actor
+
+    def destroy(self, actor_id):
+        with self.lock:
+            actor = self.actors.pop(actor_id, None)
+            if actor is None:
+                return False
+            actor.is_alive = False
+            if isinstance(actor, Sensor):
+                actor.is_listening = False
+            return True
+
+    def random_navigation_location(self):
+        size = CONFIG['map_size']
+        x, y = self.rng.uniform(-size / 2.0, size / 2.0, 2)
+        return Location(x, y, 1.0)
+
+class World(object):
+    def __init__(self, server):
+        self._server = server
+        self.id = id(self)
+
+    def get_map(self):
+        _rpc('get_map')
+        return self._server.map
+
+    def get_blueprint_library(self):
+        _rpc('get_blueprint_library')
+        return BlueprintLibrary(copy.deepcopy(self._server.library))
+
+    def get_spectator(self):
+        return None
+
+    def get_settings(self):
+        _rpc('get_settings')
+        settings = self._server.settings
+        return WorldSettings(settings.synchronous_mode, settings.no_rendering_mode, settings.fixed_delta_seconds)
+
+    def apply_settings(self, settings):
+        _rpc('apply_settings')
+        self._server.settings = WorldSettings(settings.synchronous_mode, settings.no_rendering_mode,
+                                              settings.fixed_delta_seconds)
+        return self._server.frame
+
+    def get_weather(self):
+        _rpc('get_weather')
+        return copy.deepcopy(self._server.weather)
+
+    def set_weather(self, weather):
+        _rpc('set_weather')
+        self._server.weather = copy.deepcopy(weather)
+
+    def get_snapshot(self):
+        _rpc('get_snapshot')
+        server = self._server
+        return WorldSnapshot(Timestamp(server.frame, server.elapsed, 0.0, time.time()), len(server.actors))
+
+    def spawn_actor(self, blueprint, transform, attach_to=None, attachment_type=None):
+        _rpc('spawn_actor')
+        return self._server.spawn(blueprint, transform, attach_to.id if attach_to is not None else None)
+
+    def try_spawn_actor(self, blueprint, transform, attach_to=None, attachment_type=None):
+        try:
+            return self.spawn_actor(blueprint, transform, attach_to, attachment_type)
+        except RuntimeError:
+            return None
+
+    def get_actor(self, actor_id):
+        _rpc('get_actor')
+        return self._server.actors.get(actor_id)
+
+    def get_actors(self, actor_ids=None):
+        _rpc('get_actors')
+        actors = self._server.actors
+        if actor_ids is None:
+            return ActorList(actors.values())
+        return ActorList(actors[i] for i in actor_ids if i in actors)
+
+    def tick(self, seconds=10.0):
+        _rpc('tick')
+        return self._server.step()
+
+    def wait_for_tick(self, seconds=10.0):
+        _rpc('wait_for_tick')
+        server = self._server
+        with server.tick_cond:
+            frame = server.frame
+            if not server.tick_cond.wait_for(lambda: server.frame > frame, seconds):
+                raise RuntimeError('time-out of %.0f ms while waiting for the simulator' % (seconds * 1000.0))
+            return WorldSnapshot(Timestamp(server.frame, server.elapsed, 0.0, time.time()), len(server.actors))
+
+    def on_tick(self, callback):
+        server = self._server
+        callback_id = next(server.on_tick_ids)
+        server.on_tick[callback_id] = callback
+        return callback_id
+
+    def remove_on_tick(self, callback_id):
+        self._server.on_tick.pop(callback_id, None)
+
+    def get_random_location_from_navigation(self):
+        rpc_counts['navigation'] += 1
+        return self._server.random_navigation_location()
+
+    def set_pedestrians_cross_factor(self, percentage):
+        _rpc('set_pedestrians_cross_factor')
+
+    def wait_for_stream(self, timeout=5.0):
+        # fake-only helper: block until every pending sensor callback ran
+        self._server.streamer.drain(timeout)
+
+# ----------------------------------------------------------------------------
+# commands
+# ----------------------------------------------------------------------------
+
+class _Command(object):
+    actor_field = 'actor_id'
+
+    def __init__(self):
+        self.do_after = []
+
+    def then(self, command):
+        self.do_after.append(command)
+        return self
+
+class _SpawnActor(_Command):
+    def __init__(self, blueprint, transform, parent_id=None):
+        super(_SpawnActor, self).__init__()
+        self.blueprint = copy.deepcopy(blueprint)
+        self.transform = transform
+        self.parent_id = parent_id
+
+    def run(self, server):
+        return server.spawn(self.blueprint, self.transform, self.parent_id).id
+
+class _ActorCommand(_Command):
+    def __init__(self, actor, *args):
+        super(_ActorCommand, self).__init__()
+        self.actor_id = actor.id if isinstance(actor, Actor) else actor
+        self.args = args
+
+    def _actor(self, server):
+        actor = server.actors.get(self.actor_id)
+        if actor is None:
+            raise RuntimeError('actor %d not found' % self.actor_id)
+        return actor
+
+class _DestroyActor(_ActorCommand):
+    def run(self, server):
+        if not server.destroy(self.actor_id):
+            raise RuntimeError('actor %d not found' % self.actor_id)
+        return self.actor_id
+
+def _actor_command(method, attribute=None):
+    class Command(_ActorCommand):
+        def run(self, server):
+            actor = self._actor(server)
+            if attribute is not None:
+                setattr(actor, attribute, copy.copy(self.args[0]))
+            else:
+                getattr(actor.__class__, method)(actor, *self.args)
+            return self.actor_id
+    return Command
+
+class command(object):
+    SpawnActor = _SpawnActor
+    DestroyActor = _DestroyActor
+    ApplyVehicleControl = _actor_command('apply_control', '_control')
+    ApplyWalkerControl = _actor_command('apply_control', '_control')
+    ApplyTransform = _actor_command('set_transform', '_transform')
+    ApplyTargetVelocity = _actor_command('set_target_velocity', '_velocity')
+    ApplyTargetAngularVelocity = _actor_command('set_target_angular_velocity', '_angular_velocity')
+    SetSimulatePhysics = _actor_command('set_simulate_physics', '_simulate_physics')
+    SetVehicleLightState = _actor_command('set_light_state', '_light_state')
+    SetAutopilot = _actor_command('set_autopilot', '_autopilot')
+    FutureActor = 0
+
+    class Response(object):
+        def __init__(self, actor_id=0, error=''):
+            self.actor_id = actor_id
+            self.error = error
+
+        def has_error(self):
+            return bool(self.error)
+
+def _run_batch(server, commands):
+    responses = []
+    with server.lock:
+        for cmd in commands:
+            try:
+                actor_id = cmd.run(server)
+                for follow in cmd.do_after:
+                    if getattr(follow, 'actor_id', None) == command.FutureActor:
+                        follow = copy.copy(follow)
+                        follow.actor_id = actor_id
+                    follow.run(server)
+                responses.append(command.Response(actor_id, ''))
+            except RuntimeError as error:
+                responses.append(command.Response(0, str(error)))
+    return responses
+
+# ----------------------------------------------------------------------------
+# client and traffic manager
+# ----------------------------------------------------------------------------
+
+class TrafficManager(object):
+    def __init__(self, server, port):
+        self._server = server
+        self._port = port
+        self.synchronous_mode = False
+        self.hybrid_physics_mode = False
+        self.hybrid_physics_radius = 50.0
+
+    def get_port(self):
+        return self._port
+
+    def set_synchronous_mode(self, mode=True):
+        _rpc('tm_set_synchronous_mode')
+        self.synchronous_mode = mode
+
+    def set_hybrid_physics_mode(self, enabled=True):
+        _rpc('tm_set_hybrid_physics_mode')
+        self.hybrid_physics_mode = enabled
+
+    def set_hybrid_physics_radius(self, radius=50.0):
+        _rpc('tm_set_hybrid_physics_radius')
+        self.hybrid_physics_radius = radius
+
+    def set_global_distance_to_leading_vehicle(self, distance):
+        _rpc('tm_set_global_distance_to_leading_vehicle')
+
+    def global_percentage_speed_difference(self, percentage):
+        _rpc('tm_global_percentage_speed_difference')
+
+    def set_random_device_seed(self, seed):
+        _rpc('tm_set_random_device_seed')
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+def _server_for(host, port):
+    with _servers_lock:
+        key = (host, port)
+        if key not in _servers:
+            _servers[key] = _Server(host, port)
+        return _servers[key]
+
+class Client(object):
+    def __init__(self, host='127.0.0.1', port=2000, worker_threads=0):
+        self._server = _server_for(host, port)
+        self._timeout = 10.0
+
+    def set_timeout(self, seconds):
+        self._timeout = seconds
+
+    def get_client_version(self):
+        return '0.9.10-fake'
+
+    def get_server_version(self):
+        _rpc('get_server_version')
+        return '0.9.10-fake'
+
+    def get_world(self):
+        _rpc('get_world')
+        return self._server.world
+
+    def get_available_maps(self):
+        _rpc('get_available_maps')
+        return ['/Game/Carla/Maps/Town%02d' % i for i in range(1, 8)] + ['/Game/Carla/Maps/Town10HD']
+
+    def load_world(self, map_name):
+        _rpc('load_world')
+        return self._server.load(map_name)
+
+    def reload_world(self):
+        _rpc('reload_world')
+        return self._server.load(self._server.map.name.split('/')[-1])
+
+    def generate_opendrive_world(self, opendrive, parameters=None):
+        _rpc('generate_opendrive_world')
+        return self._server.load('OpenDriveMap', opendrive)
+
+    def get_trafficmanager(self, port=8000):
+        _rpc('get_trafficmanager')
+        managers = self._server.traffic_managers
+        if port not in managers:
+            managers[port] = TrafficManager(self._server, port)
+        return managers[port]
+
+    def apply_batch(self, commands):
+        _rpc('apply_batch')
+        _run_batch(self._server, commands)
+
+    def apply_batch_sync(self, commands, do_tick=False):
+        _rpc('apply_batch_sync')
+        responses = _run_batch(self._server, commands)
+        if do_tick:
+            self._server.step()
+        return responses
@@ -0,0 +1,335 @@
+"""Run the client's hot paths against the pure-Python simulator stand-in in
+benchmarks/sim and report rate, RPC counts, sensor callback latency and
+allocations for each, so changes can be compared without a server.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only camera_display,controls_bus --frames 500 --json results.jsonl
+
+Every benchmark runs twice: once for timing, RPC counts and callback
+latency, and once under tracemalloc for peak and retained memory.
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(HERE, 'sim'))
+
+import numpy as np
+import pygame
+import carla
+from util import lidar
+from util import image_decode
+from util import dvs
+from util.actor import IM_WIDTH, IM_HEIGHT
+from util.sync_driver import SynchronousDriver
+from util.world import World
+from util.snapshot import StateSnapshot
+
+BENCHMARKS = OrderedDict()
+
+def benchmark(unit):
+    def register(fn):
+        BENCHMARKS[fn.__name__] = (fn, unit)
+        return fn
+    return register
+
+class Probe(object):
+    # wraps a benchmark's hot loop; setup and teardown stay outside it
+    def __init__(self, trace):
+        self.trace = trace
+        self.seconds = 0.0
+        self.rpcs = {}
+        self.peak = 0
+        self.retained = 0
+
+    def __enter__(self):
+        carla.reset_stats()
+        if self.trace:
+            tracemalloc.start()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        self.rpcs = dict(carla.rpc_counts)
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.peak = peak - self._baseline
+            self.retained = current - self._baseline
+        return False
+
+def make_world(opts, rolename='hero'):
+    carla.reset_servers()
+    args = argparse.Namespace(
+        host='127.0.0.1', port=2000, tm_port=8000, timeout=5.0, map=None, xodr_path=None, osm_path=None,
+        rolename=rolename, cache_dir=opts.cache_dir)
+    return World(args)
+
+def spawn_vehicles(world, count, seed=0):
+    points = world.get_spawn_planner().plan(count, seed=seed, min_separation=8.0)
+    actors, _ = world.spawn_many([{'blueprint': 'vehicle.*', 'transform': t} for t in points])
+    return actors
+
+@benchmark('frames')
+def camera_display(opts, probe):
+    # camera callback into FrameSurface, then blit, one frame per sync tick
+    display = pygame.display.set_mode((IM_WIDTH, IM_HEIGHT))
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        actor.add_camera_sensor()
+        with SynchronousDriver(world, report_interval=0) as driver:
+            actor.wait_for_frame(driver.tick())
+            with probe:
+                for _ in range(opts.frames):
+                    actor.wait_for_frame(driver.tick())
+                    actor.render(display)
+    return opts.frames
+
+@benchmark('frames')
+def camera_headless(opts, probe):
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        actor.add_camera_sensor(headless=True)
+        with SynchronousDriver(world, report_interval=0) as driver:
+            actor.wait_for_frame(driver.tick())
+            with probe:
+                for _ in range(opts.frames):
+                    actor.wait_for_frame(driver.tick())
+                    actor.frame_array.latest()
+    return opts.frames
+
+@benchmark('bundles')
+def sensor_rig(opts, probe):
+    # RGB, raw depth and lidar bundled by frame
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        rig = actor.add_sensor_rig([0, 1, 6], timeout=2.0)
+        bundles = 0
+        with SynchronousDriver(world, report_interval=0) as driver:
+            driver.tick()
+            rig.get()
+            with probe:
+                for _ in range(opts.frames):
+                    driver.tick()
+                    if rig.get() is not None:
+                        bundles += 1
+    return bundles
+
+@benchmark('sweeps')
+def lidar_bev(opts, probe):
+    bev = lidar.BirdsEyeView()
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        rig = actor.add_sensor_rig([6], timeout=2.0)
+        with SynchronousDriver(world, report_interval=0) as driver:
+            driver.tick()
+            rig.get()
+            with probe:
+                for _ in range(opts.frames):
+                    driver.tick()
+                    _, bundle = rig.get()
+                    points = lidar.crop(lidar.decode(bundle['Lidar (Ray-Cast)']), max_range=50.0)
+                    bev.rasterize(lidar.voxel_downsample(points, 0.2))
+    return opts.frames
+
+@benchmark('bundles')
+def depth_labels(opts, probe):
+    # raw depth and segmentation decoded into reused metric / class id arrays
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        rig = actor.add_sensor_rig([1, 4], timeout=2.0)
+        depth = labels = None
+        with SynchronousDriver(world, report_interval=0) as driver:
+            driver.tick()
+            rig.get()
+            with probe:
+                for _ in range(opts.frames):
+                    driver.tick()
+                    _, bundle = rig.get()
+                    depth = image_decode.decode_depth(bundle['Camera Depth (Raw)'], depth)
+                    labels = image_decode.decode_labels(bundle['Camera Semantic Segmentation (Raw)'], labels)
+    return opts.frames
+
+@benchmark('events')
+def dvs_events(opts, probe):
+    # DVS packets into an event frame, a time surface and a voxel grid
+    with make_world(opts) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        rig = actor.add_sensor_rig([7], timeout=2.0)
+        width, height = rig.image_size
+        frame, surface, voxels = dvs.EventFrame(width, height), dvs.TimeSurface(width, height), dvs.VoxelGrid(width, height)
+        out = np.empty((height, width, 2), dtype=np.float32)
+        events = 0
+        with SynchronousDriver(world, report_interval=0) as driver:
+            driver.tick()
+            rig.get()
+            with probe:
+                for _ in range(opts.frames):
+                    driver.tick()
+                    _, bundle = rig.get()
+                    packet = dvs.decode(bundle['Dynamic Vision Sensor'])
+                    frame.reset()
+                    frame.add(packet)
+                    surface.add(packet)
+                    surface.surface(packet['t'][-1], out)
+                    voxels.accumulate(packet)
+                    events += len(packet)
+    return events
+
+@benchmark('actors')
+def spawn_loop(opts, probe):
+    # one spawn_actor round trip per vehicle
+    with make_world(opts, rolename='autopilot') as world:
+        points = world.get_spawn_planner().plan(opts.actors, seed=0, min_separation=8.0)
+        with probe:
+            for point in points:
+                world.spawn_actor('vehicle.*', point)
+        return len(world.actor_list)
+
+@benchmark('actors')
+def spawn_batch(opts, probe):
+    with make_world(opts, rolename='autopilot') as world:
+        points = world.get_spawn_planner().plan(opts.actors, seed=0, min_separation=8.0)
+        with probe:
+            actors, _ = world.spawn_many([{'blueprint': 'vehicle.*', 'transform': t, 'autopilot': True} for t in points])
+        return len(actors)
+
+def drive(opts, probe, world, actors, driver):
+    controls = [carla.VehicleControl(throttle=0.5), carla.VehicleControl(throttle=0.7)]
+    with probe:
+        for step in range(opts.frames):
+            # odd-numbered actors alternate their throttle, the rest hold it
+            for i, actor in enumerate(actors):
+                actor.apply_control(controls[(step + i) // 2 % 2] if i % 2 else controls[0])
+            if driver is not None:
+                driver.tick()
+            else:
+                world.world.tick()
+    return opts.frames * len(actors)
+
+@benchmark('controls')
+def controls_direct(opts, probe):
+    # one apply_control round trip per actor and call
+    with make_world(opts) as world:
+        actors = spawn_vehicles(world, opts.actors)
+        world.world.apply_settings(carla.WorldSettings(synchronous_mode=True, fixed_delta_seconds=0.05))
+        return drive(opts, probe, world, actors, None)
+
+@benchmark('controls')
+def controls_bus(opts, probe):
+    with make_world(opts) as world:
+        actors = spawn_vehicles(world, opts.actors)
+        world.enable_control_bus()
+        with SynchronousDriver(world, report_interval=0) as driver:
+            return drive(opts, probe, world, actors, driver)
+
+@benchmark('actors')
+def teardown(opts, probe):
+    with make_world(opts) as world:
+        actors = spawn_vehicles(world, opts.actors)
+        for actor in actors[:opts.actors // 10]:
+            actor.add_sensor_rig([0, 1], image_size=(320, 240))
+        with probe:
+            report = world.destroy()
+    return report['destroyed']
+
+@benchmark('actors')
+def state_restore(opts, probe):
+    # episode reset from a checkpoint: capture, serialize, load and restore,
+    # against teardown plus spawn_batch for a full respawn
+    with make_world(opts) as world:
+        spawn_vehicles(world, opts.actors)
+        with probe:
+            data = world.capture_state().to_bytes()
+            report = world.restore_state(StateSnapshot.from_bytes(data))
+    return report['restored']
+
+@benchmark('ticks')
+def scheduled_tasks(opts, probe):
+    # dynamic weather plus a few per-tick tasks dispatched from on_tick
+    with make_world(opts) as world:
+        world.show_weather_info = False
+        world.start_dynamic_weather(1.0)
+        for i in range(4):
+            world.scheduler.add('noop%d' % i, lambda timestamp, elapsed: None, period=0.05 * i)
+        with SynchronousDriver(world, report_interval=0) as driver:
+            with probe:
+                for _ in range(opts.frames):
+                    driver.tick()
+    return opts.frames
+
+def percentile(values, q):
+    return 1000.0 * float(np.percentile(values, q)) if values else 0.0
+
+def run(name, opts):
+    fn, unit = BENCHMARKS[name]
+    timed = Probe(trace=False)
+    units = fn(opts, timed)
+    latency = list(carla.stream_stats['queue_latency'])
+    callback = list(carla.stream_stats['callback_time'])
+    traced = Probe(trace=True)
+    fn(opts, traced)
+    units = max(units, 1)
+    return OrderedDict([
+        ('name', name),
+        ('unit', unit),
+        ('units', units),
+        ('seconds', timed.seconds),
+        ('rate', units / timed.seconds if timed.seconds > 0 else 0.0),
+        ('rpcs', sum(timed.rpcs.values())),
+        ('rpcs_per_unit', sum(timed.rpcs.values()) / float(units)),
+        ('rpc_breakdown', timed.rpcs),
+        ('deliveries', len(callback)),
+        ('callback_ms_p50', percentile(callback, 50)),
+        ('callback_ms_p95', percentile(callback, 95)),
+        ('queue_ms_p95', percentile(latency, 95)),
+        ('peak_kb', traced.peak / 1024.0),
+        ('retained_kb', traced.retained / 1024.0)])
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--only', metavar='NAMES', help='comma separated benchmarks (default: all of %s)' % ', '.join(BENCHMARKS))
+    argparser.add_argument('--frames', metavar='N', default=200, type=int, help='frames or ticks per run (default: 200)')
+    argparser.add_argument('--actors', metavar='N', default=100, type=int, help='vehicles for fleet benchmarks (default: 100)')
+    argparser.add_argument('--rpc-latency', metavar='MS', default=0.0, type=float,
+                           help='simulated round trip added to every RPC (default: 0)')
+    argparser.add_argument('--json', metavar='FILE', help='append one JSON line per benchmark to FILE')
+    opts = argparser.parse_args()
+    names = opts.only.split(',') if opts.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        argparser.error('unknown benchmarks: %s' % ', '.join(unknown))
+
+    carla.configure(rpc_latency=opts.rpc_latency / 1000.0, spawn_points=max(200, 3 * opts.actors))
+    opts.cache_dir = tempfile.mkdtemp(prefix='carla-bench-')
+    pygame.init()
+    print('%-16s %10s %-9s %9s %10s %10s %10s %10s %10s' % (
+        'benchmark', 'rate', 'per sec', 'rpc/unit', 'cb p50', 'cb p95', 'queue p95', 'peak KB', 'kept KB'))
+    try:
+        for name in names:
+            result = run(name, opts)
+            print('%-16s %10.1f %-9s %9.3f %8.3fms %8.3fms %8.3fms %10.1f %10.1f' % (
+                name, result['rate'], result['unit'], result['rpcs_per_unit'], result['callback_ms_p50'],
+                result['callback_ms_p95'], result['queue_ms_p95'], result['peak_kb'], result['retained_kb']))
+            if opts.json:
+                with open(opts.json, 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+    finally:
+        carla.reset_servers()
+        pygame.quit()
+        shutil.rmtree(opts.cache_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,17 @@
-import glob
-import os
-import sys
 import argparse
 from world import World
 import coloredlogs, logging
+from util.osm_filter import parse_bbox, parse_highways
 
-try:
-    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
-        sys.version_info.major,
-        sys.version_info.minor,
-        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
-except IndexError:
-    pass
-
+import util.carla_path
 import carla
 
 def game_loop(args):
-    try:
-        world = World(args)
+    with World(args) as world:
         if args.weather is not None:            
             world.set_weather(args.weather)
         if args.list:
             world.list_options()        
-        
-    finally:
-        ##! destroy all actors
-        logging.info('destroy all actors')
 
 def main():
     argparser = argparse.ArgumentParser(
@@ -36,6 +22,26 @@ def main():
         dest='debug',
         help='print debug information')
     
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='127.0.0.1',
+        help='IP of the host server (default: 127.0.0.1)')
+    
+    argparser.add_argument(
+        '-p', '--port',
+        metavar='P',
+        default=2000,
+        type=int,
+        help='TCP port to listen to (default: 2000)')
+    
+    argparser.add_argument(
+        '--tm-port',
+        metavar='P',
+        default=8000,
+        type=int,
+        help='port to communicate with TM (default: 8000)')
+    
     argparser.add_argument(
         '-m', '--map', help='load a new map, use --list to see available maps')
     
@@ -64,6 +70,18 @@ def main():
         metavar='OSM_FILE_PATH',
         help='load a new map with a minimum physical road representation of the provided OpenStreetMaps')
     
+    argparser.add_argument(
+        '--osm-bbox',
+        metavar='MIN_LON,MIN_LAT,MAX_LON,MAX_LAT',
+        type=parse_bbox,
+        help='only convert OpenStreetMaps roads touching this bounding box')
+    
+    argparser.add_argument(
+        '--osm-highways',
+        metavar='TYPES',
+        type=parse_highways,
+        help='only convert these comma separated OpenStreetMaps highway types (e.g. motorway,primary,residential)')
+    
     argparser.add_argument(
         '-l', '--list',
         action='store_true',
@@ -0,0 +1,123 @@
+"""Run autopilot episodes in parallel across several simulator servers
+
+    python run_episodes.py --servers 127.0.0.1:2000:8000,127.0.0.1:2002:8002 --episodes 20
+"""
+
+import argparse
+import json
+import logging
+import random
+from util.episode_runner import EpisodeRunner, parse_endpoints
+
+def run_episode(endpoint, episode):
+    # runs in a worker process bound to one server
+    from util.world import World
+    from util.sync_driver import SynchronousDriver
+
+    args = argparse.Namespace(
+        host=endpoint.host, port=endpoint.port, tm_port=endpoint.tm_port,
+        timeout=episode['timeout'], map=episode['map'], xodr_path=None, osm_path=None,
+        rolename='autopilot', cache_dir=episode['cache_dir'])
+    with World(args) as world:
+        spawn_points = world.get_spawn_planner().plan(
+            episode['vehicles'], seed=episode['seed'], min_separation=episode['min_separation'])
+        actors, errors = world.spawn_many(
+            [{'blueprint': 'vehicle.*', 'transform': t, 'autopilot': True} for t in spawn_points],
+            rng=random.Random(episode['seed']))
+        driver = SynchronousDriver(world, episode['fixed_delta'], report_interval=0, traffic_manager=True)
+        with driver:
+            for _ in range(episode['ticks']):
+                driver.tick()
+        return {
+            'seed': episode['seed'],
+            'spawned': len(actors),
+            'spawn_errors': len(errors),
+            'steps': driver.steps,
+            'steps_per_second': driver.steps_per_second()}
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description=__doc__)
+    argparser.add_argument(
+        '--servers',
+        metavar='HOST:PORT:TM_PORT,...',
+        default='127.0.0.1:2000:8000',
+        help='comma separated simulator endpoints (default: 127.0.0.1:2000:8000)')
+    argparser.add_argument(
+        '--episodes',
+        metavar='N',
+        default=10,
+        type=int,
+        help='number of episodes (default: 10)')
+    argparser.add_argument(
+        '-m', '--map',
+        help='map to run every episode on (default: whatever each server has loaded)')
+    argparser.add_argument(
+        '-n', '--number-of-vehicles',
+        metavar='N',
+        default=30,
+        type=int,
+        help='autopilot vehicles per episode (default: 30)')
+    argparser.add_argument(
+        '--ticks',
+        metavar='N',
+        default=400,
+        type=int,
+        help='simulation steps per episode (default: 400)')
+    argparser.add_argument(
+        '--fixed-delta',
+        metavar='SECONDS',
+        default=0.05,
+        type=float,
+        help='fixed simulation step (default: 0.05)')
+    argparser.add_argument(
+        '--min-separation',
+        metavar='M',
+        default=8.0,
+        type=float,
+        help='minimum distance in meters between spawned vehicles (default: 8.0)')
+    argparser.add_argument(
+        '--retries',
+        metavar='N',
+        default=1,
+        type=int,
+        help='times a failed episode is retried (default: 1)')
+    argparser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help='cache directory shared by the workers (default: ~/.cache/carla-client)')
+    argparser.add_argument(
+        '-t', '--timeout', default='10', help='timeout (default: 10)')
+    argparser.add_argument(
+        '-o', '--output',
+        metavar='FILE',
+        help='write per-episode results and the summary as JSON to FILE')
+    args = argparser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+    episodes = [{
+        'seed': i,
+        'map': args.map,
+        'vehicles': args.number_of_vehicles,
+        'ticks': args.ticks,
+        'fixed_delta': args.fixed_delta,
+        'min_separation': args.min_separation,
+        'timeout': args.timeout,
+        'cache_dir': args.cache_dir} for i in range(args.episodes)]
+    runner = EpisodeRunner(parse_endpoints(args.servers), run_episode, retries=args.retries)
+    results = runner.run(episodes)
+    for endpoint, stats in sorted(runner.summary['endpoints'].items()):
+        print('%s: %d episodes, %d errors, %.1f s busy' % (endpoint, stats['episodes'], stats['errors'], stats['seconds']))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'summary': runner.summary,
+                'episodes': [dict(r, endpoint=list(r['endpoint']) if r['endpoint'] else None) for r in results if r]},
+                f, indent=2)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(' - Exited by user.')
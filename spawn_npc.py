@@ -8,19 +8,9 @@
 
 """Spawn NPCs into the simulation"""
 
-import glob
-import os
-import sys
 import time
 
-try:
-    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
-        sys.version_info.major,
-        sys.version_info.minor,
-        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
-except IndexError:
-    pass
-
+import util.carla_path
 import carla
 
 from carla import VehicleLightState as vls
@@ -28,6 +18,11 @@ from carla import VehicleLightState as vls
 import argparse
 import logging
 from numpy import random
+from util.blueprints import BlueprintCatalog
+from util.spawn_planner import SpawnPlanner
+from util.navigation import NavigationPool, start_walker_controllers
+from util.registry import ActorRegistry
+from util.governor import LoadGovernor, count_knob, hybrid_physics_knob
 
 def main():
     argparser = argparse.ArgumentParser(
@@ -88,20 +83,64 @@ def main():
         metavar='S',
         type=int,
         help='Random device seed')
+    argparser.add_argument(
+        '--min-separation',
+        metavar='M',
+        default=0.0,
+        type=float,
+        help='minimum distance in meters between spawned vehicles, 0 to disable (default: 0.0)')
+    argparser.add_argument(
+        '--hero-distance',
+        metavar='M',
+        default=0.0,
+        type=float,
+        help='keep vehicles at least M meters away from the hero vehicle (default: 0.0)')
+    argparser.add_argument(
+        '--no-junctions',
+        action='store_true',
+        help='do not spawn vehicles on junctions')
     argparser.add_argument(
         '--car-lights-on',
         action='store_true',
         default=False,
         help='Enanble car lights')
+    argparser.add_argument(
+        '--target-fps',
+        metavar='FPS',
+        type=float,
+        help='adapt hybrid physics and the number of walkers and vehicles to hold this server tick rate')
+    argparser.add_argument(
+        '--fps-tolerance',
+        metavar='F',
+        default=0.1,
+        type=float,
+        help='relative width of the target band around --target-fps (default: 0.1)')
+    argparser.add_argument(
+        '--governor-window',
+        metavar='S',
+        default=2.0,
+        type=float,
+        help='seconds of ticks the tick rate is measured over (default: 2.0)')
+    argparser.add_argument(
+        '--governor-cooldown',
+        metavar='S',
+        default=3.0,
+        type=float,
+        help='seconds to wait after each adjustment (default: 3.0)')
+    argparser.add_argument(
+        '--governor-log',
+        metavar='FILE',
+        help='append every governor decision to FILE as JSON lines')
     args = argparser.parse_args()
 
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 
     vehicles_list = []
     walkers_list = []
-    all_id = []
     client = carla.Client(args.host, args.port)
     client.set_timeout(10.0)
+    registry = ActorRegistry(client)
+    registry.install_signal_handlers()
     synchronous_master = False
     random.seed(args.seed if args.seed is not None else int(time.time()))
 
@@ -127,65 +166,78 @@ def main():
             else:
                 synchronous_master = False
 
-        blueprints = world.get_blueprint_library().filter(args.filterv)
-        blueprintsWalkers = world.get_blueprint_library().filter(args.filterw)
+        catalog = BlueprintCatalog(world.get_blueprint_library())
+        blueprints = catalog.filter(args.filterv)
+        blueprintsWalkers = catalog.filter(args.filterw)
 
         if args.safe:
-            blueprints = [x for x in blueprints if int(x.get_attribute('number_of_wheels')) == 4]
-            blueprints = [x for x in blueprints if not x.id.endswith('isetta')]
-            blueprints = [x for x in blueprints if not x.id.endswith('carlacola')]
-            blueprints = [x for x in blueprints if not x.id.endswith('cybertruck')]
-            blueprints = [x for x in blueprints if not x.id.endswith('t2')]
+            blueprints = catalog.safe(blueprints)
 
-        blueprints = sorted(blueprints, key=lambda bp: bp.id)
+        planner = SpawnPlanner(world.get_map())
+        number_of_spawn_points = len(planner.spawn_points)
 
-        spawn_points = world.get_map().get_spawn_points()
-        number_of_spawn_points = len(spawn_points)
-
-        if args.number_of_vehicles < number_of_spawn_points:
-            random.shuffle(spawn_points)
-        elif args.number_of_vehicles > number_of_spawn_points:
+        if args.number_of_vehicles > number_of_spawn_points:
             msg = 'requested %d vehicles, but could only find %d spawn points'
             logging.warning(msg, args.number_of_vehicles, number_of_spawn_points)
             args.number_of_vehicles = number_of_spawn_points
 
+        hero_location = None
+        if args.hero_distance > 0.0:
+            for vehicle in world.get_actors().filter('vehicle.*'):
+                if vehicle.attributes.get('role_name') == 'hero':
+                    location = vehicle.get_location()
+                    hero_location = (location.x, location.y)
+        spawn_points = planner.plan(
+            args.number_of_vehicles,
+            seed=args.seed,
+            min_separation=args.min_separation,
+            hero_location=hero_location,
+            hero_band=(args.hero_distance, float('inf')),
+            exclude_junctions=args.no_junctions)
+
         # @todo cannot import these directly.
         SpawnActor = carla.command.SpawnActor
         SetAutopilot = carla.command.SetAutopilot
         SetVehicleLightState = carla.command.SetVehicleLightState
         FutureActor = carla.command.FutureActor
+        DestroyActor = carla.command.DestroyActor
 
         # --------------
         # Spawn vehicles
         # --------------
-        batch = []
-        for n, transform in enumerate(spawn_points):
-            if n >= args.number_of_vehicles:
-                break
-            blueprint = random.choice(blueprints)
-            if blueprint.has_attribute('color'):
-                color = random.choice(blueprint.get_attribute('color').recommended_values)
-                blueprint.set_attribute('color', color)
-            if blueprint.has_attribute('driver_id'):
-                driver_id = random.choice(blueprint.get_attribute('driver_id').recommended_values)
-                blueprint.set_attribute('driver_id', driver_id)
-            blueprint.set_attribute('role_name', 'autopilot')
-
-            # prepare the light state of the cars to spawn
-            light_state = vls.NONE
-            if args.car_lights_on:
-                light_state = vls.Position | vls.LowBeam | vls.LowBeam
-
-            # spawn the cars and set their autopilot and light state all together
-            batch.append(SpawnActor(blueprint, transform)
-                .then(SetAutopilot(FutureActor, True, traffic_manager.get_port()))
-                .then(SetVehicleLightState(FutureActor, light_state)))
-
-        for response in client.apply_batch_sync(batch, synchronous_master):
-            if response.error:
-                logging.error(response.error)
-            else:
-                vehicles_list.append(response.actor_id)
+        def spawn_vehicles(transforms):
+            batch = []
+            for transform in transforms:
+                blueprint = random.choice(blueprints)
+                colors = catalog.recommended_values(blueprint.id, 'color')
+                if colors:
+                    blueprint.set_attribute('color', random.choice(colors))
+                driver_ids = catalog.recommended_values(blueprint.id, 'driver_id')
+                if driver_ids:
+                    blueprint.set_attribute('driver_id', random.choice(driver_ids))
+                blueprint.set_attribute('role_name', 'autopilot')
+
+                # prepare the light state of the cars to spawn
+                light_state = vls.NONE
+                if args.car_lights_on:
+                    light_state = vls.Position | vls.LowBeam | vls.LowBeam
+
+                # spawn the cars and set their autopilot and light state all together
+                batch.append(SpawnActor(blueprint, transform)
+                    .then(SetAutopilot(FutureActor, True, traffic_manager.get_port()))
+                    .then(SetVehicleLightState(FutureActor, light_state)))
+
+            spawned = []
+            for response in client.apply_batch_sync(batch, synchronous_master):
+                if response.error:
+                    logging.error(response.error)
+                else:
+                    spawned.append(response.actor_id)
+            vehicles_list.extend(spawned)
+            registry.add_ids(spawned)
+            return spawned
+
+        spawn_vehicles(spawn_points[:args.number_of_vehicles])
 
         # -------------
         # Spawn Walkers
@@ -193,87 +245,150 @@ def main():
         # some settings
         percentagePedestriansRunning = 0.0      # how many pedestrians will run
         percentagePedestriansCrossing = 0.0     # how many pedestrians will walk through the road
-        # 1. take all the random locations to spawn
-        spawn_points = []
-        for i in range(args.number_of_walkers):
-            spawn_point = carla.Transform()
-            loc = world.get_random_location_from_navigation()
-            if (loc != None):
-                spawn_point.location = loc
-                spawn_points.append(spawn_point)
-        # 2. we spawn the walker object
-        batch = []
-        walker_speed = []
-        for spawn_point in spawn_points:
-            walker_bp = random.choice(blueprintsWalkers)
-            # set as not invincible
-            if walker_bp.has_attribute('is_invincible'):
-                walker_bp.set_attribute('is_invincible', 'false')
-            # set the max speed
-            if walker_bp.has_attribute('speed'):
-                if (random.random() > percentagePedestriansRunning):
-                    # walking
-                    walker_speed.append(walker_bp.get_attribute('speed').recommended_values[1])
+        # 1. take all the random locations to spawn (from a pool cached per map)
+        navigation = NavigationPool(world, seed=args.seed)
+        walker_controller_bp = catalog.find('controller.ai.walker')
+
+        def spawn_walkers(count):
+            spawn_points = [carla.Transform(loc) for loc in navigation.take(count)]
+            # 2. we spawn the walker object
+            batch = []
+            walker_speed = []
+            for spawn_point in spawn_points:
+                walker_bp = random.choice(blueprintsWalkers)
+                # set as not invincible
+                if walker_bp.has_attribute('is_invincible'):
+                    walker_bp.set_attribute('is_invincible', 'false')
+                # set the max speed
+                speeds = catalog.recommended_values(walker_bp.id, 'speed')
+                if speeds:
+                    if (random.random() > percentagePedestriansRunning):
+                        # walking
+                        walker_speed.append(speeds[1])
+                    else:
+                        # running
+                        walker_speed.append(speeds[2])
                 else:
-                    # running
-                    walker_speed.append(walker_bp.get_attribute('speed').recommended_values[2])
-            else:
-                print("Walker has no speed")
-                walker_speed.append(0.0)
-            batch.append(SpawnActor(walker_bp, spawn_point))
-        results = client.apply_batch_sync(batch, True)
-        walker_speed2 = []
-        for i in range(len(results)):
-            if results[i].error:
-                logging.error(results[i].error)
-            else:
-                walkers_list.append({"id": results[i].actor_id})
-                walker_speed2.append(walker_speed[i])
-        walker_speed = walker_speed2
-        # 3. we spawn the walker controller
-        batch = []
-        walker_controller_bp = world.get_blueprint_library().find('controller.ai.walker')
-        for i in range(len(walkers_list)):
-            batch.append(SpawnActor(walker_controller_bp, carla.Transform(), walkers_list[i]["id"]))
-        results = client.apply_batch_sync(batch, True)
-        for i in range(len(results)):
-            if results[i].error:
-                logging.error(results[i].error)
+                    print("Walker has no speed")
+                    walker_speed.append(0.0)
+                batch.append(SpawnActor(walker_bp, spawn_point))
+            results = client.apply_batch_sync(batch, True)
+            walkers = []
+            walker_speed2 = []
+            for i in range(len(results)):
+                if results[i].error:
+                    logging.error(results[i].error)
+                else:
+                    walkers.append({"id": results[i].actor_id})
+                    walker_speed2.append(walker_speed[i])
+            walker_speed = walker_speed2
+            # 3. we spawn the walker controller
+            batch = []
+            for i in range(len(walkers)):
+                batch.append(SpawnActor(walker_controller_bp, carla.Transform(), walkers[i]["id"]))
+            results = client.apply_batch_sync(batch, True)
+            for i in range(len(results)):
+                if results[i].error:
+                    logging.error(results[i].error)
+                else:
+                    walkers[i]["con"] = results[i].actor_id
+            registry.add_ids([w["id"] for w in walkers if "con" not in w])
+            walker_speed = [speed for w, speed in zip(walkers, walker_speed) if "con" in w]
+            walkers = [w for w in walkers if "con" in w]
+            # 4. we put altogether the walkers and controllers id to get the objects from their id
+            all_id = []
+            for i in range(len(walkers)):
+                all_id.append(walkers[i]["con"])
+                all_id.append(walkers[i]["id"])
+            all_actors = world.get_actors(all_id)
+            for i in range(0, len(all_id), 2):
+                registry.add_controller(all_actors[i])
+                walkers[i // 2]["controller"] = all_actors[i]
+            registry.add_ids(all_id)
+            walkers_list.extend(walkers)
+
+            # wait for a tick to ensure client receives the last transform of the walkers we have just created
+            if not args.sync or not synchronous_master:
+                world.wait_for_tick()
             else:
-                walkers_list[i]["con"] = results[i].actor_id
-        # 4. we put altogether the walkers and controllers id to get the objects from their id
-        for i in range(len(walkers_list)):
-            all_id.append(walkers_list[i]["con"])
-            all_id.append(walkers_list[i]["id"])
-        all_actors = world.get_actors(all_id)
-
-        # wait for a tick to ensure client receives the last transform of the walkers we have just created
-        if not args.sync or not synchronous_master:
-            world.wait_for_tick()
-        else:
-            world.tick()
-
-        # 5. initialize each controller and set target to walk to (list is [controler, actor, controller, actor ...])
-        # set how many pedestrians can cross the road
-        world.set_pedestrians_cross_factor(percentagePedestriansCrossing)
-        for i in range(0, len(all_id), 2):
-            # start walker
-            all_actors[i].start()
-            # set walk to random point
-            all_actors[i].go_to_location(world.get_random_location_from_navigation())
-            # max speed
-            all_actors[i].set_max_speed(float(walker_speed[int(i/2)]))
+                world.tick()
+
+            # 5. initialize each controller and set target to walk to (list is [controler, actor, controller, actor ...])
+            # set how many pedestrians can cross the road
+            start_walker_controllers(
+                world,
+                [w["controller"] for w in walkers],
+                walker_speed,
+                navigation,
+                cross_factor=percentagePedestriansCrossing)
+            return walkers
+
+        spawn_walkers(args.number_of_walkers)
 
         print('spawned %d vehicles and %d walkers, press Ctrl+C to exit.' % (len(vehicles_list), len(walkers_list)))
 
         # example of how to use parameters
         traffic_manager.global_percentage_speed_difference(30.0)
 
+        governor = None
+        if args.target_fps is not None:
+            # shed load in order: hybrid physics, then walkers, then vehicles
+            def resize_vehicles(count):
+                if count < len(vehicles_list):
+                    removed = vehicles_list[count:]
+                    client.apply_batch_sync([DestroyActor(x) for x in removed], synchronous_master)
+                    del vehicles_list[count:]
+                    registry.discard(removed)
+                elif count > len(vehicles_list):
+                    # vehicles have driven off their spawn points, so the new
+                    # ones keep clear of where every vehicle is now
+                    occupied = [(l.x, l.y) for l in (v.get_location() for v in world.get_actors().filter('vehicle.*'))]
+                    spawn_vehicles(planner.plan(
+                        count - len(vehicles_list),
+                        seed=random.randint(2 ** 31),
+                        min_separation=args.min_separation,
+                        occupied=occupied,
+                        exclude_junctions=args.no_junctions))
+                return len(vehicles_list)
+
+            def resize_walkers(count):
+                if count < len(walkers_list):
+                    removed = walkers_list[count:]
+                    for walker in removed:
+                        walker["controller"].stop()
+                    ids = [x for walker in removed for x in (walker["con"], walker["id"])]
+                    client.apply_batch_sync([DestroyActor(x) for x in ids], synchronous_master)
+                    del walkers_list[count:]
+                    registry.discard(ids)
+                elif count > len(walkers_list):
+                    spawn_walkers(count - len(walkers_list))
+                return len(walkers_list)
+
+            governor = LoadGovernor(
+                args.target_fps,
+                tolerance=args.fps_tolerance,
+                window=args.governor_window,
+                cooldown=args.governor_cooldown,
+                log_path=args.governor_log)
+            radii = (50.0, 30.0, 15.0) if args.hybrid else (None, 70.0, 50.0, 30.0, 15.0)
+            governor.add_knob(hybrid_physics_knob(traffic_manager, radii))
+            if walkers_list:
+                governor.add_knob(count_knob('walkers', len(walkers_list), resize_walkers))
+            if vehicles_list:
+                governor.add_knob(count_knob('vehicles', len(vehicles_list), resize_vehicles))
+            logging.info('governor: holding %.1f-%.1f fps' % (governor.low, governor.high))
+
         while True:
             if args.sync and synchronous_master:
-                world.tick()
+                frame = world.tick()
+                if governor is not None:
+                    governor.observe(frame)
             else:
-                world.wait_for_tick()
+                snapshot = world.wait_for_tick()
+                if governor is not None:
+                    governor.observe_snapshot(snapshot)
+            if governor is not None:
+                governor.update()
 
     finally:
 
@@ -283,17 +398,9 @@ def main():
             settings.fixed_delta_seconds = None
             world.apply_settings(settings)
 
-        print('\ndestroying %d vehicles' % len(vehicles_list))
-        client.apply_batch([carla.command.DestroyActor(x) for x in vehicles_list])
-
-        # stop walker controllers (list is [controller, actor, controller, actor ...])
-        for i in range(0, len(all_id), 2):
-            all_actors[i].stop()
-
-        print('\ndestroying %d walkers' % len(walkers_list))
-        client.apply_batch([carla.command.DestroyActor(x) for x in all_id])
-
-        time.sleep(0.5)
+        print('\ndestroying %d vehicles and %d walkers' % (len(vehicles_list), len(walkers_list)))
+        registry.teardown()
+        registry.restore_signal_handlers()
 
 if __name__ == '__main__':
 
@@ -1,57 +1,119 @@
-import glob
 import os
-import sys
+import time
 import argparse
-from util.world import World
 import coloredlogs, logging
-from util.keyboard_control import KeyboardControl
-import pygame
-from numpy import random
-
-try:
-    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
-        sys.version_info.major,
-        sys.version_info.minor,
-        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
-except IndexError:
-    pass
-
-import carla
+from util.osm_filter import parse_bbox, parse_highways
 
 IM_WIDTH = 640
 IM_HEIGHT = 480
 
 def game_loop(args):
-    pygame.init()    
-    pygame.font.init()
+    # returns the number of simulation steps run
+    # numpy and the rest load here, so --list and bad arguments return
+    # before paying for them; pygame only loads with a window
+    from util.world import World
+    from util.recorder import SensorRecorder
+    from util.sync_driver import SynchronousDriver
+    from util.frames import PreviewWriter
+    from util.profiling import StageProfiler
+    from util.live_view import LiveView
+    if not args.headless:
+        import pygame
+        from util.keyboard_control import KeyboardControl
+        from util.display import PerfHud
+        pygame.init()    
+        pygame.font.init()
+    recorder = None
+    live_view = None
     try:  
         print(args)
-        world = World(args)
-        if args.weather is not None:            
-            world.set_weather(args.weather)
-        if args.list:
-            world.list_options()            
-        if args.dynamic_weather == True and args.weather is None:
-            world.start_dynamic_weather(10.0)        
-        
-        display = pygame.display.set_mode(
-            (args.width, args.height),
-            pygame.HWSURFACE | pygame.DOUBLEBUF)
-        spawn_point = random.choice(world.get_spawn_points())
-        actor = world.spawn_actor(args.vehicle, spawn_point)                
-        actor.add_camera_sensor()
-        controller = KeyboardControl()
-        clock = pygame.time.Clock()
-        while True:
-            actor.move_forward()
-            if controller.parse_events(world, clock):                
-                return       
-            actor.render(display)
-            pygame.display.flip()
+        with World(args) as world:
+            if args.weather is not None:            
+                world.set_weather(args.weather)
+            if args.weather_timeline is not None:
+                world.start_dynamic_weather(
+                    1.0, world.weather_timeline(args.weather_timeline, args.weather_loop), args.weather_threshold)
+            elif args.dynamic_weather == True and args.weather is None:
+                world.start_dynamic_weather(10.0, threshold=args.weather_threshold)
+            
+            display = None
+            if not args.headless:
+                display = pygame.display.set_mode(
+                    (args.width, args.height),
+                    pygame.HWSURFACE | pygame.DOUBLEBUF)
+            spawn_point = world.get_spawn_planner().plan(1)[0]
+            actor = world.spawn_actor(args.vehicle, spawn_point)                
+            if args.record is not None:
+                recorder = SensorRecorder(args.record, synchronous=args.sync)
+                actor.set_recorder(recorder)
+            actor.add_camera_sensor(headless=args.headless, sensor_index=args.camera)
+            if args.live_view is not None:
+                live_view = LiveView(args.live_view, args.live_view_host, max_fps=args.live_view_fps).start()
+                actor.frame_listeners.append(live_view.offer)
+            controller = None if args.headless else KeyboardControl()
+            preview = None
+            if args.headless and args.preview_dir is not None:
+                preview = PreviewWriter(args.preview_dir, args.preview_every)
+            clock = None if args.headless else pygame.time.Clock()
+            profiler = StageProfiler(export_path=args.profile_out, export_interval=args.profile_interval)
+            profiler.watch(world.world)
+            actor.profiler = profiler
+            hud = None if args.headless else PerfHud(profiler)
+            ticks = 0
+            driver = None
+            if args.sync:
+                world.enable_control_bus()
+                driver = SynchronousDriver(world, args.fixed_delta)
+                driver.start()
+            try:
+                # --max-ticks counts simulation steps, not loop iterations,
+                # whatever mode the loop runs in
+                first_frame = world.world.get_snapshot().frame
+                t = time.perf_counter()
+                while args.max_ticks is None or ticks < args.max_ticks:
+                    actor.move_forward()
+                    t = profiler.lap('control', t)
+                    if controller is not None and controller.parse_events(world, clock):                
+                        return ticks
+                    t = profiler.lap('parse_events', t)
+                    if driver is not None:
+                        # controls go out once per step, then the step's image is shown
+                        frame = driver.tick()
+                        actor.wait_for_frame(frame)
+                        if clock is not None:
+                            clock.tick()
+                    elif args.headless:
+                        frame = world.world.wait_for_tick().frame
+                    else:
+                        clock.tick(60)
+                        frame = world.world.get_snapshot().frame
+                    t = profiler.lap('tick', t)
+                    ticks = frame - first_frame
+                    if args.headless:
+                        if preview is not None:
+                            preview.offer(actor.frame_array)
+                            t = profiler.lap('preview', t)
+                    elif actor.render(display):
+                        hud.visible = controller.show_perf_hud
+                        hud.draw(display)
+                        t = profiler.lap('render', t)
+                        pygame.display.flip()
+                        t = profiler.lap('flip', t)
+                        frames = actor.frame_surface
+                        profiler.frame_shown(frames.frame, frames.timestamp, frames.received_at, t)
+                    profiler.maybe_export()
+                return ticks
+            finally:
+                if driver is not None:
+                    driver.stop()
+                profiler.unwatch()
+                profiler.export()
     finally:
-        ##! destroy all actors
-        world.stop_dynamic_weather()
-        logging.info('destroy all actors')
+        # leaving the with block stopped the sensors and destroyed all actors
+        if live_view is not None:
+            live_view.stop()
+        if recorder is not None:
+            recorder.close()
 
 def main():
     argparser = argparse.ArgumentParser(
@@ -68,6 +130,26 @@ def main():
         default='1280x720',
         help='window resolution (default: 1280x720)')
     
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='127.0.0.1',
+        help='IP of the host server (default: 127.0.0.1)')
+    
+    argparser.add_argument(
+        '-p', '--port',
+        metavar='P',
+        default=2000,
+        type=int,
+        help='TCP port to listen to (default: 2000)')
+    
+    argparser.add_argument(
+        '--tm-port',
+        metavar='P',
+        default=8000,
+        type=int,
+        help='port to communicate with TM (default: 8000)')
+    
     argparser.add_argument(
         '-m', '--map', help='load a new map, use --list to see available maps')
     
@@ -78,6 +160,67 @@ def main():
         '--dynamic-weather', action='store_true', 
         help='set weather preset, use --list to see available presets')
 
+    argparser.add_argument(
+        '--weather-timeline',
+        metavar='KEYFRAMES',
+        help='blend between presets over simulation time, e.g. "0:ClearNoon,60:HardRainNoon,120:ClearSunset"')
+
+    argparser.add_argument(
+        '--weather-loop',
+        action='store_true',
+        help='repeat --weather-timeline, blending the last keyframe back into the first')
+
+    argparser.add_argument(
+        '--weather-threshold',
+        metavar='T',
+        default=1.0,
+        type=float,
+        help='only send weather changes once some parameter moved more than T, scaled down for the small-range '
+             'fog falloff and scattering parameters (default: 1.0)')
+
+    argparser.add_argument(
+        '--headless',
+        action='store_true',
+        help='run without a window, camera frames are kept as numpy arrays')
+    
+    argparser.add_argument(
+        '--camera',
+        metavar='INDEX',
+        default=0,
+        type=int,
+        help='camera to show: 0 RGB, 1-3 depth (raw, gray, logarithmic), 4-5 segmentation (raw, CityScapes), '
+             '7 DVS, 8 distorted RGB (default: 0)')
+    
+    argparser.add_argument(
+        '--preview-dir',
+        metavar='DIR',
+        help='in headless mode, write thumbnails of the camera to DIR')
+    
+    argparser.add_argument(
+        '--preview-every',
+        metavar='K',
+        default=30,
+        type=int,
+        help='in headless mode, write a thumbnail every K-th frame (default: 30)')
+    
+    argparser.add_argument(
+        '--max-ticks',
+        metavar='N',
+        type=int,
+        help='stop after N simulation ticks (default: run until interrupted)')
+    
+    argparser.add_argument(
+        '--sync',
+        action='store_true',
+        help='run in synchronous mode, this client ticks the simulation')
+    
+    argparser.add_argument(
+        '--fixed-delta',
+        metavar='SECONDS',
+        default=0.05,
+        type=float,
+        help='fixed simulation step in synchronous mode (default: 0.05)')
+    
     argparser.add_argument(
         '--vehicle', default='vehicle.tesla.model3', help='load vehicle (default: vehicle.tesla.model3), use --list to see available vehicles')
     
@@ -100,20 +243,95 @@ def main():
         metavar='OSM_FILE_PATH',
         help='load a new map with a minimum physical road representation of the provided OpenStreetMaps')
     
+    argparser.add_argument(
+        '--osm-bbox',
+        metavar='MIN_LON,MIN_LAT,MAX_LON,MAX_LAT',
+        type=parse_bbox,
+        help='only convert OpenStreetMaps roads touching this bounding box')
+    
+    argparser.add_argument(
+        '--osm-highways',
+        metavar='TYPES',
+        type=parse_highways,
+        help='only convert these comma separated OpenStreetMaps highway types (e.g. motorway,primary,residential)')
+    
+    argparser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help='cache directory for converted OpenStreetMaps and generated worlds (default: ~/.cache/carla-client)')
+    
+    argparser.add_argument(
+        '--record',
+        metavar='DIR',
+        help='record raw sensor frames to DIR in the background')
+    
+    argparser.add_argument(
+        '--live-view',
+        metavar='PORT',
+        type=int,
+        help='serve the camera as an MJPEG stream on http://HOST:PORT/')
+    
+    argparser.add_argument(
+        '--live-view-host',
+        metavar='H',
+        default='127.0.0.1',
+        help='interface for --live-view (default: 127.0.0.1)')
+    
+    argparser.add_argument(
+        '--live-view-fps',
+        metavar='N',
+        default=10.0,
+        type=float,
+        help='frame rate cap per live view client (default: 10)')
+    
+    argparser.add_argument(
+        '--profile-out',
+        metavar='FILE',
+        help='append stage timing percentiles and histograms as JSON lines to FILE (Ctrl+P shows them on screen)')
+    
+    argparser.add_argument(
+        '--profile-interval',
+        metavar='SECONDS',
+        default=5.0,
+        type=float,
+        help='seconds between --profile-out records (default: 5.0)')
+    
     argparser.add_argument(
         '-l', '--list',
         action='store_true',
-        help='list available options')    
+        help='list available maps, weather presets and vehicles, then exit')    
     
     args = argparser.parse_args()
     args.width, args.height = [int(x) for x in args.res.split('x')]
+    if not args.live_view_fps > 0:
+        argparser.error('--live-view-fps must be positive')
+    if args.headless:
+        # nothing opens a window, but keep SDL off any real display if pygame
+        # gets touched anyway
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
     coloredlogs.install(level='DEBUG')
     coloredlogs.install(fmt='%(asctime)s,%(msecs)03d %(levelname)s %(message)s')
     log_level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
     
+    from util.catalog import ServerCatalog
+    catalog = ServerCatalog.connect(args)
+    if args.list:
+        catalog.print_options()
+        return
+    errors = catalog.validate(args.map, args.weather, args.vehicle)
+    if args.weather_timeline is not None:
+        from util.weather import parse_keyframes
+        try:
+            for _, preset in parse_keyframes(args.weather_timeline):
+                errors.extend(catalog.validate(weather=preset))
+        except ValueError as error:
+            errors.append(str(error))
+    if errors:
+        argparser.error('; '.join(errors))
+    
     try:
-        game_loop(args)
+        return game_loop(args)
     except KeyboardInterrupt:
         print('\nCancelled by user. Bye!')
 
@@ -0,0 +1,62 @@
+"""util.dvs accumulators against plain per-event loops.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from util import dvs
+
+WIDTH, HEIGHT = 8, 6
+
+def make_events(n, seed=0, sort=True):
+    rng = np.random.default_rng(seed)
+    events = np.zeros(n, dtype=dvs.EVENT_DTYPE)
+    events['x'] = rng.integers(0, WIDTH, n)
+    events['y'] = rng.integers(0, HEIGHT, n)
+    events['t'] = rng.integers(0, 10 ** 6, n)
+    events['pol'] = rng.integers(0, 2, n)
+    if sort:
+        events.sort(order='t')
+    return events
+
+def test_event_frame_counts_repeated_pixels():
+    events = make_events(500)
+    frame = dvs.EventFrame(WIDTH, HEIGHT)
+    frame.add(events[:200])
+    frame.add(events[200:])
+    expected = np.zeros((HEIGHT, WIDTH, 2), dtype=np.int32)
+    for x, y, _, pol in events.tolist():
+        expected[y, x, int(pol)] += 1
+    assert np.array_equal(frame.counts, expected)
+    assert frame.events == 500
+
+def test_time_surface_keeps_the_newest_event_in_any_order():
+    events = make_events(500, sort=False)
+    surface = dvs.TimeSurface(WIDTH, HEIGHT)
+    surface.add(events)
+    expected = np.full((HEIGHT, WIDTH, 2), dvs.NEVER, dtype=np.int64)
+    for x, y, t, pol in events.tolist():
+        expected[y, x, int(pol)] = max(expected[y, x, int(pol)], t)
+    assert np.array_equal(surface.last, expected)
+
+def test_voxel_grid_splits_polarity_between_bins():
+    events = make_events(500)
+    grid = dvs.VoxelGrid(WIDTH, HEIGHT, bins=4)
+    grid.accumulate(events)
+    expected = np.zeros((4, HEIGHT, WIDTH), dtype=np.float64)
+    t0, t1 = events['t'][0], events['t'][-1]
+    for x, y, t, pol in events.tolist():
+        position = (t - t0) * 3.0 / (t1 - t0)
+        lower = int(position)
+        sign = 1.0 if pol else -1.0
+        expected[lower, y, x] += (1.0 - (position - lower)) * sign
+        expected[min(lower + 1, 3), y, x] += (position - lower) * sign
+    assert np.allclose(grid.grid, expected, atol=1e-3)
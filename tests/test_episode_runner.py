@@ -0,0 +1,90 @@
+"""run_episodes.py's EpisodeRunner against the simulator stand-in in
+benchmarks/sim; every worker process gets its own stand-in servers.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# worker processes are spawned and import this module again
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from util.episode_runner import EpisodeRunner, parse_endpoints
+
+def faulty_episode(endpoint, episode):
+    # the first attempt of an episode fails the way its 'fault' says, a
+    # marker file tells later attempts (maybe in another process) apart
+    import carla
+    from run_episodes import run_episode
+    fault = episode.get('fault')
+    marker = os.path.join(episode['cache_dir'], 'attempted-%d' % episode['seed'])
+    first = not os.path.exists(marker)
+    open(marker, 'a').close()
+    if fault == 'crash' and first:
+        os._exit(3)
+    if fault == 'timeout' and first:
+        world = carla.Client(endpoint.host, endpoint.port).get_world()
+        settings = world.get_settings()
+        settings.synchronous_mode = True
+        world.apply_settings(settings)
+        try:
+            # nobody ticks a synchronous world
+            world.wait_for_tick(0.05)
+        finally:
+            settings.synchronous_mode = False
+            world.apply_settings(settings)
+    if fault == 'error':
+        raise RuntimeError('episode %d always fails' % episode['seed'])
+    return run_episode(endpoint, episode)
+
+def make_episodes(cache_dir, faults):
+    return [{
+        'seed': i,
+        'map': None,
+        'vehicles': 3,
+        'ticks': 5,
+        'fixed_delta': 0.05,
+        'min_separation': 8.0,
+        'timeout': '5',
+        'cache_dir': str(cache_dir),
+        'fault': fault} for i, fault in enumerate(faults)]
+
+def run(tmp_path, faults, retries=1, max_restarts=3):
+    runner = EpisodeRunner(parse_endpoints('127.0.0.1:2000,127.0.0.1:2002'), faulty_episode,
+                           retries=retries, max_restarts=max_restarts, poll_interval=0.1)
+    return runner, runner.run(make_episodes(tmp_path, faults))
+
+def test_episodes_run_on_every_server(tmp_path):
+    runner, results = run(tmp_path, [None] * 4)
+    assert all(r['error'] is None and r['attempts'] == 1 for r in results)
+    assert all(r['result']['steps'] == 5 and r['result']['spawned'] == 3 for r in results)
+    assert runner.summary['succeeded'] == 4
+    assert sorted(runner.summary['endpoints']) == ['127.0.0.1:2000', '127.0.0.1:2002']
+
+def test_crashed_worker_is_restarted_and_the_episode_retried(tmp_path):
+    runner, results = run(tmp_path, ['crash', None, None])
+    assert [r['error'] for r in results] == [None, None, None]
+    assert results[0]['attempts'] == 2
+    assert runner.summary['succeeded'] == 3
+
+def test_simulator_timeout_is_retried(tmp_path):
+    runner, results = run(tmp_path, ['timeout', None])
+    assert results[0]['error'] is None
+    assert results[0]['attempts'] == 2
+    assert results[0]['result']['steps'] == 5
+
+def test_retries_run_out(tmp_path):
+    runner, results = run(tmp_path, ['error', None], retries=2)
+    assert results[0]['attempts'] == 3
+    assert 'always fails' in results[0]['error']
+    assert results[1]['error'] is None
+    assert runner.summary['succeeded'] == 1
+
+def test_crashes_past_max_restarts_give_up_on_the_server(tmp_path):
+    runner, results = run(tmp_path, ['crash'], retries=0, max_restarts=0)
+    assert results[0]['attempts'] == 1
+    assert results[0]['error'] == 'worker exited with code 3'
@@ -0,0 +1,77 @@
+"""util.governor decisions on synthetic tick samples, and spawn planning
+around occupied locations against the stand-in in benchmarks/sim.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import carla
+from util.governor import Knob, LoadGovernor, hybrid_physics_knob
+from util.spawn_planner import OCCUPIED_CLEARANCE, SpawnPlanner
+
+def feed(governor, start, seconds, fps):
+    # samples on a clock that has nothing to do with time.time(), like a
+    # server's platform_timestamp
+    frame = int(start * 100)
+    for i in range(int(seconds * fps) + 1):
+        governor.observe(frame + i, start + i / float(fps))
+
+def test_cooldown_runs_on_the_sample_clock():
+    governor = LoadGovernor(20.0, window=1.0, cooldown=3.0)
+    knob = governor.add_knob(Knob('load', [0, 1, 2, 3], lambda value: None))
+    feed(governor, 1000.0, 1.0, 10.0)
+    assert governor.update()['action'] == 'degrade'
+    # a second later on the sample clock: still cooling down
+    feed(governor, 1001.0, 1.0, 10.0)
+    assert governor.update() is None
+    feed(governor, 1003.5, 1.0, 10.0)
+    assert governor.update()['action'] == 'degrade'
+    assert knob.level == 2
+
+def test_update_without_samples_does_nothing():
+    governor = LoadGovernor(20.0)
+    governor.add_knob(Knob('load', [0, 1], lambda value: None))
+    assert governor.update() is None
+
+class TrafficManager(object):
+    def __init__(self):
+        self.calls = []
+
+    def set_hybrid_physics_mode(self, enabled):
+        self.calls.append(('mode', enabled))
+
+    def set_hybrid_physics_radius(self, radius):
+        self.calls.append(('radius', radius))
+
+def test_hybrid_knob_applies_its_first_level_up_front():
+    traffic_manager = TrafficManager()
+    governor = LoadGovernor(20.0)
+    knob = governor.add_knob(hybrid_physics_knob(traffic_manager, (50.0, 30.0, 15.0)))
+    assert traffic_manager.calls == [('mode', True), ('radius', 50.0)]
+    assert governor.state() == {'hybrid_radius': 50.0}
+    knob.set_level(1)
+    assert traffic_manager.calls[-1] == ('radius', 30.0)
+    off = TrafficManager()
+    hybrid_physics_knob(off)
+    assert off.calls == [('mode', False)]
+
+def test_plan_keeps_clear_of_occupied_locations(tmp_path):
+    carla.reset_servers()
+    world = carla.Client('127.0.0.1', 2000).get_world()
+    planner = SpawnPlanner(world.get_map(), cache_dir=str(tmp_path))
+    first = planner.plan_indices(40, seed=1)
+    occupied = [tuple(planner.positions[i, :2]) for i in first]
+    for separation in (0.0, 8.0):
+        second = planner.plan_indices(20, seed=2, min_separation=separation, occupied=occupied)
+        assert len(second) == 20
+        distance = np.linalg.norm(planner.positions[second, None, :2] - np.array(occupied)[None], axis=2)
+        assert distance.min() >= max(separation, OCCUPIED_CLEARANCE)
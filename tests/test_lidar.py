@@ -0,0 +1,78 @@
+"""util.lidar against plain per-point loops.
+
+    python -m pytest -q tests
+"""
+
+import os
+import struct
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from util import lidar
+
+def make_points(n, seed=0, extent=60.0):
+    rng = np.random.default_rng(seed)
+    points = np.empty((n, 4), dtype=np.float32)
+    points[:, :2] = rng.uniform(-extent, extent, (n, 2))
+    points[:, 2] = rng.uniform(-4.0, 6.0, n)
+    points[:, 3] = rng.uniform(0.0, 1.0, n)
+    return points
+
+class Measurement(object):
+    def __init__(self, points):
+        self.raw_data = b''.join(struct.pack('<4f', *p) for p in points.tolist())
+
+def test_decode_reads_packed_points():
+    points = make_points(50)
+    decoded = lidar.decode(Measurement(points))
+    assert decoded.shape == (50, 4) and decoded.dtype == np.float32
+    for row, expected in zip(decoded.tolist(), points.tolist()):
+        assert row == expected
+
+def test_crop_matches_a_per_point_loop():
+    points = make_points(2000, seed=1)
+    cropped = lidar.crop(points, max_range=40.0, min_range=5.0, x_range=(-30.0, 35.0), z_range=(-2.0, 3.0))
+    expected = []
+    for p in points:
+        distance = float(p[0]) ** 2 + float(p[1]) ** 2 + float(p[2]) ** 2
+        if not 25.0 <= distance <= 1600.0:
+            continue
+        if -30.0 <= p[0] < 35.0 and -2.0 <= p[2] < 3.0:
+            expected.append(p)
+    assert np.allclose(cropped, np.array(expected, dtype=np.float32).reshape(-1, 4))
+
+def test_voxel_downsample_averages_each_voxel():
+    points = make_points(3000, seed=2, extent=5.0)
+    size = 1.5
+    voxels = {}
+    for p in points:
+        key = tuple(int(np.floor(c / np.float32(size))) for c in p[:3])
+        voxels.setdefault(key, []).append(p.astype(np.float64))
+    expected = np.array([np.mean(v, axis=0) for v in voxels.values()])
+    result = lidar.voxel_downsample(points, size)
+    assert len(result) == len(expected)
+    order = lambda a: a[np.lexsort(a.T[::-1])]
+    assert np.allclose(order(result), order(expected), atol=1e-4)
+    assert len(lidar.voxel_downsample(points[:0], size)) == 0
+
+def test_rasterize_matches_a_per_point_loop():
+    points = make_points(5000, seed=3)
+    bev = lidar.BirdsEyeView(x_range=(-40.0, 40.0), y_range=(-30.0, 30.0), resolution=0.5, z_range=(-3.0, 5.0))
+    occupancy, height = bev.rasterize(points)
+    density = np.zeros((bev.rows, bev.cols), dtype=np.int64)
+    top = np.full((bev.rows, bev.cols), -np.inf)
+    for p in points:
+        if not (-40.0 <= p[0] < 40.0 and -30.0 <= p[1] < 30.0 and -3.0 <= p[2] < 5.0):
+            continue
+        row = min(max(int((np.float32(40.0) - p[0]) / np.float32(0.5)), 0), bev.rows - 1)
+        col = min(max(int((p[1] - np.float32(-30.0)) / np.float32(0.5)), 0), bev.cols - 1)
+        density[row, col] += 1
+        top[row, col] = max(top[row, col], p[2])
+    assert np.array_equal(bev.density, density)
+    assert np.array_equal(occupancy, (density > 0).astype(np.uint8))
+    assert np.allclose(height, np.where(density > 0, top, 0.0))
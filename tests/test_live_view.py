@@ -0,0 +1,65 @@
+"""util.live_view's HTTP handler on an ephemeral port.
+
+    python -m pytest -q tests
+"""
+
+import http.client
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from util.live_view import BOUNDARY, LiveView
+
+@pytest.fixture
+def live_view():
+    view = LiveView(port=0, max_fps=5.0).start()
+    running = [True]
+    frame = np.zeros((48, 64, 4), dtype=np.uint8)
+    def feed():
+        number = 0
+        while running[0]:
+            number += 1
+            view.offer(number, frame.tobytes(), 64, 48)
+            time.sleep(0.01)
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    yield view
+    running[0] = False
+    feeder.join()
+    view.stop()
+
+def get(view, path):
+    connection = http.client.HTTPConnection(view.host, view.port, timeout=5.0)
+    connection.request('GET', path)
+    return connection, connection.getresponse()
+
+@pytest.mark.parametrize('fps', ['abc', '0', '-3', 'nan'])
+def test_bad_stream_rates_are_rejected(live_view, fps):
+    connection, response = get(live_view, '/stream?fps=%s' % fps)
+    assert response.status == 400
+    connection.close()
+
+def test_stream_rate_is_capped_at_max_fps(live_view):
+    connection, response = get(live_view, '/stream?fps=1000')
+    assert response.status == 200
+    started = time.time()
+    frames = 0
+    while time.time() - started < 1.0:
+        line = response.fp.readline()
+        if line.strip() == b'--' + BOUNDARY.encode():
+            frames += 1
+    connection.close()
+    # 5 fps, plus the first frame sent right away
+    assert 3 <= frames <= 7
+
+def test_max_fps_must_be_positive():
+    with pytest.raises(ValueError):
+        LiveView(port=0, max_fps=0)
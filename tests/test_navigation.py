@@ -0,0 +1,56 @@
+"""util.navigation's NavigationPool on small hand-made worlds, with the
+simulator stand-in in benchmarks/sim providing the carla types.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import carla
+from util.navigation import NavigationPool
+
+class NavWorld(object):
+    # a navmesh with `supply` distinct locations, None once they run out,
+    # like a generated world with little or no navmesh
+    def __init__(self, spawn_points, supply, name='OpenDriveMap'):
+        self.map = type('Map', (object,), {'name': name, 'get_spawn_points': lambda _: spawn_points})()
+        self.supply = supply
+        self.queries = 0
+
+    def get_map(self):
+        return self.map
+
+    def get_random_location_from_navigation(self):
+        self.queries += 1
+        if self.queries > self.supply:
+            return None
+        return carla.Location(x=float(self.queries), y=0.0, z=0.0)
+
+def spawn_points(offset):
+    return [carla.Transform(carla.Location(x=offset + 10.0 * i, y=0.0, z=0.0)) for i in range(4)]
+
+def test_take_gives_what_navigation_has(tmp_path):
+    world = NavWorld(spawn_points(0.0), supply=3)
+    pool = NavigationPool(world, cache_dir=str(tmp_path), seed=0)
+    locations = pool.take(10)
+    assert len(locations) == 3
+    assert sorted(l.x for l in locations) == [1.0, 2.0, 3.0]
+    assert pool.take(2) == []
+
+def test_generated_worlds_do_not_share_a_cache(tmp_path):
+    first = NavigationPool(NavWorld(spawn_points(0.0), supply=5), cache_dir=str(tmp_path), seed=0)
+    first.take(5)
+    other = NavWorld(spawn_points(500.0), supply=0)
+    second = NavigationPool(other, cache_dir=str(tmp_path), seed=0)
+    assert first.cache_path != second.cache_path
+    assert len(second.locations) == 0
+    # the same map again loads its own locations without a query
+    again = NavWorld(spawn_points(0.0), supply=0)
+    assert len(NavigationPool(again, cache_dir=str(tmp_path), seed=0).take(5)) == 5
+    assert again.queries == 0
@@ -0,0 +1,54 @@
+"""SensorRig bundles against the simulator stand-in in benchmarks/sim.
+
+    python -m pytest -q tests
+"""
+
+import argparse
+import copy
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import carla
+from util.world import World
+from util.sync_driver import SynchronousDriver
+
+def make_world(cache_dir):
+    carla.reset_servers()
+    args = argparse.Namespace(
+        host='127.0.0.1', port=2000, tm_port=8000, timeout=5.0, map=None, xodr_path=None, osm_path=None,
+        rolename='hero', cache_dir=str(cache_dir))
+    return World(args)
+
+def converted(image, converter):
+    image = copy.copy(image)
+    image.convert(converter)
+    return np.frombuffer(bytes(image.raw_data), dtype=np.uint8).reshape(image.height, image.width, 4)
+
+def test_visualized_sensors_are_decoded_on_the_client(tmp_path):
+    with make_world(tmp_path) as world:
+        actor = world.spawn_actor('vehicle.tesla.model3', world.get_spawn_points()[0])
+        # raw depth, gray depth, raw segmentation, CityScapes
+        rig = actor.add_sensor_rig([1, 2, 4, 5], timeout=2.0)
+        with SynchronousDriver(world, report_interval=0) as driver:
+            driver.tick()
+            frame, bundle = rig.get()
+    raw_depth = bundle['Camera Depth (Raw)']
+    raw_labels = bundle['Camera Semantic Segmentation (Raw)']
+    # the bundle keeps the measurements, the decoded views are alongside
+    assert not any(isinstance(data, np.ndarray) for data in bundle.values())
+    assert sorted(rig.views) == ['Camera Depth (Gray Scale)', 'Camera Semantic Segmentation (CityScapes Palette)']
+    assert np.array_equal(converted(bundle['Camera Depth (Gray Scale)'], carla.ColorConverter.Raw),
+                          converted(raw_depth, carla.ColorConverter.Raw))
+    gray = rig.views['Camera Depth (Gray Scale)']
+    palette = rig.views['Camera Semantic Segmentation (CityScapes Palette)']
+    assert isinstance(gray, np.ndarray) and gray.shape == (raw_depth.height, raw_depth.width, 4)
+    expected = converted(raw_depth, carla.ColorConverter.Depth)
+    assert np.abs(gray.astype(np.int16) - expected.astype(np.int16)).max() <= 1
+    assert np.array_equal(palette[:, :, :3], converted(raw_labels, carla.ColorConverter.CityScapesPalette)[:, :, :3])
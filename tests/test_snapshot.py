@@ -0,0 +1,57 @@
+"""World.capture_state and StateSnapshot against the simulator stand-in in
+benchmarks/sim.
+
+    python -m pytest -q tests
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import carla
+from util.world import World
+from util.snapshot import STATE_DTYPE, StateSnapshot
+
+def make_world(cache_dir):
+    carla.reset_servers()
+    args = argparse.Namespace(
+        host='127.0.0.1', port=2000, tm_port=8000, timeout=5.0, map=None, xodr_path=None, osm_path=None,
+        rolename='hero', cache_dir=str(cache_dir))
+    return World(args)
+
+def test_capture_needs_no_query_per_vehicle(tmp_path):
+    lights = carla.VehicleLightState.Position | carla.VehicleLightState.LowBeam
+    with make_world(tmp_path) as world:
+        points = world.get_spawn_planner().plan(20, seed=0, min_separation=8.0)
+        world.spawn_many([{'blueprint': 'vehicle.*', 'transform': t, 'light_state': lights if i % 2 else None}
+                          for i, t in enumerate(points)])
+        world.capture_state()
+        carla.reset_stats()
+        snapshot = world.capture_state()
+        assert sum(carla.rpc_counts.values()) <= 3
+        assert 'get_light_state' not in carla.rpc_counts and 'get_map' not in carla.rpc_counts
+        queried = StateSnapshot.capture(world.world, world.world.get_actors(world.registry.ids()))
+    assert np.array_equal(np.sort(snapshot.states, order='id')['lights'],
+                          np.sort(queried.states, order='id')['lights'])
+    assert sorted(set(snapshot.states['lights'].tolist())) == [0, int(lights)]
+    assert snapshot.map_name == queried.map_name
+
+def test_snapshot_round_trips_through_bytes(tmp_path):
+    with make_world(tmp_path) as world:
+        points = world.get_spawn_planner().plan(5, seed=0)
+        world.spawn_many([{'blueprint': 'vehicle.*', 'transform': t} for t in points])
+        snapshot = world.capture_state()
+        loaded = StateSnapshot.from_bytes(snapshot.to_bytes())
+        report = world.restore_state(loaded)
+    assert STATE_DTYPE.itemsize == 80
+    assert np.array_equal(loaded.states, snapshot.states)
+    assert np.array_equal(loaded.weather, snapshot.weather)
+    assert (loaded.frame, loaded.map_name) == (snapshot.frame, snapshot.map_name)
+    assert report == {'restored': 5, 'missing': 0, 'errors': 0}
@@ -0,0 +1,119 @@
+"""util.weather timelines and WeatherEmitter, with the simulator stand-in
+in benchmarks/sim providing WeatherParameters.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'benchmarks', 'sim'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import carla
+from util.weather import ModelTimeline, Weather, WeatherEmitter, WeatherTimeline, weather_fields, weather_values
+
+def weather(**values):
+    parameters = carla.WeatherParameters()
+    for name, value in values.items():
+        setattr(parameters, name, value)
+    return parameters
+
+class WeatherWorld(object):
+    def __init__(self):
+        self.weather = carla.WeatherParameters()
+        self.set_calls = 0
+
+    def get_weather(self):
+        return self.weather
+
+    def set_weather(self, weather):
+        self.set_calls += 1
+
+def value(timeline, t, name):
+    return timeline.sample(t)[timeline.fields.index(name)]
+
+def test_keyframes_interpolate_linearly_and_hold_at_the_ends():
+    timeline = WeatherTimeline.from_keyframes([
+        (10.0, weather(cloudiness=100.0, fog_distance=40.0)), (0.0, weather(cloudiness=0.0, fog_distance=0.0))])
+    assert value(timeline, 2.5, 'cloudiness') == pytest.approx(25.0)
+    assert value(timeline, 7.5, 'fog_distance') == pytest.approx(30.0)
+    assert value(timeline, -5.0, 'cloudiness') == 0.0
+    assert value(timeline, 50.0, 'cloudiness') == 100.0
+
+def test_loop_blends_the_last_keyframe_back_into_the_first():
+    timeline = WeatherTimeline.from_keyframes([
+        (0.0, weather(cloudiness=0.0)), (10.0, weather(cloudiness=60.0)), (20.0, weather(cloudiness=20.0))],
+        loop=True)
+    assert timeline.duration == 30.0
+    assert value(timeline, 25.0, 'cloudiness') == pytest.approx(10.0)
+    for t in (5.0, 12.5, 27.0):
+        assert value(timeline, t + 30.0, 'cloudiness') == pytest.approx(value(timeline, t, 'cloudiness'))
+        assert value(timeline, t + 90.0, 'cloudiness') == pytest.approx(value(timeline, t, 'cloudiness'))
+
+def test_azimuth_goes_the_short_way_round():
+    timeline = WeatherTimeline.from_keyframes([
+        (0.0, weather(sun_azimuth_angle=350.0)), (10.0, weather(sun_azimuth_angle=10.0))])
+    assert value(timeline, 2.5, 'sun_azimuth_angle') == pytest.approx(355.0)
+    assert value(timeline, 5.0, 'sun_azimuth_angle') % 360.0 == pytest.approx(0.0, abs=1e-9)
+    assert value(timeline, 7.5, 'sun_azimuth_angle') == pytest.approx(5.0)
+    backwards = WeatherTimeline.from_keyframes([
+        (0.0, weather(sun_azimuth_angle=20.0)), (10.0, weather(sun_azimuth_angle=340.0))])
+    assert value(backwards, 5.0, 'sun_azimuth_angle') == pytest.approx(0.0, abs=1e-9)
+
+def test_model_timeline_follows_the_sun_storm_model_past_its_horizon():
+    start = weather(precipitation=10.0, sun_azimuth_angle=300.0, sun_altitude_angle=20.0)
+    timeline = ModelTimeline(start, horizon=20.0, step=0.5)
+    fields = weather_fields(start)
+    state = types.SimpleNamespace(**dict((name, getattr(start, name)) for name in fields))
+    model = Weather(state)
+    model.tick(0.0)
+    for k in range(1, 121):
+        model.tick(0.5)
+        if k % 40 == 0:
+            # 20, 40 and 60 seconds: two of them past the first horizon
+            expected = weather_values(state, fields)
+            assert np.allclose(timeline.sample(0.5 * k), expected)
+
+def test_emitter_sends_only_changes_past_the_threshold():
+    world = WeatherWorld()
+    emitter = WeatherEmitter(world, weather_fields(world.weather), threshold=1.0)
+    values = weather_values(world.weather, emitter.fields)
+    cloudiness = emitter.fields.index('cloudiness')
+    for _ in range(12):
+        values[cloudiness] += 0.3
+        emitter.update(values)
+    # 0.3 per update crosses 1.0 on every fourth one
+    assert emitter.stats() == {'sent': 3, 'skipped': 9}
+    assert world.set_calls == 3
+    assert emitter.update(values, force=True)
+    assert emitter.sent == 4
+
+def test_emitter_scales_the_threshold_for_small_fields():
+    world = WeatherWorld()
+    emitter = WeatherEmitter(world, weather_fields(world.weather), threshold=1.0)
+    values = weather_values(world.weather, emitter.fields)
+    values[emitter.fields.index('mie_scattering_scale')] += 0.005
+    assert emitter.update(values)
+    values[emitter.fields.index('rayleigh_scattering_scale')] += 0.0005
+    assert not emitter.update(values)
+    explicit = WeatherEmitter(world, emitter.fields, threshold=1.0, thresholds={'mie_scattering_scale': 0.01})
+    values = weather_values(world.weather, emitter.fields)
+    values[emitter.fields.index('mie_scattering_scale')] += 0.005
+    assert not explicit.update(values)
+
+def test_emitter_compares_azimuth_the_short_way_round():
+    world = WeatherWorld()
+    world.weather.sun_azimuth_angle = 359.5
+    emitter = WeatherEmitter(world, weather_fields(world.weather), threshold=1.0)
+    values = weather_values(world.weather, emitter.fields)
+    values[emitter.fields.index('sun_azimuth_angle')] = 0.2
+    assert not emitter.update(values)
+    values[emitter.fields.index('sun_azimuth_angle')] = 0.8
+    assert emitter.update(values)
@@ -1,18 +1,13 @@
-import glob
-import sys
-import os
+import time
 import numpy as np
 import weakref
-import pygame
-
-try:
-    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
-        sys.version_info.major,
-        sys.version_info.minor,
-        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
-except IndexError:
-    pass
+from util.frames import FrameArray
+from util.sensor_rig import SensorRig, CLIENT_VISUALIZATIONS
+from util.control import control_key
+from util import image_decode
+from util import dvs
 
+import util.carla_path
 import carla
 from carla import ColorConverter as cc
 
@@ -20,15 +15,30 @@ IM_WIDTH = 1280
 IM_HEIGHT = 720
 
 class Actor(object):
-    def __init__(self, world, rolename, actor, blueprint, spawn_point):
+    def __init__(self, world, rolename, actor, blueprint, spawn_point, client=None):
         self.role_name = rolename
         self.world = world
+        self.client = client
         self.blueprint = blueprint
         self.spawn_point = spawn_point
         self.actor = actor
         self.sensors_list = []
         self.img_sensor_data = None
-        self.surface = None
+        self.frame_surface = None
+        self.frame_array = None
+        self.sensor_rigs = []
+        self.recorder = None
+        self.deferred_control = False
+        self.control_bus = None
+        self.pending_control = None
+        self.last_control_key = None
+        self.controls_sent = 0
+        self.profiler = None
+        self.frame_listeners = []
+        self._visualization = None
+        self._depth_scratch = None
+        self._event_frame = None
+        self.camera_index = 0
         self.sensors = [
             ['sensor.camera.rgb', cc.Raw, 'Camera RGB', {}],
             ['sensor.camera.depth', cc.Raw, 'Camera Depth (Raw)', {}],
@@ -46,32 +56,120 @@ class Actor(object):
                 'chromatic_aberration_offset': '0'}]]
     
     def move_forward(self):
-        self.actor.apply_control(carla.VehicleControl(throttle=1.0, steer=0.0))
+        self.apply_control(carla.VehicleControl(throttle=1.0, steer=0.0))
+
+    def apply_control(self, control):
+        # with deferred_control set (sync mode) the latest control is kept
+        # until flush_control() is called once per simulation step; with a
+        # control bus it is batched with every other actor's instead
+        if self.control_bus is not None:
+            self.control_bus.submit(self.actor.id, control)
+            return
+        self.pending_control = control
+        if not self.deferred_control:
+            self.flush_control()
+
+    def flush_control(self):
+        control = self.pending_control
+        if control is None:
+            return False
+        self.pending_control = None
+        key = control_key(control)
+        if key == self.last_control_key:
+            return False
+        self.actor.apply_control(control)
+        self.last_control_key = key
+        self.controls_sent += 1
+        return True
         
-    def add_camera_sensor(self):
-        cam_bp = self.world.get_blueprint_library().find(self.sensors[0][0])
+    def add_camera_sensor(self, headless=False, sensor_index=0):
+        # sensor_index picks one of the cameras in self.sensors; depth and
+        # segmentation views are decoded on the client, DVS events drawn
+        item = self.sensors[sensor_index]
+        if not item[0].startswith('sensor.camera'):
+            raise ValueError('sensor %d (%s) is not a camera' % (sensor_index, item[2]))
+        self.camera_index = sensor_index
+        cam_bp = self.world.get_blueprint_library().find(item[0])
         cam_bp.set_attribute("image_size_x", f"{IM_WIDTH}")
         cam_bp.set_attribute("image_size_y", f"{IM_HEIGHT}")
-        cam_bp.set_attribute("fov", "110")
+        if cam_bp.has_attribute("fov"):
+            cam_bp.set_attribute("fov", "110")
+        for attr_name, attr_value in item[3].items():
+            cam_bp.set_attribute(attr_name, attr_value)
         
         spawn_point = carla.Transform(carla.Location(x = 2.5, z = 0.7))
         sensor = self.world.spawn_actor(cam_bp, spawn_point, attach_to = self.actor)
         self.sensors_list.append(sensor)
+        if headless:
+            self.frame_array = FrameArray(IM_WIDTH, IM_HEIGHT)
+        else:
+            # pygame is only needed with a window
+            from util.display import FrameSurface
+            self.frame_surface = FrameSurface(IM_WIDTH, IM_HEIGHT)
         weak_self = weakref.ref(self)
         sensor.listen(lambda image: Actor._parse_image(weak_self, image))    
     
+    def add_sensor_rig(self, sensor_indices, **kwargs):
+        if self.client is None:
+            raise RuntimeError('a sensor rig needs the client the actor was spawned with')
+        kwargs.setdefault('recorder', self.recorder)
+        rig = SensorRig(self.client, self.world, self.actor,
+                        [self.sensors[i] for i in sensor_indices], **kwargs)
+        self.sensors_list.extend(rig.spawn())
+        self.sensor_rigs.append(rig)
+        return rig
+
+    def set_recorder(self, recorder):
+        self.recorder = recorder
+        for rig in self.sensor_rigs:
+            rig.recorder = recorder
+
+    def wait_for_frame(self, frame, timeout=1.0):
+        frames = self.frame_surface or self.frame_array
+        if frames is None:
+            return False
+        return frames.wait_for_frame(frame, timeout)
+
     def render(self, display):
-        if self.surface is not None:
-            display.blit(self.surface, (0, 0))
+        if self.frame_surface is None:
+            return False
+        return self.frame_surface.blit(display)
         
+    def _visualization_buffer(self, image):
+        if self._visualization is None:
+            self._visualization = np.empty((image.height, image.width, 4), dtype=np.uint8)
+            self._depth_scratch = np.empty((image.height, image.width), dtype=np.float32)
+        return self._visualization
+
     @staticmethod
     def _parse_image(weak_self, image):
         self = weak_self()
         if not self:
             return
-        image.convert(self.sensors[0][1])
-        array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-        array = np.reshape(array, (image.height, image.width, 4))
-        array = array[:, :, :3]
-        array = array[:, :, ::-1]
-        self.surface = pygame.surfarray.make_surface(array.swapaxes(0, 1))        
\ No newline at end of file
+        profiler = self.profiler
+        started = time.perf_counter() if profiler is not None else None
+        item = self.sensors[self.camera_index]
+        if self.recorder is not None:
+            self.recorder.record(item[2], image)
+        converter = item[1]
+        buffer = image.raw_data
+        kind = CLIENT_VISUALIZATIONS.get(converter)
+        if item[0] == 'sensor.camera.dvs':
+            # DVS data is an event packet, not pixels
+            if self._event_frame is None:
+                self._event_frame = dvs.EventFrame(image.width, image.height)
+            self._event_frame.reset()
+            self._event_frame.add(dvs.decode(image))
+            buffer = self._event_frame.to_bgra(self._visualization_buffer(image))
+        elif kind is not None:
+            buffer = image_decode.visualize(image, kind, self._visualization_buffer(image), self._depth_scratch)
+        elif converter is not None and converter != cc.Raw:
+            image.convert(converter)
+        if self.frame_surface is not None:
+            self.frame_surface.write(buffer, image.frame, image.timestamp)
+        else:
+            self.frame_array.write(buffer, image.frame, image.timestamp)
+        for listener in self.frame_listeners:
+            listener(image.frame, buffer, image.width, image.height)
+        if profiler is not None:
+            profiler.record('parse_image', time.perf_counter() - started)
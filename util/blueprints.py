@@ -0,0 +1,85 @@
+import fnmatch
+import logging
+import time
+
+INDEXED_ATTRIBUTES = ('number_of_wheels', 'color', 'driver_id', 'speed', 'role_name', 'is_invincible')
+
+# vehicles prone to accidents, see spawn_npc.py --safe
+UNSAFE_SUFFIXES = ('isetta', 'carlacola', 'cybertruck', 't2')
+
+class BlueprintCatalog(object):
+    def __init__(self, library, attributes=INDEXED_ATTRIBUTES):
+        started = time.time()
+        self.library = library
+        self.blueprints = sorted(library, key=lambda bp: bp.id)
+        self.by_id = {}
+        self.by_attribute = dict((name, {}) for name in attributes)
+        self.recommended = {}
+        self.safe_ids = set()
+        self.unsafe_ids = set()
+        self._patterns = {}
+        for bp in self.blueprints:
+            self.by_id[bp.id] = bp
+            recommended = {}
+            for name in attributes:
+                if bp.has_attribute(name):
+                    attribute = bp.get_attribute(name)
+                    self.by_attribute[name].setdefault(attribute.as_str(), []).append(bp)
+                    recommended[name] = tuple(attribute.recommended_values)
+            self.recommended[bp.id] = recommended
+            if bp.id.startswith('vehicle.'):
+                if self._is_safe(bp):
+                    self.safe_ids.add(bp.id)
+                else:
+                    self.unsafe_ids.add(bp.id)
+        logging.debug('indexed %d blueprints in %.3f seconds' % (len(self.blueprints), time.time() - started))
+
+    @staticmethod
+    def _is_safe(bp):
+        if not bp.has_attribute('number_of_wheels') or bp.get_attribute('number_of_wheels').as_int() != 4:
+            return False
+        return not bp.id.endswith(UNSAFE_SUFFIXES)
+
+    def __len__(self):
+        return len(self.blueprints)
+
+    def __contains__(self, blueprint_id):
+        return blueprint_id in self.by_id
+
+    def find(self, blueprint_id):
+        return self.by_id[blueprint_id]
+
+    def filter(self, pattern):
+        # same matching rules as BlueprintLibrary.filter (id or any tag), but
+        # each pattern is only matched against the library once
+        matches = self._patterns.get(pattern)
+        if matches is None:
+            if pattern in self.by_id:
+                matches = [self.by_id[pattern]]
+            else:
+                matches = [bp for bp in self.blueprints
+                           if fnmatch.fnmatchcase(bp.id, pattern)
+                           or any(fnmatch.fnmatchcase(tag, pattern) for tag in bp.tags)]
+            self._patterns[pattern] = matches
+        return matches
+
+    def get(self, pattern):
+        bp = self.by_id.get(pattern)
+        if bp is not None:
+            return bp
+        matches = self.filter(pattern)
+        if not matches:
+            raise IndexError('no blueprint matches %r' % pattern)
+        return matches[0]
+
+    def with_attribute(self, name, value):
+        return self.by_attribute[name].get(str(value), [])
+
+    def recommended_values(self, blueprint_id, name):
+        return self.recommended[blueprint_id].get(name, ())
+
+    def safe(self, blueprints):
+        return [bp for bp in blueprints if bp.id in self.safe_ids]
+
+    def unsafe(self, blueprints):
+        return [bp for bp in blueprints if bp.id in self.unsafe_ids]
@@ -0,0 +1,18 @@
+import glob
+import os
+import sys
+
+# the carla egg of a source checkout next to this one; every module imports
+# this before `import carla`, so the search runs once per process
+EGG_PATTERN = '../carla/dist/carla-*%d.%d-%s.egg' % (
+    sys.version_info.major,
+    sys.version_info.minor,
+    'win-amd64' if os.name == 'nt' else 'linux-x86_64')
+
+def find_egg():
+    eggs = glob.glob(EGG_PATTERN)
+    return eggs[0] if eggs else None
+
+egg = find_egg()
+if egg is not None and egg not in sys.path:
+    sys.path.append(egg)
@@ -0,0 +1,68 @@
+import fnmatch
+import logging
+import re
+import textwrap
+from util.map_cache import MapCache
+
+import util.carla_path
+import carla
+
+def weather_presets():
+    return [x for x in dir(carla.WeatherParameters) if re.match('[A-Z].+', x)]
+
+class ServerCatalog(object):
+    # maps, blueprint ids and weather presets only change with the server
+    # (and client) build, so after the first query they come from disk and
+    # cost a single get_server_version round trip
+    def __init__(self, client, cache=None, refresh=False):
+        self.client = client
+        self.cache = cache or MapCache()
+        self.version = '%s+%s' % (client.get_server_version(), client.get_client_version())
+        data = None if refresh else self.cache.get_catalog(self.version)
+        self.cached = data is not None
+        if data is None:
+            data = self._query()
+            self.cache.put_catalog(self.version, data)
+            logging.debug('cached server catalog for %s' % self.version)
+        self.maps = data['maps']
+        self.blueprints = data['blueprints']
+        self.weather_presets = data['weather_presets']
+
+    @classmethod
+    def connect(cls, args):
+        client = carla.Client(args.host, args.port)
+        client.set_timeout(float(args.timeout))
+        return cls(client, MapCache(getattr(args, 'cache_dir', None)))
+
+    def _query(self):
+        return {
+            'maps': sorted(m.replace('/Game/Carla/Maps/', '') for m in self.client.get_available_maps()),
+            'blueprints': sorted(bp.id for bp in self.client.get_world().get_blueprint_library()),
+            'weather_presets': weather_presets()}
+
+    def vehicles(self):
+        return [x for x in self.blueprints if x.startswith('vehicle.')]
+
+    def has_blueprint(self, pattern):
+        return any(fnmatch.fnmatchcase(x, pattern) for x in self.blueprints)
+
+    def validate(self, map_name=None, weather=None, vehicle=None):
+        errors = []
+        if map_name is not None and map_name not in self.maps:
+            errors.append('map %r not found, use --list to see available maps' % map_name)
+        if weather is not None and weather not in self.weather_presets:
+            errors.append('weather preset %r not found, use --list to see available presets' % weather)
+        if vehicle is not None and not self.has_blueprint(vehicle):
+            errors.append('no blueprint matches %r, use --list to see available vehicles' % vehicle)
+        return errors
+
+    def print_options(self):
+        indent = 4 * ' '
+        def wrap(text):
+            return '\n'.join(textwrap.wrap(text, initial_indent=indent, subsequent_indent=indent))
+        print('weather presets:\n')
+        print(wrap(', '.join(self.weather_presets)) + '.\n')
+        print('available maps:\n')
+        print(wrap(', '.join(self.maps)) + '.\n')
+        print('available vehicles:\n')
+        print(wrap(', '.join(self.vehicles())) + '.\n')
@@ -0,0 +1,61 @@
+import threading
+
+import util.carla_path
+import carla
+
+ApplyVehicleControl = carla.command.ApplyVehicleControl
+ApplyWalkerControl = carla.command.ApplyWalkerControl
+
+def control_key(control):
+    # VehicleControl and WalkerControl do not compare by value across
+    # versions, so compare a tuple of their fields instead
+    if hasattr(control, 'throttle'):
+        return ('vehicle', round(control.throttle, 4), round(control.steer, 4), round(control.brake, 4),
+                control.hand_brake, control.reverse, control.manual_gear_shift, control.gear)
+    direction = control.direction
+    return ('walker', round(direction.x, 4), round(direction.y, 4), round(direction.z, 4),
+            round(control.speed, 4), control.jump)
+
+class ControlBus(object):
+    def __init__(self, client):
+        self.client = client
+        self.flushes = 0
+        self.sent = 0
+        self.unchanged = 0
+        self._pending = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def submit(self, actor_id, control):
+        # only the latest intent per actor survives until the next flush
+        with self._lock:
+            self._pending[actor_id] = control
+
+    def forget(self, actor_id):
+        with self._lock:
+            self._pending.pop(actor_id, None)
+            self._last.pop(actor_id, None)
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        batch = []
+        for actor_id, control in pending.items():
+            key = control_key(control)
+            if self._last.get(actor_id) == key:
+                self.unchanged += 1
+                continue
+            self._last[actor_id] = key
+            if key[0] == 'vehicle':
+                batch.append(ApplyVehicleControl(actor_id, control))
+            else:
+                batch.append(ApplyWalkerControl(actor_id, control))
+        if batch:
+            self.client.apply_batch(batch)
+        self.flushes += 1
+        self.sent += len(batch)
+        return len(batch)
+
+    def stats(self):
+        return {'flushes': self.flushes, 'sent': self.sent, 'unchanged': self.unchanged}
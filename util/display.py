@@ -0,0 +1,108 @@
+import threading
+import time
+import numpy as np
+import pygame
+
+# CARLA cameras deliver BGRA bytes; on little-endian hosts a 32-bit surface
+# with these masks has exactly that memory layout, so frames can be copied in
+# without any channel shuffling.
+BGRA_MASKS = (0x00ff0000, 0x0000ff00, 0x000000ff, 0)
+
+class FrameSurface(object):
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._surfaces = [pygame.Surface((width, height), 0, 32, BGRA_MASKS) for _ in range(2)]
+        self._front = 0
+        self._lock = threading.Condition()
+        self.frame = None
+        self.timestamp = None
+        self.received_at = None
+        self.frames_received = 0
+        self.frames_shown = 0
+        self._shown = 0
+
+    @property
+    def surface(self):
+        return self._surfaces[self._front]
+
+    def has_new_frame(self):
+        return self.frames_received != self._shown
+
+    def write(self, buffer, frame=None, timestamp=None):
+        back = self._surfaces[1 - self._front]
+        view = back.get_view('1')
+        dst = np.frombuffer(view, dtype=np.uint8)
+        src = np.frombuffer(buffer, dtype=np.uint8)
+        if src.size != dst.size:
+            del dst, view
+            raise ValueError('frame buffer has %d bytes, expected %d' % (src.size, self.width * self.height * 4))
+        np.copyto(dst, src)
+        del dst, view
+        with self._lock:
+            self._front = 1 - self._front
+            self.frames_received += 1
+            self.frame = frame
+            self.timestamp = timestamp
+            self.received_at = time.perf_counter()
+            self._lock.notify_all()
+
+    def wait_for_frame(self, frame, timeout=1.0):
+        # sync mode: block until the image of the given simulation frame is in
+        with self._lock:
+            return self._lock.wait_for(lambda: self.frame is not None and self.frame >= frame, timeout)
+
+    def blit(self, display, position=(0, 0)):
+        with self._lock:
+            if not self.has_new_frame():
+                return False
+            display.blit(self._surfaces[self._front], position)
+            self._shown = self.frames_received
+            self.frames_shown += 1
+            return True
+
+def mono_font(size=14):
+    fonts = pygame.font.get_fonts()
+    for name in ('ubuntumono', 'dejavusansmono', 'couriernew'):
+        if name in fonts:
+            return pygame.font.Font(pygame.font.match_font(name), size)
+    mono = [x for x in fonts if 'mono' in x]
+    return pygame.font.Font(pygame.font.match_font(mono[0]) if mono else None, size)
+
+class PerfHud(object):
+    # overlay of a StageProfiler's rolling percentiles; the text surface is
+    # rebuilt every `refresh` seconds, not every frame
+    def __init__(self, profiler, refresh=0.5, position=(8, 8)):
+        self.profiler = profiler
+        self.refresh = refresh
+        self.position = position
+        self.visible = False
+        self._font = None
+        self._surface = None
+        self._rendered_at = 0.0
+
+    def draw(self, display):
+        if not self.visible:
+            return
+        now = time.time()
+        if self._surface is None or now - self._rendered_at >= self.refresh:
+            self._surface = self._render()
+            self._rendered_at = now
+        display.blit(self._surface, self.position)
+
+    def _render(self):
+        if self._font is None:
+            self._font = mono_font()
+        lines = ['%-18s %8s %8s %8s' % ('stage', 'p50', 'p95', 'max')]
+        for name, stats in self.profiler.summary().items():
+            if not stats['count']:
+                continue
+            unit = '' if stats['unit'] == 'ms' else ' ' + stats['unit']
+            lines.append('%-18s %8.2f %8.2f %8.2f%s' % (name, stats['p50'], stats['p95'], stats['max'], unit))
+        rendered = [self._font.render(line, True, (255, 255, 255)) for line in lines]
+        height = self._font.get_linesize()
+        surface = pygame.Surface((max(r.get_width() for r in rendered) + 12, height * len(rendered) + 8))
+        surface.set_alpha(170)
+        for i, text in enumerate(rendered):
+            surface.blit(text, (6, 4 + i * height))
+        return surface
@@ -0,0 +1,167 @@
+import numpy as np
+
+# sensor.camera.dvs delivers packed events: uint16 x, uint16 y, int64 t
+# (simulation time in nanoseconds) and a bool polarity, sorted by t.
+EVENT_DTYPE = np.dtype([('x', np.uint16), ('y', np.uint16), ('t', np.int64), ('pol', np.bool_)])
+
+def decode(measurement):
+    return events_from_buffer(measurement.raw_data)
+
+def events_from_buffer(buffer):
+    return np.frombuffer(buffer, dtype=EVENT_DTYPE)
+
+def window(events, t_start, t_end):
+    # events are sorted by t, so a time window is a slice (a view)
+    lo, hi = np.searchsorted(events['t'], (t_start, t_end))
+    return events[lo:hi]
+
+class EventAccumulator(object):
+    # scratch arrays grow to the largest packet seen and are reused, and
+    # events are summed with ufunc.at straight into the accumulator, so a
+    # steady event stream allocates nothing per packet; ufunc.at is only
+    # fast on contiguous operands, hence the copies out of the event fields
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.events = 0
+        self._scratch = {}
+
+    def _buffer(self, name, size, dtype):
+        array = self._scratch.get(name)
+        if array is None or array.size < size:
+            array = self._scratch[name] = np.empty(max(size, 2 * (array.size if array is not None else 0)), dtype=dtype)
+        return array[:size]
+
+    def _pixels(self, events):
+        index = self._buffer('pixels', len(events), np.intp)
+        np.multiply(events['y'], self.width, out=index, dtype=np.intp)
+        np.add(index, events['x'], out=index, dtype=np.intp)
+        return index
+
+class EventFrame(EventAccumulator):
+    # positive and negative event counts per pixel, as (height, width, 2)
+    def __init__(self, width, height):
+        super(EventFrame, self).__init__(width, height)
+        self.counts = np.zeros((height, width, 2), dtype=np.int32)
+
+    def reset(self):
+        self.counts.fill(0)
+        self.events = 0
+
+    def add(self, events):
+        n = len(events)
+        if n == 0:
+            return self.counts
+        index = self._pixels(events)
+        np.multiply(index, 2, out=index)
+        np.add(index, events['pol'], out=index, dtype=np.intp)
+        ones = self._buffer('ones', n, np.int32)
+        ones.fill(1)
+        np.add.at(self.counts.reshape(-1), index, ones)
+        self.events += n
+        return self.counts
+
+    def polarity(self, out=None):
+        # positive minus negative count per pixel
+        if out is None:
+            out = np.empty((self.height, self.width), dtype=np.int32)
+        np.subtract(self.counts[:, :, 1], self.counts[:, :, 0], out=out)
+        return out
+
+    def to_bgra(self, out=None):
+        # positive events red and negative blue, as CARLA's examples draw them
+        if out is None:
+            out = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        out[:, :, 1] = 0
+        out[:, :, 3] = 255
+        np.multiply(self.counts[:, :, 1] > 0, 255, out=out[:, :, 2], casting='unsafe')
+        np.multiply(self.counts[:, :, 0] > 0, 255, out=out[:, :, 0], casting='unsafe')
+        return out
+
+NEVER = np.iinfo(np.int64).min // 2
+
+class TimeSurface(EventAccumulator):
+    # latest event time per pixel and polarity, read out with exponential
+    # decay; tau is in the units of t
+    def __init__(self, width, height, tau=50e6):
+        super(TimeSurface, self).__init__(width, height)
+        self.tau = tau
+        self.last = np.full((height, width, 2), NEVER, dtype=np.int64)
+
+    def reset(self):
+        self.last.fill(NEVER)
+        self.events = 0
+
+    def add(self, events):
+        if len(events) == 0:
+            return self.last
+        index = self._pixels(events)
+        np.multiply(index, 2, out=index)
+        np.add(index, events['pol'], out=index, dtype=np.intp)
+        # a fancy-index assignment with repeated indices does not promise
+        # which write wins, so take the maximum explicitly
+        t = self._buffer('t', len(events), np.int64)
+        np.copyto(t, events['t'])
+        np.maximum.at(self.last.reshape(-1), index, t)
+        self.events += len(events)
+        return self.last
+
+    def surface(self, t_now, out=None):
+        if out is None:
+            out = np.empty(self.last.shape, dtype=np.float32)
+        np.subtract(self.last, t_now, out=out, casting='unsafe')
+        np.multiply(out, np.float32(1.0 / self.tau), out=out)
+        np.exp(out, out=out)
+        return out
+
+class VoxelGrid(EventAccumulator):
+    # signed polarity split linearly between the two nearest of `bins`
+    # temporal slices, as (bins, height, width) float32
+    def __init__(self, width, height, bins=5):
+        super(VoxelGrid, self).__init__(width, height)
+        self.bins = bins
+        self.grid = np.zeros((bins, height, width), dtype=np.float32)
+
+    def reset(self):
+        self.grid.fill(0.0)
+        self.events = 0
+
+    def accumulate(self, events, t_start=None, t_end=None):
+        self.reset()
+        n = len(events)
+        if n == 0:
+            return self.grid
+        t = events['t']
+        t_start = t[0] if t_start is None else t_start
+        t_end = t[-1] if t_end is None else t_end
+        span = max(t_end - t_start, 1)
+        position = self._buffer('position', n, np.float32)
+        np.subtract(t, t_start, out=position, casting='unsafe')
+        np.multiply(position, np.float32((self.bins - 1) / float(span)), out=position)
+        np.clip(position, 0.0, self.bins - 1, out=position)
+        # position is non-negative, so the integer cast is the floor
+        lower = self._buffer('lower', n, np.intp)
+        lower[:] = position
+        fraction = self._buffer('fraction', n, np.float32)
+        np.subtract(position, lower, out=fraction, casting='unsafe')
+        sign = self._buffer('sign', n, np.float32)
+        np.multiply(events['pol'], np.float32(2.0), out=sign)
+        np.subtract(sign, np.float32(1.0), out=sign)
+        pixels = self._pixels(events)
+        # the lower neighbours' indices and weights go in the first half,
+        # the upper ones' in the second, and a single add.at sums both
+        index = self._buffer('index', 2 * n, np.intp)
+        weight = self._buffer('weight', 2 * n, np.float32)
+        np.multiply(lower, self.height * self.width, out=index[:n])
+        np.add(index[:n], pixels, out=index[:n])
+        np.subtract(np.float32(1.0), fraction, out=weight[:n])
+        np.multiply(weight[:n], sign, out=weight[:n])
+        # the upper neighbour; at the last bin the fraction is zero anyway
+        np.add(lower, 1, out=lower)
+        np.minimum(lower, self.bins - 1, out=lower)
+        np.multiply(lower, self.height * self.width, out=index[n:])
+        np.add(index[n:], pixels, out=index[n:])
+        np.multiply(fraction, sign, out=weight[n:])
+        np.add.at(self.grid.reshape(-1), index, weight)
+        self.events = n
+        return self.grid
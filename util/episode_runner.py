@@ -0,0 +1,185 @@
+import logging
+import multiprocessing
+import queue
+import time
+import traceback
+from collections import deque, namedtuple
+
+Endpoint = namedtuple('Endpoint', ['host', 'port', 'tm_port'])
+
+def parse_endpoints(text):
+    # "host:port:tm_port,host:port:tm_port"; tm_port defaults to port + 6000
+    endpoints = []
+    for item in text.split(','):
+        parts = item.strip().split(':')
+        host = parts[0] or '127.0.0.1'
+        port = int(parts[1]) if len(parts) > 1 else 2000
+        tm_port = int(parts[2]) if len(parts) > 2 else port + 6000
+        endpoints.append(Endpoint(host, port, tm_port))
+    return endpoints
+
+def _worker(endpoint, episode_fn, inbox, outbox):
+    while True:
+        task = inbox.get()
+        if task is None:
+            return
+        episode_id, episode = task
+        started = time.time()
+        try:
+            result = episode_fn(endpoint, episode)
+            outbox.put(('done', endpoint, episode_id, result, time.time() - started))
+        except Exception:
+            outbox.put(('error', endpoint, episode_id, traceback.format_exc(), time.time() - started))
+
+class EpisodeRunner(object):
+    def __init__(self, endpoints, episode_fn, retries=1, max_restarts=3, poll_interval=0.5):
+        self.endpoints = list(endpoints)
+        self.episode_fn = episode_fn
+        self.retries = retries
+        self.max_restarts = max_restarts
+        self.poll_interval = poll_interval
+        self.summary = None
+        self._context = multiprocessing.get_context('spawn')
+
+    def _start(self, endpoint, outbox):
+        inbox = self._context.Queue()
+        process = self._context.Process(target=_worker, args=(endpoint, self.episode_fn, inbox, outbox),
+                                        name='episodes-%s:%d' % (endpoint.host, endpoint.port), daemon=True)
+        process.start()
+        return {'process': process, 'inbox': inbox, 'current': None, 'restarts': 0, 'alive': True}
+
+    def _partition(self, episodes):
+        # episodes naming the same map stay on the same server when possible,
+        # so servers do not reload maps back and forth
+        pending = dict((endpoint, deque()) for endpoint in self.endpoints)
+        homes = {}
+        for episode_id, episode in enumerate(episodes):
+            key = episode.get('map') if isinstance(episode, dict) else None
+            if key is not None and key in homes:
+                endpoint = homes[key]
+            else:
+                endpoint = min(self.endpoints, key=lambda e: len(pending[e]))
+                if key is not None:
+                    homes[key] = endpoint
+            pending[endpoint].append(episode_id)
+        return pending
+
+    def _next(self, endpoint, pending, workers):
+        if pending[endpoint]:
+            return pending[endpoint].popleft(), False
+        # steal from the back of the busiest live server's queue
+        victims = [e for e in self.endpoints if pending[e] and e != endpoint]
+        if not victims:
+            return None, False
+        victim = max(victims, key=lambda e: len(pending[e]) + (0 if workers[e]['alive'] else 1000000))
+        return pending[victim].pop(), True
+
+    def run(self, episodes):
+        episodes = list(episodes)
+        started = time.time()
+        outbox = self._context.Queue()
+        pending = self._partition(episodes)
+        workers = dict((endpoint, self._start(endpoint, outbox)) for endpoint in self.endpoints)
+        attempts = [0] * len(episodes)
+        results = [None] * len(episodes)
+        stolen = 0
+        remaining = len(episodes)
+
+        def dispatch(endpoint):
+            worker = workers[endpoint]
+            episode_id, was_stolen = self._next(endpoint, pending, workers)
+            if episode_id is None:
+                return 0
+            attempts[episode_id] += 1
+            worker['current'] = (episode_id, time.time())
+            worker['inbox'].put((episode_id, episodes[episode_id]))
+            return 1 if was_stolen else 0
+
+        def failed(endpoint, episode_id, error, seconds):
+            if attempts[episode_id] <= self.retries:
+                pending[endpoint].appendleft(episode_id)
+                return 0
+            results[episode_id] = {'episode': episodes[episode_id], 'endpoint': endpoint, 'result': None,
+                                   'error': error, 'seconds': seconds, 'attempts': attempts[episode_id]}
+            return 1
+
+        for endpoint in self.endpoints:
+            stolen += dispatch(endpoint)
+        try:
+            while remaining > 0:
+                try:
+                    status, endpoint, episode_id, payload, seconds = outbox.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    status = None
+                if status == 'done':
+                    results[episode_id] = {'episode': episodes[episode_id], 'endpoint': endpoint, 'result': payload,
+                                           'error': None, 'seconds': seconds, 'attempts': attempts[episode_id]}
+                    remaining -= 1
+                elif status == 'error':
+                    logging.warning('episode %d failed on %s:%d\n%s' % (episode_id, endpoint.host, endpoint.port, payload))
+                    remaining -= failed(endpoint, episode_id, payload.strip().splitlines()[-1], seconds)
+                if status is not None:
+                    workers[endpoint]['current'] = None
+                    stolen += dispatch(endpoint)
+                remaining -= self._reap(workers, pending, outbox, failed)
+                for endpoint, worker in workers.items():
+                    if worker['alive'] and worker['current'] is None:
+                        stolen += dispatch(endpoint)
+                if not any(worker['alive'] for worker in workers.values()):
+                    for episode_id in [x for e in self.endpoints for x in pending[e]]:
+                        results[episode_id] = {'episode': episodes[episode_id], 'endpoint': None, 'result': None,
+                                               'error': 'no live workers', 'seconds': 0.0,
+                                               'attempts': attempts[episode_id]}
+                    break
+        finally:
+            for worker in workers.values():
+                if worker['process'].is_alive():
+                    worker['inbox'].put(None)
+            for worker in workers.values():
+                worker['process'].join(timeout=5.0)
+                if worker['process'].is_alive():
+                    worker['process'].terminate()
+        self.summary = self._summarize(results, time.time() - started, stolen)
+        return results
+
+    def _reap(self, workers, pending, outbox, failed):
+        # a worker process that died (segfault, server crash taking the client
+        # with it) gets its episode retried and is restarted
+        finished = 0
+        for endpoint, worker in workers.items():
+            if not worker['alive'] or worker['process'].is_alive():
+                continue
+            logging.error('worker for %s:%d exited with code %s' % (
+                endpoint.host, endpoint.port, worker['process'].exitcode))
+            if worker['current'] is not None:
+                episode_id, since = worker['current']
+                finished += failed(endpoint, episode_id, 'worker exited with code %s' % worker['process'].exitcode,
+                                   time.time() - since)
+            if worker['restarts'] >= self.max_restarts:
+                logging.error('giving up on %s:%d after %d restarts' % (endpoint.host, endpoint.port, worker['restarts']))
+                worker['alive'] = False
+                worker['current'] = None
+                continue
+            restarts = worker['restarts'] + 1
+            workers[endpoint] = self._start(endpoint, outbox)
+            workers[endpoint]['restarts'] = restarts
+        return finished
+
+    def _summarize(self, results, elapsed, stolen):
+        per_endpoint = {}
+        for record in results:
+            if record is None or record['endpoint'] is None:
+                continue
+            endpoint = record['endpoint']
+            stats = per_endpoint.setdefault('%s:%d' % (endpoint.host, endpoint.port),
+                                            {'episodes': 0, 'errors': 0, 'seconds': 0.0})
+            stats['episodes'] += 1
+            stats['errors'] += 1 if record['error'] else 0
+            stats['seconds'] += record['seconds']
+        done = sum(1 for r in results if r is not None and r['error'] is None)
+        summary = {'episodes': len(results), 'succeeded': done, 'stolen': stolen, 'seconds': elapsed,
+                   'episodes_per_minute': 60.0 * done / elapsed if elapsed > 0 else 0.0,
+                   'endpoints': per_endpoint}
+        logging.info('%d/%d episodes in %.1f seconds (%.1f per minute, %d stolen)' % (
+            done, len(results), elapsed, summary['episodes_per_minute'], stolen))
+        return summary
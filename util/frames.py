@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+import numpy as np
+
+class FrameArray(object):
+    # numpy counterpart of util.display.FrameSurface for runs without a
+    # display: camera frames stay as (height, width, 4) BGRA arrays
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._arrays = [np.zeros((height, width, 4), dtype=np.uint8) for _ in range(2)]
+        self._front = 0
+        self._lock = threading.Condition()
+        self.frame = None
+        self.timestamp = None
+        self.received_at = None
+        self.frames_received = 0
+        self._taken = 0
+
+    def has_new_frame(self):
+        return self.frames_received != self._taken
+
+    def write(self, buffer, frame=None, timestamp=None):
+        back = self._arrays[1 - self._front]
+        src = np.frombuffer(buffer, dtype=np.uint8)
+        if src.size != back.size:
+            raise ValueError('frame buffer has %d bytes, expected %d' % (src.size, back.size))
+        np.copyto(back.reshape(-1), src)
+        with self._lock:
+            self._front = 1 - self._front
+            self.frames_received += 1
+            self.frame = frame
+            self.timestamp = timestamp
+            self.received_at = time.perf_counter()
+            self._lock.notify_all()
+
+    def wait_for_frame(self, frame, timeout=1.0):
+        with self._lock:
+            return self._lock.wait_for(lambda: self.frame is not None and self.frame >= frame, timeout)
+
+    def latest(self, out=None):
+        # the front array is rewritten two frames later, so callers that keep
+        # the image around should pass an out array to copy into
+        with self._lock:
+            self._taken = self.frames_received
+            array = self._arrays[self._front]
+            if out is not None:
+                np.copyto(out, array)
+                array = out
+            return self.frame, array
+
+def write_thumbnail(path, bgra, scale=4):
+    # binary PPM needs neither pygame nor an image library
+    rgb = np.ascontiguousarray(bgra[::scale, ::scale, 2::-1])
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'P6\n%d %d\n255\n' % (rgb.shape[1], rgb.shape[0]))
+        f.write(rgb.tobytes())
+
+class PreviewWriter(object):
+    def __init__(self, directory, every=30, scale=4):
+        self.directory = directory
+        self.every = every
+        self.scale = scale
+        self.written = 0
+        self._seen = 0
+
+    def offer(self, frames):
+        if not frames.has_new_frame():
+            return False
+        self._seen += 1
+        if self._seen % self.every:
+            frames.latest()
+            return False
+        frame, array = frames.latest()
+        write_thumbnail(os.path.join(self.directory, 'frame_%08d.ppm' % (frame if frame is not None else self._seen)),
+                        array, self.scale)
+        self.written += 1
+        return True
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+
+class Knob(object):
+    # one degradation ladder; level 0 is full quality and every later value
+    # is cheaper for the server
+    def __init__(self, name, values, apply):
+        self.name = name
+        self.values = list(values)
+        self.apply = apply
+        self.level = 0
+
+    @property
+    def value(self):
+        return self.values[self.level]
+
+    def can_degrade(self):
+        return self.level < len(self.values) - 1
+
+    def can_restore(self):
+        return self.level > 0
+
+    def set_level(self, level):
+        old = self.value
+        self.level = level
+        result = self.apply(self.value)
+        return old, self.value if result is None else result
+
+def hybrid_physics_knob(traffic_manager, radii=(None, 70.0, 50.0, 30.0, 15.0)):
+    # None turns hybrid physics off
+    def apply(radius):
+        traffic_manager.set_hybrid_physics_mode(radius is not None)
+        if radius is not None:
+            traffic_manager.set_hybrid_physics_radius(radius)
+    # the count and sensor rig knobs start out at their level 0; this one
+    # has to be put there, or e.g. a 50 m first radius waits for a restore
+    knob = Knob('hybrid_radius', radii, apply)
+    apply(knob.value)
+    return knob
+
+def count_knob(name, full, resize, fractions=(1.0, 0.75, 0.5, 0.35, 0.25)):
+    # resize(count) adds or removes actors and returns the count it reached
+    values = []
+    for fraction in fractions:
+        count = int(round(full * fraction))
+        if not values or count < values[-1]:
+            values.append(count)
+    return Knob(name, values, resize)
+
+def sensor_rig_knob(actor, sensor_indices, levels, **rig_kwargs):
+    # levels are add_sensor_rig keyword sets, e.g. {'sensor_tick': 0.1} or
+    # {'image_size': (640, 360)}; sensor attributes are fixed at spawn, so a
+    # level change replaces the rig
+    state = {'rig': actor.add_sensor_rig(sensor_indices, **dict(rig_kwargs, **levels[0]))}
+    def apply(level):
+        rig = state['rig']
+        stale = set(sensor.id for sensor in rig.sensor_actors)
+        rig.destroy()
+        actor.sensor_rigs.remove(rig)
+        actor.sensors_list = [s for s in actor.sensors_list if s.id not in stale]
+        state['rig'] = actor.add_sensor_rig(sensor_indices, **dict(rig_kwargs, **level))
+    knob = Knob('sensor_rig', levels, apply)
+    knob.rig = lambda: state['rig']
+    return knob
+
+class LoadGovernor(object):
+    # keeps the achieved server tick rate inside [target * (1 - tolerance),
+    # target * (1 + tolerance)]: below it the first knob that can still give
+    # something up degrades one level, above it the last degraded knob is
+    # restored one level. After each decision it waits `cooldown` seconds
+    # and a fresh `window` of ticks before judging again.
+    def __init__(self, target_fps, tolerance=0.1, window=2.0, cooldown=3.0, log_path=None):
+        self.target_fps = target_fps
+        self.low = target_fps * (1.0 - tolerance)
+        self.high = target_fps * (1.0 + tolerance)
+        self.window = window
+        self.cooldown = cooldown
+        self.log_path = log_path
+        self.knobs = []
+        self.decisions = []
+        self._samples = deque()
+        self._last_decision = None
+
+    def add_knob(self, knob):
+        self.knobs.append(knob)
+        return knob
+
+    def observe(self, frame, now=None):
+        # call once per tick with the frame id from world.tick() or the
+        # snapshot of world.wait_for_tick()
+        now = time.time() if now is None else now
+        samples = self._samples
+        samples.append((now, frame))
+        while len(samples) > 2 and now - samples[0][0] > self.window:
+            samples.popleft()
+
+    def observe_snapshot(self, snapshot):
+        self.observe(snapshot.frame, snapshot.timestamp.platform_timestamp)
+
+    def fps(self):
+        if len(self._samples) < 2:
+            return None
+        (t0, f0), (t1, f1) = self._samples[0], self._samples[-1]
+        return (f1 - f0) / (t1 - t0) if t1 > t0 else None
+
+    def update(self, now=None):
+        # judged on the clock the samples carry, so the cooldown compares
+        # like with like whether they came from time.time() or the server's
+        # platform_timestamp
+        if now is None:
+            if not self._samples:
+                return None
+            now = self._samples[-1][0]
+        if self._last_decision is not None and now - self._last_decision < self.cooldown:
+            return None
+        if len(self._samples) < 2 or self._samples[-1][0] - self._samples[0][0] < 0.8 * self.window:
+            return None
+        fps = self.fps()
+        if fps is None or self.low <= fps <= self.high:
+            return None
+        if fps < self.low:
+            knob = next((k for k in self.knobs if k.can_degrade()), None)
+            action, level = 'degrade', (knob.level + 1 if knob else None)
+        else:
+            knob = next((k for k in reversed(self.knobs) if k.can_restore()), None)
+            action, level = 'restore', (knob.level - 1 if knob else None)
+        if knob is None:
+            return None
+        old, new = knob.set_level(level)
+        decision = {'time': now, 'fps': fps, 'band': [self.low, self.high], 'action': action,
+                    'knob': knob.name, 'level': knob.level, 'from': old, 'to': new}
+        self._record(decision)
+        self._last_decision = now
+        self._samples.clear()
+        return decision
+
+    def _record(self, decision):
+        self.decisions.append(decision)
+        logging.info('governor: %.1f fps outside %.1f-%.1f, %s %s %s -> %s' % (
+            decision['fps'], self.low, self.high, decision['action'], decision['knob'], decision['from'], decision['to']))
+        if self.log_path is not None:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(decision) + '\n')
+
+    def state(self):
+        return dict((knob.name, knob.value) for knob in self.knobs)
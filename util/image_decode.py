@@ -0,0 +1,126 @@
+import numpy as np
+
+# sensor.camera.depth packs normalized depth over 1000 m into 24 bits,
+# R + G * 256 + B * 256 ** 2; sensor.camera.semantic_segmentation puts the
+# class id in R. Buffers are BGRA, so R is channel 2 and B channel 0.
+FAR_PLANE = 1000.0
+DEPTH_SCALE = FAR_PLANE / (256.0 ** 3 - 1.0)
+LOG_DEPTH_RANGE = 5.70378
+
+# RGB by class id, as in CARLA's CityScapesPalette converter
+CITYSCAPES_PALETTE = (
+    (0, 0, 0),        # unlabeled
+    (70, 70, 70),     # building
+    (100, 40, 40),    # fence
+    (55, 90, 80),     # other
+    (220, 20, 60),    # pedestrian
+    (153, 153, 153),  # pole
+    (157, 234, 50),   # road line
+    (128, 64, 128),   # road
+    (244, 35, 232),   # sidewalk
+    (107, 142, 35),   # vegetation
+    (0, 0, 142),      # vehicle
+    (102, 102, 156),  # wall
+    (220, 220, 0),    # traffic sign
+    (70, 130, 180),   # sky
+    (81, 0, 81),      # ground
+    (150, 100, 100),  # bridge
+    (230, 150, 140),  # rail track
+    (180, 165, 180),  # guard rail
+    (250, 170, 30),   # traffic light
+    (110, 190, 160),  # static
+    (170, 120, 50),   # dynamic
+    (45, 60, 150),    # water
+    (145, 170, 100))  # terrain
+
+PALETTES = {'cityscapes': CITYSCAPES_PALETTE}
+_luts = {}
+
+def bgra_from_buffer(buffer, width, height):
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+
+def bgra(image):
+    return bgra_from_buffer(image.raw_data, image.width, image.height)
+
+def _out(out, shape, dtype):
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape or out.dtype != dtype:
+        raise ValueError('out array is %s %s, expected %s %s' % (out.dtype, out.shape, np.dtype(dtype), shape))
+    return out
+
+def depth_from_bgra(pixels, out=None):
+    # float32 holds every 24-bit value exactly, so the sum is accumulated
+    # in the output array itself without wider temporaries
+    out = _out(out, pixels.shape[:2], np.float32)
+    np.multiply(pixels[:, :, 0], np.float32(256.0), out=out)
+    np.add(out, pixels[:, :, 1], out=out)
+    np.multiply(out, np.float32(256.0), out=out)
+    np.add(out, pixels[:, :, 2], out=out)
+    np.multiply(out, np.float32(DEPTH_SCALE), out=out)
+    return out
+
+def decode_depth(image, out=None):
+    # metric depth in metres as (height, width) float32
+    return depth_from_bgra(bgra(image), out)
+
+def labels_from_bgra(pixels, out=None):
+    out = _out(out, pixels.shape[:2], np.uint8)
+    np.copyto(out, pixels[:, :, 2])
+    return out
+
+def decode_labels(image, out=None):
+    # semantic class ids as (height, width) uint8
+    return labels_from_bgra(bgra(image), out)
+
+def palette_lut(name='cityscapes'):
+    # 256 entries of packed BGRA, so colorizing is a single take()
+    lut = _luts.get(name)
+    if lut is None:
+        colors = np.zeros((256, 4), dtype=np.uint8)
+        colors[:, 3] = 255
+        palette = np.array(PALETTES[name], dtype=np.uint8)
+        colors[:len(palette), :3] = palette[:, ::-1]
+        lut = _luts[name] = colors.view(np.uint32).reshape(256)
+    return lut
+
+def colorize_labels(labels, out=None, palette='cityscapes'):
+    # BGRA (height, width, 4) uint8, ready for util.display.FrameSurface
+    out = _out(out, labels.shape + (4,), np.uint8)
+    np.take(palette_lut(palette), labels, out=out.view(np.uint32).reshape(labels.shape))
+    return out
+
+def depth_to_gray(depth, out=None, logarithmic=False, scratch=None):
+    # the same mapping as ColorConverter.Depth / LogarithmicDepth, to BGRA;
+    # scratch is a float32 array shaped like depth for the intermediate
+    # values, and may be depth itself when depth is not needed afterwards
+    out = _out(out, depth.shape + (4,), np.uint8)
+    normalized = _out(scratch, depth.shape, np.float32)
+    np.multiply(depth, np.float32(1.0 / FAR_PLANE), out=normalized)
+    if logarithmic:
+        np.maximum(normalized, np.float32(1e-6), out=normalized)
+        np.log(normalized, out=normalized)
+        np.multiply(normalized, np.float32(1.0 / LOG_DEPTH_RANGE), out=normalized)
+        np.add(normalized, np.float32(1.0), out=normalized)
+        np.clip(normalized, 0.0, 1.0, out=normalized)
+    np.multiply(normalized, np.float32(255.0), out=normalized)
+    # the unsafe cast truncates like astype(np.uint8), without the copy
+    np.copyto(out[:, :, 0], normalized, casting='unsafe')
+    out[:, :, 1] = out[:, :, 0]
+    out[:, :, 2] = out[:, :, 0]
+    out[:, :, 3] = 255
+    return out
+
+VISUALIZATIONS = ('depth', 'logarithmic_depth', 'cityscapes')
+
+def visualize(image, kind, out=None, scratch=None):
+    # client-side replacement for image.convert(); the image is not modified.
+    # scratch is a (height, width) float32 array kept across frames for the
+    # depth views, so only out is written per frame
+    pixels = bgra(image)
+    if kind in ('depth', 'logarithmic_depth'):
+        depth = depth_from_bgra(pixels, scratch)
+        return depth_to_gray(depth, out, kind == 'logarithmic_depth', scratch=depth)
+    if kind == 'cityscapes':
+        return colorize_labels(pixels[:, :, 2], out)
+    raise ValueError('visualization %r not in %r' % (kind, VISUALIZATIONS))
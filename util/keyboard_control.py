@@ -41,9 +41,14 @@ except ImportError:
 class KeyboardControl(object):
     def __init__(self):
         self.show_weather_info = True        
+        self.show_perf_hud = False
     
     def toggle_all_info(self):
         self.show_weather_info = not self.show_weather_info
+        self.show_perf_hud = self.show_weather_info
+    
+    def toggle_perf_hud(self):
+        self.show_perf_hud = not self.show_perf_hud
     
     def toggle_weather_info(self):
         self.show_weather_info = not self.show_weather_info    
@@ -63,4 +68,6 @@ class KeyboardControl(object):
                     self.toggle_weather_info()
                     world.show_weather_info = self.show_weather_info
                 elif event.key == K_i and (pygame.key.get_mods() & KMOD_CTRL):
-                    self.toggle_all_info()                
\ No newline at end of file
+                    self.toggle_all_info()
+                elif event.key == K_p and (pygame.key.get_mods() & KMOD_CTRL):
+                    self.toggle_perf_hud()                
\ No newline at end of file
@@ -0,0 +1,78 @@
+import numpy as np
+
+# sensor.lidar.ray_cast delivers packed float32 (x, y, z, intensity) in the
+# sensor frame: x forward, y right, z up.
+POINT_FIELDS = 4
+
+def decode(measurement):
+    return points_from_buffer(measurement.raw_data)
+
+def points_from_buffer(buffer):
+    return np.frombuffer(buffer, dtype=np.float32).reshape(-1, POINT_FIELDS)
+
+def range_mask(points, max_range, min_range=0.0):
+    xyz = points[:, :3]
+    distance = np.einsum('ij,ij->i', xyz, xyz)
+    return (distance <= max_range * max_range) & (distance >= min_range * min_range)
+
+def roi_mask(points, x_range=None, y_range=None, z_range=None):
+    mask = np.ones(len(points), dtype=bool)
+    for axis, bounds in enumerate((x_range, y_range, z_range)):
+        if bounds is not None:
+            column = points[:, axis]
+            mask &= (column >= bounds[0]) & (column < bounds[1])
+    return mask
+
+def crop(points, max_range=None, min_range=0.0, x_range=None, y_range=None, z_range=None):
+    mask = roi_mask(points, x_range, y_range, z_range)
+    if max_range is not None:
+        mask &= range_mask(points, max_range, min_range)
+    return points[mask]
+
+def voxel_downsample(points, voxel_size):
+    if len(points) == 0:
+        return points[:0].copy()
+    voxels = np.floor(points[:, :3] / voxel_size).astype(np.int64)
+    voxels -= voxels.min(axis=0)
+    extent = voxels.max(axis=0) + 1
+    keys = (voxels[:, 0] * extent[1] + voxels[:, 1]) * extent[2] + voxels[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    out = np.empty((len(counts), points.shape[1]), dtype=np.float32)
+    for column in range(points.shape[1]):
+        out[:, column] = np.bincount(inverse, weights=points[:, column], minlength=len(counts)) / counts
+    return out
+
+class BirdsEyeView(object):
+    def __init__(self, x_range=(-50.0, 50.0), y_range=(-50.0, 50.0), resolution=0.2, z_range=(-3.0, 5.0)):
+        self.x_range = x_range
+        self.y_range = y_range
+        self.z_range = z_range
+        self.resolution = resolution
+        self.rows = int(round((x_range[1] - x_range[0]) / resolution))
+        self.cols = int(round((y_range[1] - y_range[0]) / resolution))
+        self.density = np.zeros((self.rows, self.cols), dtype=np.uint16)
+        self.occupancy = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        self.height = np.zeros((self.rows, self.cols), dtype=np.float32)
+
+    def cells(self, points):
+        points = points[roi_mask(points, self.x_range, self.y_range, self.z_range)]
+        # forward is up in the raster, right is right
+        rows = ((self.x_range[1] - points[:, 0]) / self.resolution).astype(np.intp)
+        cols = ((points[:, 1] - self.y_range[0]) / self.resolution).astype(np.intp)
+        np.clip(rows, 0, self.rows - 1, out=rows)
+        np.clip(cols, 0, self.cols - 1, out=cols)
+        return rows * self.cols + cols, points
+
+    def rasterize(self, points):
+        flat, points = self.cells(points)
+        size = self.rows * self.cols
+        counts = np.bincount(flat, minlength=size)
+        np.minimum(counts, np.iinfo(self.density.dtype).max, out=counts)
+        self.density.reshape(-1)[:] = counts
+        np.greater(self.density, 0, out=self.occupancy, casting='unsafe')
+        height = self.height.reshape(-1)
+        height.fill(self.z_range[0])
+        np.maximum.at(height, flat, points[:, 2])
+        self.height[self.occupancy == 0] = 0.0
+        return self.occupancy, self.height
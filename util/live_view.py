@@ -0,0 +1,259 @@
+import io
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+BOUNDARY = 'carlaframe'
+
+PAGE = b'''<!DOCTYPE html>
+<html><head><title>live view</title></head>
+<body style="margin:0;background:#000"><img src="/stream" style="width:100%"></body></html>
+'''
+
+def jpeg_encoder(quality=75):
+    # Pillow or OpenCV when installed, otherwise pygame (always a dependency
+    # here, but it does not take a quality setting)
+    if PILImage is not None:
+        def encode(bgr):
+            out = io.BytesIO()
+            PILImage.fromarray(np.ascontiguousarray(bgr[:, :, ::-1])).save(out, 'JPEG', quality=quality)
+            return out.getvalue()
+        return 'pillow', encode
+    if cv2 is not None:
+        def encode(bgr):
+            ok, data = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            return data.tobytes()
+        return 'opencv', encode
+    import pygame
+    def encode(bgr):
+        rgb = np.ascontiguousarray(bgr[:, :, ::-1])
+        out = io.BytesIO()
+        pygame.image.save(pygame.image.frombuffer(rgb.tobytes(), (rgb.shape[1], rgb.shape[0]), 'RGB'), out, 'frame.jpg')
+        return out.getvalue()
+    return 'pygame', encode
+
+class LiveView(object):
+    # frames offered from the sensor callback are downscaled and JPEG-encoded
+    # by a small worker pool; only the newest pending frame is kept, and each
+    # encoded frame is shared by every connected viewer
+    def __init__(self, port=8080, host='127.0.0.1', scale=2, quality=75, workers=2, max_fps=10.0):
+        self.host = host
+        self.port = port
+        self.scale = scale
+        if not max_fps > 0:
+            raise ValueError('max_fps must be positive, got %r' % (max_fps,))
+        self.max_fps = max_fps
+        self.encoder_name, self._encode = jpeg_encoder(quality)
+        self.clients = 0
+        self.offered = 0
+        self.encoded = 0
+        self.dropped = 0
+        self.sent = 0
+        self.encode_time = 0.0
+        self.jpeg = None
+        self.frame = None
+        self._seq = 0
+        self._published_seq = 0
+        self._pending = None
+        self._running = False
+        self._lock = threading.Condition()
+        self._workers = [threading.Thread(target=self._encode_loop, name='live-view-encoder-%d' % i, daemon=True)
+                         for i in range(workers)]
+        self._server = None
+        self._server_thread = None
+
+    def start(self):
+        view = self
+        class Handler(LiveViewHandler):
+            live_view = view
+        self._running = True
+        for worker in self._workers:
+            worker.start()
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever, name='live-view-http', daemon=True)
+        self._server_thread.start()
+        logging.info('live view on http://%s:%d/ (%s encoder)' % (self.host, self.port, self.encoder_name))
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._lock.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join(timeout=2.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def offer(self, frame, buffer, width, height):
+        # called on the sensor thread: with no viewer this is a counter bump,
+        # otherwise one strided copy of the downscaled frame
+        self.offered += 1
+        if not self.clients:
+            return
+        bgra = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+        small = np.ascontiguousarray(bgra[::self.scale, ::self.scale, :3])
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+            self._seq += 1
+            self._pending = (self._seq, frame, small)
+            self._lock.notify_all()
+
+    def _encode_loop(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                seq, frame, small = self._pending
+                self._pending = None
+            started = time.perf_counter()
+            try:
+                data = self._encode(small)
+            except Exception:
+                logging.exception('live view encoding failed')
+                continue
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.encode_time += elapsed
+                self.encoded += 1
+                # a slower worker finishing an older frame does not win
+                if seq > self._published_seq:
+                    self._published_seq = seq
+                    self.jpeg = data
+                    self.frame = frame
+                    self._lock.notify_all()
+
+    def _next_jpeg(self, after_seq, timeout):
+        with self._lock:
+            self._lock.wait_for(lambda: self._published_seq > after_seq or not self._running, timeout)
+            if not self._running or self._published_seq <= after_seq:
+                return after_seq, None
+            return self._published_seq, self.jpeg
+
+    def _attach(self, delta):
+        with self._lock:
+            self.clients += delta
+
+    def stats(self):
+        with self._lock:
+            return {
+                'encoder': self.encoder_name,
+                'clients': self.clients,
+                'offered': self.offered,
+                'encoded': self.encoded,
+                'dropped': self.dropped,
+                'sent': self.sent,
+                'mean_encode_ms': 1000.0 * self.encode_time / self.encoded if self.encoded else 0.0}
+
+class LiveViewHandler(BaseHTTPRequestHandler):
+    live_view = None
+
+    def log_message(self, format, *args):
+        logging.debug('live view: ' + format % args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/':
+            self._send(200, 'text/html', PAGE)
+        elif url.path == '/stream':
+            fps = self._fps(parse_qs(url.query).get('fps', [None])[0])
+            if fps is None:
+                self._send(400, 'text/plain', b'fps must be a positive number\n')
+            else:
+                self._stream(fps)
+        elif url.path == '/snapshot.jpg':
+            self._snapshot()
+        elif url.path == '/stats':
+            self._send(200, 'application/json', json.dumps(self.live_view.stats()).encode())
+        else:
+            self._send(404, 'text/plain', b'not found\n')
+
+    def _fps(self, text):
+        # the requested rate clamped to (0, max_fps], None when it is not a
+        # positive number; 0 or less must not lift the cap
+        if not text:
+            return self.live_view.max_fps
+        try:
+            fps = float(text)
+        except ValueError:
+            return None
+        if not fps > 0:
+            return None
+        return min(fps, self.live_view.max_fps)
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _snapshot(self):
+        view = self.live_view
+        view._attach(1)
+        try:
+            _, jpeg = view._next_jpeg(0, 2.0)
+        finally:
+            view._attach(-1)
+        if jpeg is None:
+            self._send(503, 'text/plain', b'no frame yet\n')
+        else:
+            self._send(200, 'image/jpeg', jpeg)
+
+    def _stream(self, fps):
+        view = self.live_view
+        interval = 1.0 / fps
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=%s' % BOUNDARY)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        view._attach(1)
+        seq = 0
+        next_send = 0.0
+        try:
+            while view._running:
+                # per-client cap: frames published in between are skipped
+                delay = next_send - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                seq, jpeg = view._next_jpeg(seq, 1.0)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % (
+                    BOUNDARY.encode(), len(jpeg)))
+                self.wfile.write(jpeg)
+                self.wfile.write(b'\r\n')
+                with view._lock:
+                    view.sent += 1
+                next_send = time.time() + interval
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            view._attach(-1)
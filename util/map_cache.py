@@ -0,0 +1,84 @@
+import os
+import io
+import re
+import json
+import hashlib
+import logging
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'carla-client')
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with io.open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def params_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+class MapCache(object):
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.xodr_dir = os.path.join(self.directory, 'xodr')
+        self.worlds_path = os.path.join(self.directory, 'worlds.json')
+        self.catalog_dir = os.path.join(self.directory, 'catalog')
+
+    def _xodr_path(self, key):
+        return os.path.join(self.xodr_dir, key + '.xodr')
+
+    def get_xodr(self, key):
+        path = self._xodr_path(key)
+        if not os.path.exists(path):
+            return None
+        with io.open(path, mode='r', encoding='utf-8') as f:
+            return f.read()
+
+    def put_xodr(self, key, data):
+        os.makedirs(self.xodr_dir, exist_ok=True)
+        path = self._xodr_path(key)
+        tmp = path + '.tmp'
+        with io.open(tmp, mode='w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _load_worlds(self):
+        try:
+            with io.open(self.worlds_path, mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def generated_world(self, endpoint):
+        return self._load_worlds().get(endpoint)
+
+    def set_generated_world(self, endpoint, key, xodr_digest):
+        worlds = self._load_worlds()
+        worlds[endpoint] = {'key': key, 'xodr': xodr_digest}
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.worlds_path + '.tmp'
+        with io.open(tmp, mode='w', encoding='utf-8') as f:
+            json.dump(worlds, f, indent=2)
+        os.replace(tmp, self.worlds_path)
+        logging.debug('recorded generated world %s for %s' % (key[:12], endpoint))
+
+    def _catalog_path(self, version):
+        return os.path.join(self.catalog_dir, re.sub(r'[^A-Za-z0-9._-]', '_', version) + '.json')
+
+    def get_catalog(self, version):
+        try:
+            with io.open(self._catalog_path(version), mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_catalog(self, version, catalog):
+        os.makedirs(self.catalog_dir, exist_ok=True)
+        path = self._catalog_path(version)
+        tmp = path + '.tmp'
+        with io.open(tmp, mode='w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(tmp, path)
@@ -0,0 +1,92 @@
+import os
+import hashlib
+import logging
+import numpy as np
+from util.map_cache import DEFAULT_CACHE_DIR
+
+import util.carla_path
+import carla
+
+class NavigationPool(object):
+    # size prefetches that many locations; by default a cold pool only
+    # queries navigation for what take() and sample() actually need
+    def __init__(self, world, size=0, cache_dir=None, seed=None):
+        self.world = world
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        # generated OpenDRIVE / OSM worlds share a map name, so the cache is
+        # keyed on the spawn points too, as SpawnPlanner does
+        carla_map = world.get_map()
+        positions = np.array([[t.location.x, t.location.y, t.location.z] for t in carla_map.get_spawn_points()],
+                             dtype=np.float64).reshape(-1, 3)
+        self.cache_path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'navigation', '%s-%s.npy' % (
+            carla_map.name.split('/')[-1], hashlib.sha256(np.round(positions, 2).tobytes()).hexdigest()[:16]))
+        self.locations = np.zeros((0, 3), dtype=np.float32)
+        if os.path.exists(self.cache_path):
+            self.locations = np.load(self.cache_path)
+            logging.debug('loaded %d navigation locations from %s' % (len(self.locations), self.cache_path))
+        self._order = self.rng.permutation(len(self.locations))
+        self._cursor = 0
+        self.refill(size)
+
+    def refill(self, size):
+        missing = size - len(self.locations)
+        if missing <= 0:
+            return 0
+        drawn = []
+        for _ in range(missing):
+            location = self.world.get_random_location_from_navigation()
+            if location is not None:
+                drawn.append((location.x, location.y, location.z))
+        if drawn:
+            self.locations = np.concatenate([self.locations, np.array(drawn, dtype=np.float32)])
+            self._order = np.concatenate([self._order[self._cursor:],
+                                          len(self.locations) - len(drawn) + self.rng.permutation(len(drawn))])
+            self._cursor = 0
+            self.save()
+        return len(drawn)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.save(self.cache_path, self.locations)
+
+    @staticmethod
+    def _location(row):
+        return carla.Location(x=float(row[0]), y=float(row[1]), z=float(row[2]))
+
+    def take(self, count, attempts=3):
+        # distinct locations, e.g. for spawning; a location is never handed
+        # out twice, so the pool grows when it runs out. Maps with little or
+        # no navmesh give fewer locations than asked for
+        for _ in range(attempts):
+            available = len(self._order) - self._cursor
+            if available >= count:
+                break
+            self.refill(len(self.locations) + count - available)
+        available = len(self._order) - self._cursor
+        if available < count:
+            logging.warning('navigation gave %d of %d new locations' % (available, count))
+        picked = self._order[self._cursor:self._cursor + count]
+        self._cursor += len(picked)
+        return [self._location(self.locations[i]) for i in picked]
+
+    def sample(self, count):
+        # locations with replacement, e.g. for walk targets; only an empty or
+        # smaller pool queries navigation
+        if len(self.locations) < count:
+            self.refill(count)
+        if len(self.locations) == 0:
+            return []
+        return [self._location(self.locations[i]) for i in self.rng.integers(0, len(self.locations), count)]
+
+def start_walker_controllers(world, controllers, speeds, pool, cross_factor=None):
+    # every target comes from the pool, so no per-walker navigation query
+    # is made; start, go_to_location and set_max_speed have no batch
+    # command and stay three calls per controller
+    if cross_factor is not None:
+        world.set_pedestrians_cross_factor(cross_factor)
+    targets = pool.sample(len(controllers))
+    for controller, target, speed in zip(controllers, targets, speeds):
+        controller.start()
+        controller.go_to_location(target)
+        controller.set_max_speed(float(speed))
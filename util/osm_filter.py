@@ -0,0 +1,102 @@
+import io
+import logging
+import xml.etree.ElementTree as ET
+
+def parse_bbox(text):
+    values = [float(x) for x in text.split(',')]
+    if len(values) != 4:
+        raise ValueError('bounding box must be MIN_LON,MIN_LAT,MAX_LON,MAX_LAT, got %r' % text)
+    min_lon, min_lat, max_lon, max_lat = values
+    if min_lon >= max_lon or min_lat >= max_lat:
+        raise ValueError('empty bounding box %r' % text)
+    return tuple(values)
+
+def parse_highways(text):
+    return tuple(sorted(set(x.strip() for x in text.split(',') if x.strip())))
+
+class Region(object):
+    def __init__(self, bbox=None, polygon=None):
+        # polygon is a sequence of (lon, lat) vertices
+        self.polygon = list(polygon) if polygon is not None else None
+        if bbox is None and self.polygon is not None:
+            lons = [p[0] for p in self.polygon]
+            lats = [p[1] for p in self.polygon]
+            bbox = (min(lons), min(lats), max(lons), max(lats))
+        self.bbox = bbox
+
+    def contains(self, lon, lat):
+        if self.bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            if lon < min_lon or lon > max_lon or lat < min_lat or lat > max_lat:
+                return False
+        if self.polygon is None:
+            return True
+        inside = False
+        j = len(self.polygon) - 1
+        for i in range(len(self.polygon)):
+            xi, yi = self.polygon[i]
+            xj, yj = self.polygon[j]
+            if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+def _elements(path):
+    # yields top-level children of <osm> and drops them afterwards, so memory
+    # stays bounded by one element rather than the whole extract
+    context = ET.iterparse(path, events=('start', 'end'))
+    root = None
+    depth = 0
+    for event, elem in context:
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield elem
+            root.clear()
+
+def _highway(way):
+    for tag in way.iter('tag'):
+        if tag.get('k') == 'highway':
+            return tag.get('v')
+    return None
+
+def filter_osm(path, bbox=None, highways=None, polygon=None):
+    region = Region(bbox, polygon)
+    highways = set(highways) if highways else None
+    inside = set()
+    referenced = set()
+    ways = set()
+    # first pass: which ways survive and which nodes they need
+    for elem in _elements(path):
+        if elem.tag == 'node':
+            if region.contains(float(elem.get('lon')), float(elem.get('lat'))):
+                inside.add(elem.get('id'))
+        elif elem.tag == 'way':
+            highway = _highway(elem)
+            if highway is None or (highways is not None and highway not in highways):
+                continue
+            refs = [nd.get('ref') for nd in elem.iter('nd')]
+            if any(ref in inside for ref in refs):
+                ways.add(elem.get('id'))
+                referenced.update(refs)
+    inside = None
+    # second pass: copy only those nodes and ways
+    out = io.StringIO()
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="carla-client osm_filter">\n')
+    if region.bbox is not None:
+        out.write('<bounds minlon="%r" minlat="%r" maxlon="%r" maxlat="%r"/>\n' % region.bbox)
+    nodes = 0
+    for elem in _elements(path):
+        if elem.tag == 'node' and elem.get('id') in referenced:
+            nodes += 1
+        elif not (elem.tag == 'way' and elem.get('id') in ways):
+            continue
+        elem.tail = '\n'
+        out.write(ET.tostring(elem, encoding='unicode'))
+    out.write('</osm>\n')
+    logging.info('osm filter kept %d nodes and %d ways' % (nodes, len(ways)))
+    return out.getvalue()
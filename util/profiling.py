@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+# bucket edges in milliseconds for the exported histograms
+EXPORT_EDGES_MS = (0.0, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 33.0, 66.0, 100.0, 250.0, 1000.0, float('inf'))
+
+class RollingHistogram(object):
+    # the last `size` samples in a preallocated ring; adding one is a list
+    # store, summaries are only computed when the HUD or the exporter asks
+    def __init__(self, size=512, scale=1000.0, unit='ms'):
+        self.size = size
+        self.scale = scale
+        self.unit = unit
+        self.count = 0
+        self._samples = [0.0] * size
+        self._next = 0
+
+    def add(self, value):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self.count += 1
+
+    def values(self):
+        samples = self._samples if self.count >= self.size else self._samples[:self.count]
+        return np.array(samples, dtype=np.float64) * self.scale
+
+    def summary(self):
+        values = self.values()
+        if values.size == 0:
+            return {'count': 0, 'unit': self.unit}
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        return {'count': self.count, 'window': int(values.size), 'unit': self.unit,
+                'mean': float(values.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                'max': float(values.max())}
+
+    def buckets(self, edges=EXPORT_EDGES_MS):
+        return np.histogram(self.values(), edges)[0].tolist()
+
+class StageProfiler(object):
+    def __init__(self, window=512, export_path=None, export_interval=5.0):
+        self.window = window
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.histograms = OrderedDict()
+        self.latest_frame = None
+        self.latest_elapsed = None
+        self.exports = 0
+        self._lock = threading.Lock()
+        self._world = None
+        self._callback_id = None
+        self._last_export = time.time()
+
+    def histogram(self, name, scale=1000.0, unit='ms'):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, RollingHistogram(self.window, scale, unit))
+        return histogram
+
+    def record(self, name, seconds):
+        self.histogram(name).add(seconds)
+
+    def lap(self, name, started):
+        # records the time since `started` and returns now, so consecutive
+        # stages can be chained: t = profiler.lap('render', t)
+        now = time.perf_counter()
+        self.histogram(name).add(now - started)
+        return now
+
+    def watch(self, carla_world):
+        # the latest simulation frame is what a shown image is compared with
+        if self._callback_id is None:
+            weak_self = weakref.ref(self)
+            self._world = carla_world
+            self._callback_id = carla_world.on_tick(lambda snapshot: StageProfiler._on_tick(weak_self, snapshot))
+
+    def unwatch(self):
+        if self._callback_id is not None:
+            self._world.remove_on_tick(self._callback_id)
+            self._callback_id = None
+            self._world = None
+
+    @staticmethod
+    def _on_tick(weak_self, snapshot):
+        self = weak_self()
+        if not self:
+            return
+        self.latest_frame = snapshot.frame
+        self.latest_elapsed = snapshot.timestamp.elapsed_seconds
+
+    def frame_shown(self, frame, timestamp, received_at, shown_at=None):
+        # received_at is the perf_counter() time the sensor callback handed
+        # the image over; frame and timestamp are the image's own
+        shown_at = time.perf_counter() if shown_at is None else shown_at
+        if received_at is not None:
+            self.histogram('sensor_to_display').add(shown_at - received_at)
+        if frame is not None and self.latest_frame is not None:
+            self.histogram('frame_lag', 1.0, 'frames').add(max(0, self.latest_frame - frame))
+        if timestamp is not None and self.latest_elapsed is not None:
+            self.histogram('sim_lag').add(max(0.0, self.latest_elapsed - timestamp))
+
+    def summary(self):
+        return OrderedDict((name, histogram.summary()) for name, histogram in list(self.histograms.items()))
+
+    def maybe_export(self, now=None):
+        if self.export_path is None:
+            return False
+        now = time.time() if now is None else now
+        if now - self._last_export < self.export_interval:
+            return False
+        self.export(now)
+        return True
+
+    def export(self, now=None):
+        if self.export_path is None:
+            return
+        now = time.time() if now is None else now
+        self._last_export = now
+        stages = OrderedDict()
+        for name, histogram in list(self.histograms.items()):
+            stats = histogram.summary()
+            if histogram.unit == 'ms' and histogram.count:
+                stats['buckets'] = histogram.buckets()
+            stages[name] = stats
+        record = {'time': now, 'latest_frame': self.latest_frame, 'edges_ms': EXPORT_EDGES_MS[:-1], 'stages': stages}
+        directory = os.path.dirname(self.export_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.export_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.exports += 1
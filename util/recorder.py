@@ -0,0 +1,196 @@
+import os
+import re
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+
+# one fixed-size record per frame in <stream>/index.bin, readable with
+# np.fromfile(path, dtype=INDEX_DTYPE)
+INDEX_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('timestamp', '<f8'),
+    ('chunk', '<u4'),
+    ('offset', '<u8'),
+    ('nbytes', '<u8'),
+    ('width', '<u4'),
+    ('height', '<u4')])
+
+BACKPRESSURE_POLICIES = ('drop', 'block')
+
+class RecorderError(Exception):
+    pass
+
+def stream_name(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+def chunk_path(directory, chunk):
+    return os.path.join(directory, 'chunk_%05d.bin' % chunk)
+
+def load_stream(directory):
+    index = np.fromfile(os.path.join(directory, 'index.bin'), dtype=INDEX_DTYPE)
+    chunks = {}
+    for chunk in np.unique(index['chunk']):
+        chunks[int(chunk)] = np.memmap(chunk_path(directory, chunk), dtype=np.uint8, mode='r')
+    return index, chunks
+
+def read_frame(index, chunks, i):
+    record = index[i]
+    start = int(record['offset'])
+    return chunks[int(record['chunk'])][start:start + int(record['nbytes'])]
+
+class _Stream(object):
+    def __init__(self, directory, chunk_bytes):
+        self.directory = directory
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_file = open(os.path.join(directory, 'index.bin'), 'ab')
+        self.chunk = 0
+        while os.path.exists(chunk_path(directory, self.chunk + 1)):
+            self.chunk += 1
+        self.chunk_file = open(chunk_path(directory, self.chunk), 'ab')
+        self.offset = self.chunk_file.tell()
+        self.record = np.zeros(1, dtype=INDEX_DTYPE)
+
+    def write(self, frame, timestamp, width, height, payload):
+        if self.offset and self.offset + len(payload) > self.chunk_bytes:
+            self.chunk_file.close()
+            self.chunk += 1
+            self.chunk_file = open(chunk_path(self.directory, self.chunk), 'ab')
+            self.offset = 0
+        self.chunk_file.write(payload)
+        self.record[0] = (frame, timestamp, self.chunk, self.offset, len(payload), width, height)
+        self.index_file.write(self.record.tobytes())
+        self.offset += len(payload)
+
+    def flush(self):
+        self.chunk_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.chunk_file.close()
+        self.index_file.close()
+
+class SensorRecorder(object):
+    # policy defaults to 'block' for a synchronous world, where the sensor
+    # callback may hold up the tick but no frame may be lost, and to 'drop'
+    # otherwise; block_timeout=None blocks until there is room
+    def __init__(self, directory, workers=1, max_pending_bytes=512 * 1024 * 1024,
+                 chunk_bytes=1024 * 1024 * 1024, policy=None, block_timeout=None, synchronous=False):
+        if policy is None:
+            policy = 'block' if synchronous else 'drop'
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError('backpressure policy %r not in %r' % (policy, BACKPRESSURE_POLICIES))
+        self.directory = directory
+        self.max_pending_bytes = max_pending_bytes
+        self.chunk_bytes = chunk_bytes
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.recorded = 0
+        self.dropped = {}
+        self.written_bytes = 0
+        self.pending_bytes = 0
+        self.peak_pending_bytes = 0
+        self.error = None
+        self._streams = {}
+        self._assignment = {}
+        self._queues = [deque() for _ in range(workers)]
+        self._cond = threading.Condition()
+        self._running = True
+        self._threads = [threading.Thread(target=self._writer, args=(i,), name='recorder-%d' % i, daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def record(self, name, data):
+        # the sensor buffer is only valid during the callback, so take one copy
+        # here and leave everything else to the writer threads
+        payload = bytes(data.raw_data)
+        size = len(payload)
+        with self._cond:
+            if not self._running:
+                return False
+            if self.error is not None:
+                self.dropped[name] = self.dropped.get(name, 0) + 1
+                return False
+            if self.pending_bytes + size > self.max_pending_bytes:
+                if self.policy == 'block':
+                    self._cond.wait_for(
+                        lambda: self.pending_bytes + size <= self.max_pending_bytes or self.error is not None,
+                        self.block_timeout)
+                if self.pending_bytes + size > self.max_pending_bytes or self.error is not None:
+                    self.dropped[name] = self.dropped.get(name, 0) + 1
+                    return False
+            if name not in self._assignment:
+                self._assignment[name] = len(self._assignment) % len(self._queues)
+            self._queues[self._assignment[name]].append((
+                name, data.frame, data.timestamp,
+                getattr(data, 'width', 0), getattr(data, 'height', 0), payload))
+            self.pending_bytes += size
+            self.peak_pending_bytes = max(self.peak_pending_bytes, self.pending_bytes)
+            self.recorded += 1
+            self._cond.notify_all()
+        return True
+
+    def _stream(self, name):
+        stream = self._streams.get(name)
+        if stream is None:
+            stream = _Stream(os.path.join(self.directory, stream_name(name)), self.chunk_bytes)
+            self._streams[name] = stream
+        return stream
+
+    def _writer(self, worker):
+        queue = self._queues[worker]
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: queue or not self._running)
+                if not queue:
+                    break
+                name, frame, timestamp, width, height, payload = queue.popleft()
+                failed = self.error is not None
+            if not failed:
+                try:
+                    self._stream(name).write(frame, timestamp, width, height, payload)
+                except Exception as error:
+                    logging.exception('recorder could not write %r' % name)
+                    failed = True
+                    with self._cond:
+                        if self.error is None:
+                            self.error = error
+            with self._cond:
+                # after an error the queued frames are discarded as dropped,
+                # so blocked callbacks and close() do not wait forever
+                self.pending_bytes -= len(payload)
+                if failed:
+                    self.dropped[name] = self.dropped.get(name, 0) + 1
+                else:
+                    self.written_bytes += len(payload)
+                self._cond.notify_all()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RecorderError('recording failed: %s' % self.error) from self.error
+
+    def stats(self):
+        with self._cond:
+            self._raise_error()
+            return {
+                'recorded': self.recorded,
+                'dropped': dict(self.dropped),
+                'pending_bytes': self.pending_bytes,
+                'peak_pending_bytes': self.peak_pending_bytes,
+                'written_bytes': self.written_bytes}
+
+    def close(self):
+        started = time.time()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        for stream in self._streams.values():
+            stream.close()
+        logging.info('recorder flushed %d frames (%d dropped) in %.2f seconds' % (
+            self.recorded, sum(self.dropped.values()), time.time() - started))
+        self._raise_error()
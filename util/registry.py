@@ -0,0 +1,149 @@
+import logging
+import signal
+import threading
+import time
+
+import util.carla_path
+import carla
+
+DestroyActor = carla.command.DestroyActor
+
+class ActorRegistry(object):
+    def __init__(self, client):
+        self.client = client
+        self.wrappers = []
+        self.sensors = []
+        self.controllers = []
+        self.actors = []
+        self.actor_ids = []
+        self.last_teardown = None
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._previous_handlers = {}
+
+    def add_hook(self, hook):
+        # called at the start of every teardown, e.g. to stop tick callbacks
+        self.hooks.append(hook)
+
+    def add_wrapper(self, wrapper):
+        # util.actor.Actor; its sensors_list is read at teardown time so
+        # sensors attached later are included
+        self.wrappers.append(wrapper)
+
+    def add_sensor(self, sensor):
+        self.sensors.append(sensor)
+
+    def add_controller(self, controller):
+        self.controllers.append(controller)
+
+    def add_actor(self, actor):
+        self.actors.append(actor)
+
+    def add_ids(self, actor_ids):
+        self.actor_ids.extend(actor_ids)
+
+    def discard(self, actor_ids):
+        # for actors destroyed before teardown, e.g. by the load governor
+        gone = set(actor_ids)
+        self.actor_ids = [x for x in self.actor_ids if x not in gone]
+        self.controllers = [c for c in self.controllers if c.id not in gone]
+        self.actors = [a for a in self.actors if a.id not in gone]
+        self.sensors = [s for s in self.sensors if s.id not in gone]
+
+    def __len__(self):
+        return len(self._collect()[2])
+
+    def ids(self):
+        return self._collect()[2]
+
+    def _collect(self):
+        sensors = list(self.sensors)
+        actors = list(self.actors)
+        for wrapper in self.wrappers:
+            sensors.extend(wrapper.sensors_list)
+            if wrapper.actor is not None:
+                actors.append(wrapper.actor)
+        # children go first so nothing is destroyed under an attached sensor
+        ids = []
+        seen = set()
+        for actor_id in [a.id for a in sensors] + [a.id for a in self.controllers] + list(self.actor_ids) + [a.id for a in actors]:
+            if actor_id not in seen:
+                seen.add(actor_id)
+                ids.append(actor_id)
+        return sensors, list(self.controllers), ids
+
+    def teardown(self):
+        with self._lock:
+            started = time.time()
+            for hook in self.hooks:
+                try:
+                    hook()
+                except Exception:
+                    logging.exception('teardown hook failed')
+            sensors, controllers, ids = self._collect()
+            stopped = 0
+            for sensor in sensors:
+                try:
+                    if sensor.is_listening:
+                        sensor.stop()
+                        stopped += 1
+                except RuntimeError as error:
+                    logging.warning('could not stop sensor %d: %s' % (sensor.id, error))
+            for controller in controllers:
+                try:
+                    controller.stop()
+                    stopped += 1
+                except RuntimeError as error:
+                    logging.warning('could not stop controller %d: %s' % (controller.id, error))
+            errors = 0
+            if ids:
+                for response in self.client.apply_batch_sync([DestroyActor(x) for x in ids]):
+                    if response.error:
+                        errors += 1
+                        logging.debug(response.error)
+            self.wrappers = []
+            self.sensors = []
+            self.controllers = []
+            self.actors = []
+            self.actor_ids = []
+            elapsed = time.time() - started
+            self.last_teardown = {'stopped': stopped, 'destroyed': len(ids) - errors, 'errors': errors, 'seconds': elapsed}
+            if ids:
+                logging.info('destroyed %d actors (%d stopped, %d errors) in %.3f seconds' % (
+                    len(ids) - errors, stopped, errors, elapsed))
+            return self.last_teardown
+
+    def _on_signal(self, signum, frame):
+        raise SystemExit('received signal %d' % signum)
+
+    def install_signal_handlers(self, signals=None):
+        # turn SIGTERM (and SIGHUP) into SystemExit so that finally blocks and
+        # __exit__ run teardown just like they do for Ctrl+C
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if signals is None:
+            signals = [signal.SIGTERM] + ([signal.SIGHUP] if hasattr(signal, 'SIGHUP') else [])
+        for signum in signals:
+            self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+
+    def restore_signal_handlers(self):
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers = {}
+
+    def __enter__(self):
+        self.install_signal_handlers()
+        return self
+
+    def __exit__(self, *exc):
+        # a second Ctrl+C must not interrupt the destroy batch half way
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            self.teardown()
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGINT, previous)
+            self.restore_signal_handlers()
+        return False
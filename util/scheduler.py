@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+import weakref
+
+class ScheduledTask(object):
+    def __init__(self, scheduler, name, callback, period, budget):
+        self.scheduler = scheduler
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.budget = budget
+        self.cancelled = False
+        self.last_run = None
+        self.next_run = None
+        self.runs = 0
+        self.missed = 0
+        self.overruns = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'missed': self.missed,
+            'overruns': self.overruns,
+            'errors': self.errors,
+            'mean_ms': 1000.0 * self.total_time / self.runs if self.runs else 0.0,
+            'max_ms': 1000.0 * self.max_time}
+
+class Scheduler(object):
+    def __init__(self, world):
+        self.world = world
+        self._tasks = []
+        self._lock = threading.Lock()
+        self._dispatching = threading.RLock()
+        self._callback_id = None
+
+    def start(self):
+        if self._callback_id is None:
+            weak_self = weakref.ref(self)
+            self._callback_id = self.world.on_tick(lambda snapshot: Scheduler._on_tick(weak_self, snapshot))
+
+    def stop(self):
+        if self._callback_id is not None:
+            self.world.remove_on_tick(self._callback_id)
+            self._callback_id = None
+        # wait for a dispatch that is already in flight
+        with self._dispatching:
+            with self._lock:
+                for task in self._tasks:
+                    task.cancelled = True
+                self._tasks = []
+
+    def add(self, name, callback, period=0.0, budget=None):
+        task = ScheduledTask(self, name, callback, period, budget)
+        with self._lock:
+            self._tasks.append(task)
+        self.start()
+        return task
+
+    def cancel(self, task):
+        with self._lock:
+            if isinstance(task, str):
+                cancelled = [t for t in self._tasks if t.name == task]
+            else:
+                cancelled = [t for t in self._tasks if t is task]
+            for t in cancelled:
+                t.cancelled = True
+            self._tasks = [t for t in self._tasks if not t.cancelled]
+        return len(cancelled) > 0
+
+    def tasks(self):
+        with self._lock:
+            return list(self._tasks)
+
+    def stats(self):
+        return dict((task.name, task.stats()) for task in self.tasks())
+
+    @staticmethod
+    def _on_tick(weak_self, snapshot):
+        self = weak_self()
+        if not self:
+            return
+        self.dispatch(snapshot.timestamp)
+
+    def dispatch(self, timestamp):
+        now = timestamp.elapsed_seconds
+        with self._dispatching:
+            for task in self.tasks():
+                if task.cancelled:
+                    continue
+                if task.last_run is None:
+                    task.last_run = now - timestamp.delta_seconds
+                    task.next_run = task.last_run + task.period
+                if now < task.next_run:
+                    continue
+                elapsed = now - task.last_run
+                # a period shorter than the tick runs every tick, which is on
+                # time; a run is only late when it slipped past the next tick
+                if now - task.next_run > timestamp.delta_seconds + 1e-9:
+                    task.missed += 1
+                task.last_run = now
+                task.next_run = now + task.period
+                started = time.perf_counter()
+                try:
+                    task.callback(timestamp, elapsed)
+                except Exception:
+                    task.errors += 1
+                    logging.exception('scheduled task %r failed' % task.name)
+                duration = time.perf_counter() - started
+                task.runs += 1
+                task.total_time += duration
+                task.max_time = max(task.max_time, duration)
+                if task.budget is not None and duration > task.budget:
+                    task.overruns += 1
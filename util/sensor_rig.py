@@ -0,0 +1,214 @@
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+import util.carla_path
+import carla
+from carla import ColorConverter as cc
+
+from util import image_decode
+
+SpawnActor = carla.command.SpawnActor
+DestroyActor = carla.command.DestroyActor
+
+DROP_POLICIES = ('oldest', 'newest')
+TIMEOUT_POLICIES = ('skip', 'partial', 'raise')
+
+# converters done client-side from the raw buffer instead of image.convert()
+CLIENT_VISUALIZATIONS = {
+    cc.Depth: 'depth',
+    cc.LogarithmicDepth: 'logarithmic_depth',
+    cc.CityScapesPalette: 'cityscapes'}
+
+class SensorRigTimeout(Exception):
+    pass
+
+class SensorRig(object):
+    def __init__(self, client, world, parent, sensors, image_size=(1280, 720), fov=110,
+                 transform=None, sensor_tick=None, queue_size=8, drop_policy='oldest',
+                 timeout=1.0, timeout_policy='skip', recorder=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('drop policy %r not in %r' % (drop_policy, DROP_POLICIES))
+        if timeout_policy not in TIMEOUT_POLICIES:
+            raise ValueError('timeout policy %r not in %r' % (timeout_policy, TIMEOUT_POLICIES))
+        self.client = client
+        self.world = world
+        self.parent = parent
+        self.sensors = sensors
+        self.names = [item[2] for item in sensors]
+        self.visualizations = [CLIENT_VISUALIZATIONS.get(item[1]) for item in sensors]
+        self.image_size = image_size
+        self.fov = fov
+        self.transform = transform or carla.Transform(carla.Location(x=2.5, z=0.7))
+        self.sensor_tick = sensor_tick
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.timeout = timeout
+        self.timeout_policy = timeout_policy
+        self.recorder = recorder
+        self.sensor_actors = []
+        # BGRA views of the last bundle get() handed out, by sensor name, for
+        # the sensors decoded client-side; the bundle keeps the measurements
+        self.views = {}
+        self.dropped = [0] * len(sensors)
+        self.incomplete = 0
+        self.bundles = 0
+        self._queues = [OrderedDict() for _ in sensors]
+        self._latest = [None] * len(sensors)
+        self._cond = threading.Condition()
+        # view and float depth scratch arrays per sensor, kept across
+        # bundles; get() decodes outside _cond, so concurrent callers take
+        # turns on them
+        self._view_buffers = [None] * len(sensors)
+        self._depth_scratch = [None] * len(sensors)
+        self._decode_lock = threading.Lock()
+
+    def _blueprint(self, item):
+        bp = self.world.get_blueprint_library().find(item[0])
+        if item[0].startswith('sensor.camera'):
+            bp.set_attribute('image_size_x', str(self.image_size[0]))
+            bp.set_attribute('image_size_y', str(self.image_size[1]))
+            if bp.has_attribute('fov'):
+                bp.set_attribute('fov', str(self.fov))
+        for attr_name, attr_value in item[3].items():
+            bp.set_attribute(attr_name, attr_value)
+        if self.sensor_tick is not None and bp.has_attribute('sensor_tick'):
+            bp.set_attribute('sensor_tick', str(self.sensor_tick))
+        return bp
+
+    def spawn(self):
+        batch = [SpawnActor(self._blueprint(item), self.transform, self.parent.id) for item in self.sensors]
+        results = self.client.apply_batch_sync(batch, False)
+        errors = [r.error for r in results if r.error]
+        if errors:
+            for error in errors:
+                logging.error(error)
+            self.client.apply_batch_sync([DestroyActor(r.actor_id) for r in results if not r.error])
+            raise RuntimeError('could not spawn sensor rig: %s' % errors[0])
+        self.sensor_actors = list(self.world.get_actors([r.actor_id for r in results]))
+        # get_actors does not keep the requested order
+        by_id = dict((sensor.id, sensor) for sensor in self.sensor_actors)
+        self.sensor_actors = [by_id[r.actor_id] for r in results]
+        weak_self = weakref.ref(self)
+        for index, sensor in enumerate(self.sensor_actors):
+            sensor.listen(SensorRig._callback(weak_self, index))
+        logging.info('spawned sensor rig: %s' % ', '.join(self.names))
+        return self.sensor_actors
+
+    @staticmethod
+    def _callback(weak_self, index):
+        return lambda data: SensorRig._on_data(weak_self, index, data)
+
+    @staticmethod
+    def _on_data(weak_self, index, data):
+        self = weak_self()
+        if not self:
+            return
+        if self.recorder is not None:
+            self.recorder.record(self.names[index], data)
+        converter = self.sensors[index][1]
+        if self.visualizations[index] is None and converter is not None and converter != cc.Raw:
+            data.convert(converter)
+        with self._cond:
+            queue = self._queues[index]
+            if len(queue) >= self.queue_size:
+                self.dropped[index] += 1
+                if self.drop_policy == 'newest':
+                    return
+                queue.popitem(last=False)
+            queue[data.frame] = data
+            self._latest[index] = data.frame
+            self._cond.notify_all()
+
+    def _discard_stale(self):
+        # sensors deliver frames in order, so a frame older than every
+        # sensor's latest one can never be completed anymore
+        if any(latest is None for latest in self._latest):
+            return
+        horizon = min(self._latest)
+        for queue in self._queues:
+            for frame in [f for f in queue if f < horizon and not self._complete(f)]:
+                del queue[frame]
+                self.incomplete += 1
+
+    def _complete(self, frame):
+        return all(frame in queue for queue in self._queues)
+
+    def _oldest_complete(self):
+        for frame in self._queues[0]:
+            if self._complete(frame):
+                return frame
+        return None
+
+    def _pop(self, frame):
+        bundle = {}
+        for name, queue in zip(self.names, self._queues):
+            data = queue.pop(frame, None)
+            if data is not None:
+                bundle[name] = data
+        for queue in self._queues:
+            for older in [f for f in queue if f < frame]:
+                del queue[older]
+        return frame, bundle
+
+    def _visualize(self, bundle):
+        # depth and CityScapes views are decoded into BGRA arrays here, for
+        # the frames handed out only, and never convert the image in place;
+        # the arrays are rewritten by the next get()
+        with self._decode_lock:
+            views = {}
+            for index, (name, kind) in enumerate(zip(self.names, self.visualizations)):
+                if kind is None or name not in bundle:
+                    continue
+                data = bundle[name]
+                out = self._view_buffers[index]
+                if out is None or out.shape[:2] != (data.height, data.width):
+                    out = self._view_buffers[index] = np.empty((data.height, data.width, 4), dtype=np.uint8)
+                    self._depth_scratch[index] = np.empty((data.height, data.width), dtype=np.float32)
+                views[name] = image_decode.visualize(data, kind, out, self._depth_scratch[index])
+            self.views = views
+        return views
+
+    def get(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        result = self._take(timeout)
+        if result is not None:
+            self._visualize(result[1])
+        return result
+
+    def _take(self, timeout):
+        with self._cond:
+            self._cond.wait_for(self._ready, timeout)
+            frame = self._oldest_complete()
+            if frame is not None:
+                self.bundles += 1
+                return self._pop(frame)
+            if self.timeout_policy == 'raise':
+                raise SensorRigTimeout('no complete bundle within %.2f seconds' % timeout)
+            if self.timeout_policy == 'partial':
+                frames = [f for queue in self._queues for f in queue]
+                if frames:
+                    self.incomplete += 1
+                    return self._pop(min(frames))
+            return None
+
+    def _ready(self):
+        self._discard_stale()
+        return self._oldest_complete() is not None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'bundles': self.bundles,
+                'incomplete': self.incomplete,
+                'dropped': dict(zip(self.names, self.dropped)),
+                'queued': dict((name, len(queue)) for name, queue in zip(self.names, self._queues))}
+
+    def destroy(self):
+        for sensor in self.sensor_actors:
+            sensor.stop()
+        if self.sensor_actors:
+            self.client.apply_batch_sync([DestroyActor(sensor.id) for sensor in self.sensor_actors])
+        self.sensor_actors = []
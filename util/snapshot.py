@@ -0,0 +1,168 @@
+import io
+import json
+import struct
+import numpy as np
+
+import util.carla_path
+import carla
+
+from util.weather import weather_fields
+
+ApplyTransform = carla.command.ApplyTransform
+ApplyVehicleControl = carla.command.ApplyVehicleControl
+ApplyWalkerControl = carla.command.ApplyWalkerControl
+SetVehicleLightState = carla.command.SetVehicleLightState
+# named ApplyVelocity / ApplyAngularVelocity before 0.9.11
+ApplyTargetVelocity = getattr(carla.command, 'ApplyTargetVelocity', None) or carla.command.ApplyVelocity
+ApplyTargetAngularVelocity = (getattr(carla.command, 'ApplyTargetAngularVelocity', None)
+                              or carla.command.ApplyAngularVelocity)
+
+VEHICLE = 0
+WALKER = 1
+
+# one record per vehicle or walker; control holds throttle, steer, brake for
+# vehicles and direction x, y, z, speed for walkers, flags holds hand_brake,
+# reverse, manual_gear_shift (bits 0-2) or jump (bit 0)
+STATE_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('kind', 'u1'),
+    ('flags', 'u1'),
+    ('gear', '<i2'),
+    ('lights', '<u4'),
+    ('location', '<f4', 3),
+    ('rotation', '<f4', 3),
+    ('velocity', '<f4', 3),
+    ('angular_velocity', '<f4', 3),
+    ('control', '<f4', 4)])
+
+# file layout: MAGIC, <u4 header length, JSON header, float64 weather
+# values, then the STATE_DTYPE records
+MAGIC = b'CARLASTATE1\n'
+
+def _record(actor, light_states=None):
+    transform = actor.get_transform()
+    location, rotation = transform.location, transform.rotation
+    velocity = actor.get_velocity()
+    angular = actor.get_angular_velocity()
+    control = actor.get_control()
+    if actor.type_id.startswith('vehicle.'):
+        kind = VEHICLE
+        values = (control.throttle, control.steer, control.brake, 0.0)
+        flags = int(control.hand_brake) | int(control.reverse) << 1 | int(control.manual_gear_shift) << 2
+        gear = control.gear
+        lights = light_states.get(actor.id) if light_states is not None else None
+        if lights is None:
+            lights = int(actor.get_light_state())
+    else:
+        kind = WALKER
+        direction = control.direction
+        values = (direction.x, direction.y, direction.z, control.speed)
+        flags = int(control.jump)
+        gear = 0
+        lights = 0
+    return (actor.id, kind, flags, gear, lights,
+            (location.x, location.y, location.z), (rotation.pitch, rotation.yaw, rotation.roll),
+            (velocity.x, velocity.y, velocity.z), (angular.x, angular.y, angular.z), values)
+
+class StateSnapshot(object):
+    def __init__(self, states, weather, fields, frame=None, elapsed_seconds=None, map_name=None):
+        self.states = states
+        self.weather = weather
+        self.fields = tuple(fields)
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.map_name = map_name
+
+    def __len__(self):
+        return len(self.states)
+
+    @classmethod
+    def capture(cls, world, actors, map_name=None, light_states=None):
+        # transforms, velocities and controls are read from the client's
+        # copy of the last tick; sensors and controllers are left out since
+        # they follow their parents. Light states are not in the tick, so
+        # light_states (actor id to state) saves a query per vehicle; only
+        # vehicles missing from it are asked
+        actors = [a for a in actors if a.type_id.startswith(('vehicle.', 'walker.pedestrian'))]
+        states = np.array([_record(actor, light_states) for actor in actors], dtype=STATE_DTYPE)
+        weather = world.get_weather()
+        fields = weather_fields(weather)
+        values = np.array([getattr(weather, name) for name in fields], dtype=np.float64)
+        timestamp = world.get_snapshot().timestamp
+        if map_name is None:
+            map_name = world.get_map().name.split('/')[-1]
+        return cls(states, values, fields, timestamp.frame, timestamp.elapsed_seconds, map_name)
+
+    def weather_parameters(self):
+        weather = carla.WeatherParameters()
+        for name, value in zip(self.fields, self.weather.tolist()):
+            if hasattr(weather, name):
+                setattr(weather, name, value)
+        return weather
+
+    def commands(self, states=None):
+        states = self.states if states is None else states
+        batch = []
+        for record in states.tolist():
+            actor_id, kind, flags, gear, lights, location, rotation, velocity, angular, values = record
+            transform = carla.Transform(carla.Location(*location), carla.Rotation(*rotation))
+            batch.append(ApplyTransform(actor_id, transform))
+            batch.append(ApplyTargetVelocity(actor_id, carla.Vector3D(*velocity)))
+            batch.append(ApplyTargetAngularVelocity(actor_id, carla.Vector3D(*angular)))
+            if kind == VEHICLE:
+                control = carla.VehicleControl(
+                    throttle=values[0], steer=values[1], brake=values[2], hand_brake=bool(flags & 1),
+                    reverse=bool(flags & 2), manual_gear_shift=bool(flags & 4), gear=gear)
+                batch.append(ApplyVehicleControl(actor_id, control))
+                batch.append(SetVehicleLightState(actor_id, carla.VehicleLightState(lights)))
+            else:
+                control = carla.WalkerControl(carla.Vector3D(*values[:3]), values[3], bool(flags & 1))
+                batch.append(ApplyWalkerControl(actor_id, control))
+        return batch
+
+    def restore(self, client, world, do_tick=False):
+        # teleports the actors that are still alive in one batch instead of
+        # respawning them; actors destroyed since the capture are skipped
+        alive = set(actor.id for actor in world.get_actors(self.states['id'].tolist())) if len(self.states) else set()
+        mask = np.fromiter((x in alive for x in self.states['id'].tolist()), dtype=bool, count=len(self.states))
+        errors = 0
+        batch = self.commands(self.states[mask])
+        if batch:
+            for response in client.apply_batch_sync(batch, do_tick):
+                if response.error:
+                    errors += 1
+        world.set_weather(self.weather_parameters())
+        return {'restored': int(mask.sum()), 'missing': int(len(mask) - mask.sum()), 'errors': errors}
+
+    def to_bytes(self):
+        header = json.dumps({
+            'frame': self.frame,
+            'elapsed_seconds': self.elapsed_seconds,
+            'map': self.map_name,
+            'weather': list(self.fields),
+            'count': len(self.states)}).encode('utf-8')
+        return b''.join((MAGIC, struct.pack('<I', len(header)), header,
+                         self.weather.astype('<f8').tobytes(), self.states.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data.startswith(MAGIC):
+            raise ValueError('not a state snapshot')
+        offset = len(MAGIC)
+        (length,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        header = json.loads(data[offset:offset + length].decode('utf-8'))
+        offset += length
+        weather = np.frombuffer(data, dtype='<f8', count=len(header['weather']), offset=offset).copy()
+        offset += weather.nbytes
+        states = np.frombuffer(data, dtype=STATE_DTYPE, count=header['count'], offset=offset).copy()
+        return cls(states, weather, header['weather'], header['frame'], header['elapsed_seconds'], header['map'])
+
+    def save(self, path):
+        with io.open(path, mode='wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with io.open(path, mode='rb') as f:
+            return cls.from_bytes(f.read())
@@ -0,0 +1,93 @@
+import os
+import math
+import hashlib
+import logging
+import numpy as np
+from util.map_cache import DEFAULT_CACHE_DIR
+
+# metres kept between a new spawn point and a location in `occupied`,
+# about one vehicle length, when min_separation asks for less
+OCCUPIED_CLEARANCE = 5.0
+
+class SpawnPlanner(object):
+    def __init__(self, carla_map, cache_dir=None):
+        self.map = carla_map
+        self.spawn_points = carla_map.get_spawn_points()
+        self.positions = np.array([[t.location.x, t.location.y, t.location.z] for t in self.spawn_points],
+                                  dtype=np.float64).reshape(-1, 3)
+        self.cache_path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'spawn_points', '%s-%s.npz' % (
+            carla_map.name.split('/')[-1], hashlib.sha256(np.round(self.positions, 2).tobytes()).hexdigest()[:16]))
+        self._load_lanes()
+
+    def _load_lanes(self):
+        # waypoint lookups are the slow part, so lane data is kept per map
+        if os.path.exists(self.cache_path):
+            data = np.load(self.cache_path)
+            self.road_ids = data['road_ids']
+            self.lane_ids = data['lane_ids']
+            self.junction = data['junction']
+            return
+        waypoints = [self.map.get_waypoint(t.location) for t in self.spawn_points]
+        self.road_ids = np.array([w.road_id for w in waypoints], dtype=np.int32)
+        self.lane_ids = np.array([w.lane_id for w in waypoints], dtype=np.int32)
+        self.junction = np.array([w.is_junction for w in waypoints], dtype=bool)
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.savez(self.cache_path, road_ids=self.road_ids, lane_ids=self.lane_ids, junction=self.junction)
+        logging.info('cached %d spawn points for %s' % (len(self.spawn_points), self.map.name))
+
+    def candidates(self, hero_location=None, hero_band=None, road_ids=None, lane_ids=None, exclude_junctions=False):
+        mask = np.ones(len(self.spawn_points), dtype=bool)
+        if hero_location is None and hero_band is not None and (hero_band[0] > 0.0 or hero_band[1] < float('inf')):
+            logging.warning('no hero location, ignoring the hero distance band %.1f-%.1f m' % hero_band)
+        if hero_location is not None and hero_band is not None:
+            distance = np.linalg.norm(self.positions[:, :2] - np.asarray(hero_location[:2]), axis=1)
+            mask &= (distance >= hero_band[0]) & (distance <= hero_band[1])
+        if road_ids is not None:
+            mask &= np.isin(self.road_ids, list(road_ids))
+        if lane_ids is not None:
+            mask &= np.isin(self.lane_ids, list(lane_ids))
+        if exclude_junctions:
+            mask &= ~self.junction
+        return np.flatnonzero(mask)
+
+    def plan_indices(self, count, seed=None, min_separation=0.0, occupied=None, **constraints):
+        # occupied is a list of (x, y) locations already taken, e.g. by
+        # vehicles spawned earlier; points near them are left out
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(self.candidates(**constraints))
+        if occupied is not None and len(occupied):
+            taken = np.asarray(occupied, dtype=np.float64).reshape(len(occupied), -1)[:, :2]
+            clearance = max(float(min_separation), OCCUPIED_CLEARANCE)
+            distance = np.linalg.norm(self.positions[order, None, :2] - taken[None, :, :], axis=2)
+            order = order[(distance >= clearance).all(axis=1)]
+        if min_separation <= 0.0:
+            return order[:count]
+        # greedy dart throwing over a grid of accepted points
+        cell = float(min_separation)
+        accepted = {}
+        chosen = []
+        for i in order:
+            x, y = self.positions[i, 0], self.positions[i, 1]
+            cx, cy = int(math.floor(x / cell)), int(math.floor(y / cell))
+            clear = True
+            for gx in (cx - 1, cx, cx + 1):
+                for gy in (cy - 1, cy, cy + 1):
+                    for j in accepted.get((gx, gy), ()):
+                        if (self.positions[j, 0] - x) ** 2 + (self.positions[j, 1] - y) ** 2 < cell * cell:
+                            clear = False
+                            break
+                    if not clear:
+                        break
+                if not clear:
+                    break
+            if clear:
+                accepted.setdefault((cx, cy), []).append(i)
+                chosen.append(i)
+                if len(chosen) == count:
+                    break
+        if len(chosen) < count:
+            logging.warning('spawn plan found %d of %d points %.1f m apart' % (len(chosen), count, min_separation))
+        return np.array(chosen, dtype=np.intp)
+
+    def plan(self, count, seed=None, min_separation=0.0, occupied=None, **constraints):
+        return [self.spawn_points[i] for i in self.plan_indices(count, seed, min_separation, occupied, **constraints)]
@@ -0,0 +1,74 @@
+import logging
+import time
+
+class SynchronousDriver(object):
+    def __init__(self, world, fixed_delta=0.05, report_interval=5.0, traffic_manager=False):
+        self.world = world
+        self.traffic_manager = traffic_manager
+        self.fixed_delta = fixed_delta
+        self.report_interval = report_interval
+        self.steps = 0
+        self.frame = None
+        self._original_settings = None
+        self._started = None
+        self._last_report = None
+        self._last_report_steps = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        carla_world = self.world.world
+        settings = carla_world.get_settings()
+        self._original_settings = (settings.synchronous_mode, settings.fixed_delta_seconds)
+        settings.synchronous_mode = True
+        settings.fixed_delta_seconds = self.fixed_delta
+        carla_world.apply_settings(settings)
+        if self.traffic_manager:
+            self.world.client.get_trafficmanager(self.world.tm_port).set_synchronous_mode(True)
+        for actor in self.world.actor_list:
+            actor.deferred_control = True
+        self._started = self._last_report = time.time()
+        logging.info('synchronous mode on, fixed delta %.3f seconds' % self.fixed_delta)
+
+    def stop(self):
+        if self._original_settings is None:
+            return
+        carla_world = self.world.world
+        settings = carla_world.get_settings()
+        settings.synchronous_mode, settings.fixed_delta_seconds = self._original_settings
+        carla_world.apply_settings(settings)
+        if self.traffic_manager:
+            self.world.client.get_trafficmanager(self.world.tm_port).set_synchronous_mode(False)
+        self._original_settings = None
+        for actor in self.world.actor_list:
+            actor.deferred_control = False
+        logging.info(self.summary())
+
+    def tick(self):
+        # one control flush per actor, then exactly one simulation step
+        for actor in self.world.actor_list:
+            actor.deferred_control = True
+        self.world.flush_controls()
+        self.frame = self.world.world.tick()
+        self.steps += 1
+        now = time.time()
+        if self.report_interval and now - self._last_report >= self.report_interval:
+            rate = (self.steps - self._last_report_steps) / (now - self._last_report)
+            logging.info('%.1f sim steps/s (%.2fx real time)' % (rate, rate * self.fixed_delta))
+            self._last_report = now
+            self._last_report_steps = self.steps
+        return self.frame
+
+    def steps_per_second(self):
+        elapsed = time.time() - self._started if self._started else 0.0
+        return self.steps / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        rate = self.steps_per_second()
+        return '%d sim steps, %.1f steps/s, %.2fx real time' % (self.steps, rate, rate * self.fixed_delta)
@@ -1,4 +1,44 @@
 import math
+import types
+import numpy as np
+
+# WeatherParameters fields across server versions; fog_falloff and the
+# scattering terms only exist on newer ones
+FIELDS = ('cloudiness', 'precipitation', 'precipitation_deposits', 'wind_intensity',
+          'sun_azimuth_angle', 'sun_altitude_angle', 'fog_density', 'fog_distance',
+          'fog_falloff', 'wetness', 'scattering_intensity', 'mie_scattering_scale',
+          'rayleigh_scattering_scale')
+
+# interpolated and compared the short way round 360 degrees
+CIRCULAR = ('sun_azimuth_angle',)
+
+# fields the Sun/Storm model changes in steps
+STEPPED = ('wind_intensity',)
+
+# WeatherEmitter's threshold is in the units of the percent, degree and
+# metre fields; these fields span far smaller ranges (the scattering
+# scales sit around 0.03), so the threshold is scaled down for them
+THRESHOLD_SCALES = {
+    'fog_falloff': 0.05,
+    'scattering_intensity': 0.01,
+    'mie_scattering_scale': 0.001,
+    'rayleigh_scattering_scale': 0.001}
+
+def weather_fields(weather):
+    return tuple(name for name in FIELDS if hasattr(weather, name))
+
+def weather_values(weather, fields):
+    return np.array([getattr(weather, name) for name in fields], dtype=np.float64)
+
+def parse_keyframes(text):
+    # "0:ClearNoon,60:HardRainNoon,120:ClearSunset" -> [(0.0, 'ClearNoon'), ...]
+    keyframes = []
+    for item in text.split(','):
+        seconds, _, preset = item.partition(':')
+        if not preset:
+            raise ValueError('keyframe %r is not SECONDS:PRESET' % item)
+        keyframes.append((float(seconds), preset.strip()))
+    return keyframes
 
 def clamp(value, minimum=0.0, maximum=100.0):
     return max(minimum, min(value, maximum))
@@ -69,3 +109,140 @@ class Storm(object):
 
     def __str__(self):
         return 'Storm(clouds=%d%%, rain=%d%%, wind=%d%%)' % (self.clouds, self.rain, self.wind)
+
+
+class WeatherTimeline(object):
+    # piecewise-linear weather over time: times is (K,) increasing seconds and
+    # values (K, len(fields)); sampling is one searchsorted and a lerp
+    def __init__(self, times, values, fields, loop=False):
+        self.times = np.asarray(times, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.fields = tuple(fields)
+        self.loop = loop
+        self._circular = [self.fields.index(name) for name in CIRCULAR if name in self.fields]
+        self._stepped = []
+        self._unwrap()
+
+    def _unwrap(self):
+        # store angles continuously so that 350 -> 10 goes through 360
+        for i in self._circular:
+            self.values[:, i] = np.degrees(np.unwrap(np.radians(self.values[:, i])))
+
+    @classmethod
+    def from_keyframes(cls, keyframes, loop=False):
+        # keyframes are (seconds, WeatherParameters) pairs; with loop the
+        # last keyframe blends back into the first over one more interval
+        keyframes = sorted(keyframes, key=lambda k: k[0])
+        fields = weather_fields(keyframes[0][1])
+        times = [k[0] for k in keyframes]
+        values = [weather_values(k[1], fields) for k in keyframes]
+        if loop and len(keyframes) > 1:
+            times.append(times[-1] + (times[-1] - times[-2]))
+            values.append(values[0])
+        return cls(times, values, fields, loop)
+
+    @property
+    def duration(self):
+        return self.times[-1] - self.times[0]
+
+    def sample(self, t, out=None):
+        if out is None:
+            out = np.empty(len(self.fields), dtype=np.float64)
+        times = self.times
+        if self.loop and self.duration > 0.0:
+            t = times[0] + (t - times[0]) % self.duration
+        i = int(np.searchsorted(times, t, side='right')) - 1
+        if i < 0:
+            out[:] = self.values[0]
+        elif i >= len(times) - 1:
+            out[:] = self.values[-1]
+        else:
+            fraction = (t - times[i]) / (times[i + 1] - times[i])
+            np.subtract(self.values[i + 1], self.values[i], out=out)
+            np.multiply(out, fraction, out=out)
+            np.add(out, self.values[i], out=out)
+            for j in self._stepped:
+                out[j] = self.values[i, j]
+        for j in self._circular:
+            out[j] %= 360.0
+        return out
+
+    def describe(self, values):
+        value = dict(zip(self.fields, values))
+        return 'Sun(alt: %.2f, azm: %.2f) Storm(clouds=%d%%, rain=%d%%, wind=%d%%)' % (
+            value['sun_altitude_angle'], value['sun_azimuth_angle'], value['cloudiness'],
+            value['precipitation'], value['wind_intensity'])
+
+class ModelTimeline(WeatherTimeline):
+    # the Sun/Storm model sampled every `step` model seconds, `horizon`
+    # seconds at a time; sampling past the end runs the model further and
+    # drops the rows already passed. Wind only takes three levels, so it is
+    # held rather than blended.
+    def __init__(self, weather, horizon=300.0, step=0.5):
+        fields = weather_fields(weather)
+        self._state = types.SimpleNamespace(**dict((name, getattr(weather, name)) for name in fields))
+        self._model = Weather(self._state)
+        self._model.tick(0.0)
+        self.horizon = horizon
+        self.step = step
+        self._t = 0.0
+        super(ModelTimeline, self).__init__([0.0], [weather_values(self._state, fields)], fields)
+        self._stepped = [self.fields.index(name) for name in STEPPED if name in self.fields]
+        self._extend()
+
+    def _extend(self):
+        count = int(math.ceil(self.horizon / self.step))
+        times = np.empty(count, dtype=np.float64)
+        values = np.empty((count, len(self.fields)), dtype=np.float64)
+        for k in range(count):
+            self._model.tick(self.step)
+            self._t += self.step
+            times[k] = self._t
+            for j, name in enumerate(self.fields):
+                values[k, j] = getattr(self._state, name)
+        # keep the last row so the new chunk unwraps continuously from it
+        self.times = np.concatenate((self.times[-1:], times))
+        self.values = np.concatenate((self.values[-1:], values))
+        self._unwrap()
+
+    def sample(self, t, out=None):
+        while t > self.times[-1]:
+            self._extend()
+        return super(ModelTimeline, self).sample(t, out)
+
+class WeatherEmitter(object):
+    # sends set_weather only when some field moved more than its threshold
+    # away from what the server was last sent; thresholds overrides single
+    # fields, the rest get threshold times their THRESHOLD_SCALES entry
+    def __init__(self, world, fields, threshold=1.0, thresholds=None):
+        self.world = world
+        self.fields = tuple(fields)
+        self.weather = world.get_weather()
+        self.threshold = np.array([threshold * THRESHOLD_SCALES.get(name, 1.0) for name in self.fields],
+                                  dtype=np.float64)
+        for name, value in (thresholds or {}).items():
+            self.threshold[self.fields.index(name)] = value
+        self._circular = [self.fields.index(name) for name in CIRCULAR if name in self.fields]
+        self.last = weather_values(self.weather, self.fields)
+        self._delta = np.empty(len(self.fields), dtype=np.float64)
+        self.sent = 0
+        self.skipped = 0
+
+    def update(self, values, force=False):
+        delta = self._delta
+        np.subtract(values, self.last, out=delta)
+        np.abs(delta, out=delta)
+        for j in self._circular:
+            delta[j] = min(delta[j] % 360.0, 360.0 - delta[j] % 360.0)
+        if not force and not (delta > self.threshold).any():
+            self.skipped += 1
+            return False
+        for name, value in zip(self.fields, values.tolist()):
+            setattr(self.weather, name, value)
+        self.world.set_weather(self.weather)
+        self.last[:] = values
+        self.sent += 1
+        return True
+
+    def stats(self):
+        return {'sent': self.sent, 'skipped': self.skipped}
@@ -1,22 +1,23 @@
 import logging
 import io
 import os
+import random
 import sys
-import glob
-import re
-import textwrap
-import _thread
-from util.weather import Weather
+import xml.etree.ElementTree as ET
+import numpy as np
+from util.weather import ModelTimeline, WeatherEmitter, WeatherTimeline, parse_keyframes
+from util.scheduler import Scheduler
 from util.actor import Actor
+from util.map_cache import MapCache, file_digest, text_digest, params_key
+from util.osm_filter import filter_osm
+from util.blueprints import BlueprintCatalog
+from util.spawn_planner import SpawnPlanner
+from util.registry import ActorRegistry
+from util.control import ControlBus
+from util.catalog import ServerCatalog, weather_presets
+from util.snapshot import StateSnapshot, VEHICLE
 
-try:
-    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
-        sys.version_info.major,
-        sys.version_info.minor,
-        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
-except IndexError:
-    pass
-
+import util.carla_path
 import carla
 
 SpawnActor = carla.command.SpawnActor
@@ -27,53 +28,264 @@ FutureActor = carla.command.FutureActor
 class World(object):
     def __init__(self, args):        
         self.args = args
-        self.client = carla.Client('localhost', 2000)
+        self.host = getattr(args, 'host', 'localhost')
+        self.port = getattr(args, 'port', 2000)
+        self.client = carla.Client(self.host, self.port)
         self.client.set_timeout(float(args.timeout))        
+        self.map_cache = MapCache(getattr(args, 'cache_dir', None))
+        self.catalog = None
         self.world = self.get_world()
         self.blueprints_library = self.world.get_blueprint_library()
+        self.blueprints = BlueprintCatalog(self.blueprints_library)
         self.show_weather_info = True
         self.dynamic_weather_is_running = False        
+        self.dynamic_weather_task = None
+        self.scheduler = Scheduler(self.world)
         self.actor_list = []
         self.actor_role_name = args.rolename
+        self.tm_port = getattr(args, 'tm_port', 8000)
+        self.spawn_planner = None
+        self.registry = ActorRegistry(self.client)
+        self.registry.add_hook(self._stop_tasks)
+        self.control_bus = None
+        # vehicle light states as this client last set them, so captures
+        # need no query per vehicle
+        self.light_states = {}
+        self._map_name = None
         
+    @property
+    def map_name(self):
+        # get_map() sends the whole OpenDRIVE over, so it is asked once
+        if self._map_name is None:
+            self._map_name = self.current_map_name(self.world)
+        return self._map_name
+
     def spawn_actor(self, blueprint_name, spawn_point):
-        blueprint = self.blueprints_library.filter(blueprint_name)[0]
+        blueprint = self.blueprints.get(blueprint_name)
         vehicle = self.world.spawn_actor(blueprint, spawn_point)
-        actor = Actor(self.world, self.args.rolename, vehicle, blueprint, spawn_point)        
+        if vehicle.type_id.startswith('vehicle.'):
+            self.light_states[vehicle.id] = int(carla.VehicleLightState.NONE)
+        actor = Actor(self.world, self.args.rolename, vehicle, blueprint, spawn_point, self.client)        
         self.actor_list.append(actor)            
+        self.registry.add_wrapper(actor)
+        actor.control_bus = self.control_bus
         return actor    
     
+    def spawn_many(self, specs, do_tick=False, rng=None):
+        # each spec is a dict with 'blueprint' (id, pattern or blueprint) and
+        # 'transform', plus optional 'role_name', 'autopilot', 'light_state'
+        # and 'sensors' as a list of (blueprint, transform) pairs to attach;
+        # a pattern picks one of its matches at random for every spec
+        rng = random if rng is None else rng
+        batch = []
+        blueprints = []
+        for spec in specs:
+            blueprint = spec['blueprint']
+            if isinstance(blueprint, str):
+                matches = self.blueprints.filter(blueprint)
+                if not matches:
+                    raise IndexError('no blueprint matches %r' % blueprint)
+                blueprint = rng.choice(matches)
+            # blueprints are shared through the catalog; SpawnActor copies
+            # the description, so the role name is put back right away
+            role_name = spec.get('role_name')
+            original = None
+            if role_name is not None and blueprint.has_attribute('role_name'):
+                original = blueprint.get_attribute('role_name').as_str()
+                blueprint.set_attribute('role_name', role_name)
+            try:
+                command = SpawnActor(blueprint, spec['transform'])
+            finally:
+                if original is not None:
+                    blueprint.set_attribute('role_name', original)
+            if spec.get('autopilot'):
+                command = command.then(SetAutopilot(FutureActor, True, self.tm_port))
+            if spec.get('light_state') is not None:
+                command = command.then(SetVehicleLightState(FutureActor, spec['light_state']))
+            batch.append(command)
+            blueprints.append(blueprint)
+        errors = []
+        spawned = []
+        for i, response in enumerate(self.client.apply_batch_sync(batch, do_tick)):
+            if response.error:
+                errors.append((i, response.error))
+            else:
+                spawned.append((i, response.actor_id))
+        # sensors need their parent's id, so they go in a second batch
+        sensor_batch = []
+        sensor_owner = []
+        for i, actor_id in spawned:
+            for sensor_bp, sensor_transform in specs[i].get('sensors', ()):
+                sensor_batch.append(SpawnActor(sensor_bp, sensor_transform, actor_id))
+                sensor_owner.append(i)
+        sensor_ids = {}
+        if sensor_batch:
+            for i, response in zip(sensor_owner, self.client.apply_batch_sync(sensor_batch, do_tick)):
+                if response.error:
+                    errors.append((i, response.error))
+                else:
+                    sensor_ids.setdefault(i, []).append(response.actor_id)
+        ids = [actor_id for _, actor_id in spawned] + [x for v in sensor_ids.values() for x in v]
+        carla_actors = dict((a.id, a) for a in self.world.get_actors(ids)) if ids else {}
+        actors = []
+        for i, actor_id in spawned:
+            if blueprints[i].id.startswith('vehicle.'):
+                self.light_states[actor_id] = int(specs[i].get('light_state') or carla.VehicleLightState.NONE)
+            if actor_id not in carla_actors:
+                # spawned but not visible to this client; still destroyed at
+                # teardown, but no wrapper that would fail on first use
+                errors.append((i, 'actor %d not found after spawning' % actor_id))
+                self.registry.add_ids(sensor_ids.get(i, []) + [actor_id])
+                continue
+            role_name = specs[i].get('role_name', self.args.rolename)
+            actor = Actor(self.world, role_name, carla_actors[actor_id], blueprints[i], specs[i]['transform'], self.client)
+            actor.sensors_list.extend(carla_actors[x] for x in sensor_ids.get(i, []) if x in carla_actors)
+            actors.append(actor)
+        self.actor_list.extend(actors)
+        for actor in actors:
+            self.registry.add_wrapper(actor)
+            actor.control_bus = self.control_bus
+        for i, error in errors:
+            logging.error('spawn %d: %s' % (i, error))
+        return actors, errors
+
+    def enable_control_bus(self):
+        if self.control_bus is None:
+            self.control_bus = ControlBus(self.client)
+        for actor in self.actor_list:
+            actor.control_bus = self.control_bus
+        return self.control_bus
+
+    def flush_controls(self):
+        # call once per tick: sends every changed control in one batch
+        sent = sum(1 for actor in self.actor_list if actor.flush_control())
+        if self.control_bus is not None:
+            sent += self.control_bus.flush()
+        return sent
+
+    def capture_state(self, query_lights=False):
+        # every vehicle and walker the registry manages, plus the weather;
+        # light states come from what this World set, pass query_lights
+        # when something else (e.g. the traffic manager) changes them
+        ids = self.registry.ids()
+        return StateSnapshot.capture(self.world, self.world.get_actors(ids) if ids else [], self.map_name,
+                                     None if query_lights else self.light_states)
+
+    def restore_state(self, snapshot, do_tick=False):
+        # snapshot is a StateSnapshot or a path written by StateSnapshot.save
+        if isinstance(snapshot, str):
+            snapshot = StateSnapshot.load(snapshot)
+        report = snapshot.restore(self.client, self.world, do_tick)
+        vehicles = snapshot.states[snapshot.states['kind'] == VEHICLE]
+        self.light_states.update(zip(vehicles['id'].tolist(), vehicles['lights'].tolist()))
+        if report['missing'] or report['errors']:
+            logging.warning('restored %d actors, %d missing, %d errors' % (
+                report['restored'], report['missing'], report['errors']))
+        return report
+
     def get_spawn_points(self):
         return self.world.get_map().get_spawn_points()
+
+    def get_spawn_planner(self):
+        if self.spawn_planner is None:
+            self.spawn_planner = SpawnPlanner(self.world.get_map(), getattr(self.args, 'cache_dir', None))
+        return self.spawn_planner
     
-    def dynamic_weather(self, speed):        
-        update_freq = 0.1 / speed
-        weather = Weather(self.world.get_weather())
-        elapsed_time = 0.0
-        while(self.dynamic_weather_is_running):
-            timestamp = self.world.wait_for_tick(seconds=30.0).timestamp
-            elapsed_time += timestamp.delta_seconds
-            if elapsed_time > update_freq:
-                weather.tick(speed * elapsed_time)
-                self.world.set_weather(weather.weather)
-                if self.show_weather_info:
-                    logging.info(str(weather))                
-                elapsed_time = 0.0
-
-    def start_dynamic_weather(self, speed):
+    def weather_timeline(self, keyframes, loop=False):
+        # keyframes are (seconds, preset name or WeatherParameters) pairs or
+        # a "0:ClearNoon,60:HardRainNoon" string
+        if isinstance(keyframes, str):
+            keyframes = parse_keyframes(keyframes)
+        resolved = []
+        for seconds, weather in keyframes:
+            if isinstance(weather, str):
+                if weather not in weather_presets():
+                    raise ValueError('weather preset %r not found.' % weather)
+                weather = getattr(carla.WeatherParameters, weather)
+            resolved.append((seconds, weather))
+        return WeatherTimeline.from_keyframes(resolved, loop)
+
+    def dynamic_weather(self, speed, timeline=None, threshold=1.0):
+        # timeline defaults to the Sun/Storm model from the current weather;
+        # the server is only sent updates that moved some field past threshold
+        if timeline is None:
+            timeline = ModelTimeline(self.world.get_weather())
+        emitter = WeatherEmitter(self.world, timeline.fields, threshold)
+        values = np.empty(len(timeline.fields), dtype=np.float64)
+        state = {'start': None}
+        def update(timestamp, elapsed_time):
+            first = state['start'] is None
+            if first:
+                state['start'] = timestamp.elapsed_seconds
+            timeline.sample(speed * (timestamp.elapsed_seconds - state['start']), out=values)
+            if emitter.update(values, force=first) and self.show_weather_info:
+                logging.info(timeline.describe(values))
+        update.emitter = emitter
+        return update
+
+    def start_dynamic_weather(self, speed, timeline=None, threshold=1.0):
+        if self.dynamic_weather_task is not None:
+            return
         self.dynamic_weather_is_running = True
         logging.info("Dynamic weather started")
-        _thread.start_new_thread(self.dynamic_weather, (speed, ))
+        self.dynamic_weather_task = self.scheduler.add(
+            'dynamic_weather', self.dynamic_weather(speed, timeline, threshold), period=0.1 / speed)
     
     def stop_dynamic_weather(self):
         logging.info("Dynamic weather ended")
         self.dynamic_weather_is_running = False
+        if self.dynamic_weather_task is not None:
+            self.dynamic_weather_task.cancel()
+            self.dynamic_weather_task = None
         
+    def destroy(self):
+        report = self.registry.teardown()
+        self.actor_list = []
+        return report
+
+    def _stop_tasks(self):
+        self.stop_dynamic_weather()
+        self.scheduler.stop()
+
+    def __enter__(self):
+        self.registry.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.__exit__(*exc)
+        self.actor_list = []
+        self.light_states = {}
+        return False
+
+    def current_map_name(self, world):
+        return world.get_map().name.split('/')[-1]
+
+    def generate_world(self, xodr_data, parameters):
+        # generation is keyed by the exact OpenDRIVE text plus the mesh
+        # parameters; skip it when the server still holds that world
+        xodr_digest = text_digest(xodr_data)
+        key = params_key(xodr_digest, parameters)
+        endpoint = '%s:%d' % (self.host, self.port)
+        record = self.map_cache.generated_world(endpoint)
+        if record is not None and record['key'] == key:
+            world = self.client.get_world()
+            if text_digest(world.get_map().to_opendrive()) == xodr_digest:
+                logging.info('opendrive world already loaded, skipping generation.')
+                return world
+        world = self.client.generate_opendrive_world(
+            xodr_data, carla.OpendriveGenerationParameters(**parameters))
+        self.map_cache.set_generated_world(endpoint, key, xodr_digest)
+        return world
+
     def get_world(self):
         if self.args.map is not None:
-            if self.args.map in [m.replace('/Game/Carla/Maps/', '') for m in self.client.get_available_maps()]:
-                logging.info('load map %r.' % self.args.map)
-                world = self.client.load_world(self.args.map)        
+            if self.args.map in self.get_catalog().maps:
+                world = self.client.get_world()
+                if self.current_map_name(world) == self.args.map:
+                    logging.info('map %r already loaded.' % self.args.map)
+                else:
+                    logging.info('load map %r.' % self.args.map)
+                    world = self.client.load_world(self.args.map)        
             else:
                 logging.error('map %r not found.' % self.args.map)
                 logging.info('Loading current world')
@@ -87,44 +299,50 @@ class World(object):
                         print('file could not be readed.')
                         sys.exit()
                 print('load opendrive map %r.' % os.path.basename(self.args.xodr_path))
-                vertex_distance = 2.0  # in meters
-                max_road_length = 500.0 # in meters
-                wall_height = 1.0      # in meters
-                extra_width = 0.6      # in meters
-                world = self.client.generate_opendrive_world(
-                    data, carla.OpendriveGenerationParameters(
-                        vertex_distance=vertex_distance,
-                        max_road_length=max_road_length,
-                        wall_height=wall_height,
-                        additional_width=extra_width,
-                        smooth_junctions=True,
-                        enable_mesh_visibility=True))
+                world = self.generate_world(data, dict(
+                    vertex_distance=2.0,   # in meters
+                    max_road_length=500.0, # in meters
+                    wall_height=1.0,       # in meters
+                    additional_width=0.6,  # in meters
+                    smooth_junctions=True,
+                    enable_mesh_visibility=True))
             else:
                 logging.error('file not found.')
                 exit()
         elif self.args.osm_path is not None:
             if os.path.exists(self.args.osm_path):
-                with io.open(self.args.osm_path, mode='r', encoding='utf-8') as od_file:
+                bbox = getattr(self.args, 'osm_bbox', None)
+                highways = getattr(self.args, 'osm_highways', None)
+                key = params_key('osm2odr', file_digest(self.args.osm_path), bbox, highways)
+                xodr_data = self.map_cache.get_xodr(key)
+                if xodr_data is None and (bbox is not None or highways is not None):
+                    print('Filtering OSM data')
                     try:
-                        data = od_file.read()
-                    except OSError:
+                        data = filter_osm(self.args.osm_path, bbox, highways)
+                    except (OSError, ET.ParseError):
                         print('file could not be readed.')
                         sys.exit()
-                print('Converting OSM data to opendrive')
-                xodr_data = carla.Osm2Odr.convert(data)
+                elif xodr_data is None:
+                    with io.open(self.args.osm_path, mode='r', encoding='utf-8') as od_file:
+                        try:
+                            data = od_file.read()
+                        except OSError:
+                            print('file could not be readed.')
+                            sys.exit()
+                if xodr_data is None:
+                    print('Converting OSM data to opendrive')
+                    xodr_data = carla.Osm2Odr.convert(data)
+                    self.map_cache.put_xodr(key, xodr_data)
+                else:
+                    logging.info('using cached opendrive conversion %s.' % key[:12])
                 print('load opendrive map.')
-                vertex_distance = 2.0  # in meters
-                max_road_length = 500.0 # in meters
-                wall_height = 0.0      # in meters
-                extra_width = 0.6      # in meters
-                world = self.client.generate_opendrive_world(
-                    xodr_data, carla.OpendriveGenerationParameters(
-                        vertex_distance=vertex_distance,
-                        max_road_length=max_road_length,
-                        wall_height=wall_height,
-                        additional_width=extra_width,
-                        smooth_junctions=True,
-                        enable_mesh_visibility=True))
+                world = self.generate_world(xodr_data, dict(
+                    vertex_distance=2.0,   # in meters
+                    max_road_length=500.0, # in meters
+                    wall_height=0.0,       # in meters
+                    additional_width=0.6,  # in meters
+                    smooth_junctions=True,
+                    enable_mesh_visibility=True))
             else:
                 logging.error('file not found.')
                 exit()
@@ -133,13 +351,10 @@ class World(object):
         return world
     
     def find_weather_presets(self):
-        presets = [x for x in dir(carla.WeatherParameters) if re.match('[A-Z].+', x)]    
-        return [(getattr(carla.WeatherParameters, x), x) for x in presets]
+        return [(getattr(carla.WeatherParameters, x), x) for x in weather_presets()]
     
     def find_vehicles_blueprints(self):
-        blueprint_library = self.world.get_blueprint_library()
-        blueprints = [bp.id for bp in blueprint_library.filter('vehicle.*')]    
-        return blueprints
+        return [bp.id for bp in self.blueprints.filter('vehicle.*')]
     
     def set_weather(self, weather):
         if weather is not None:
@@ -149,14 +364,10 @@ class World(object):
                 logging.info('set weather preset %r.' % weather)
                 self.world.set_weather(getattr(carla.WeatherParameters, weather))    
     
+    def get_catalog(self):
+        if self.catalog is None:
+            self.catalog = ServerCatalog(self.client, self.map_cache)
+        return self.catalog
+
     def list_options(self):
-        maps = [m.replace('/Game/Carla/Maps/', '') for m in self.client.get_available_maps()]
-        indent = 4 * ' '
-        def wrap(text):
-            return '\n'.join(textwrap.wrap(text, initial_indent=indent, subsequent_indent=indent))
-        print('weather presets:\n')
-        print(wrap(', '.join(x for _, x in self.find_weather_presets())) + '.\n')
-        print('available maps:\n')
-        print(wrap(', '.join(sorted(maps))) + '.\n')
-        print('available vehicles:\n')
-        print(wrap(', '.join(sorted(self.find_vehicles_blueprints()))) + '.\n')
\ No newline at end of file
+        self.get_catalog().print_options()